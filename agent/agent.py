@@ -1,21 +1,24 @@
 from __future__ import annotations
-import asyncio
 from typing import AsyncGenerator
 import logging
 import time
 
 from agent.events import AgentEvent, AgentEventType
+from agent.loop_detector import LoopDetector
 from agent.session import Session
 from config.config import Config
-from lib.response import StreamEventType, TokenUsage, ToolCall, ToolResultMessage
+from lib.response import RequestMetrics, StreamEventType, TokenUsage, ToolCall, ToolResultMessage
+from llm.pool import ClientPool
+from propmpts.system import create_loop_breaker_prompt
 from tools.base import ToolResult
+from tools.mcp.mcp_manager import MCPManager
 
 logger = logging.getLogger(__name__)
 
 class Agent:
-    def __init__(self,config:Config) -> None:
+    def __init__(self,config:Config, client_pool: ClientPool | None = None, mcp_manager: MCPManager | None = None) -> None:
         self.config = config
-        self.session: Session = Session(config)
+        self.session: Session = Session(config, client_pool=client_pool, mcp_manager=mcp_manager)
     
     async def run(self, message: str) -> AsyncGenerator[AgentEvent, None]:
         if not self.session or not self.session.context_manager:
@@ -40,14 +43,15 @@ class Agent:
         max_turns = self.config.max_turns if self.config.max_turns else 10
         max_consecutive_tool_failures = max(1, self.config.max_consecutive_tool_failures)
         consecutive_tool_failures = 0
-        print(self.session.context_manager._total_usage.__dict__)
+        loop_detector = LoopDetector(self.config.loop_detection)
+        logger.debug(f"Starting agentic loop, usage so far: {self.session.context_manager._total_usage.__dict__}")
 
         if not self.session.context_manager or not self.session.client or not self.session.chat_compactor or not self.session.prune_manager:
             yield AgentEvent.agent_error(agent_name=self.session.agentId, message="Session is not properly initialized.")
             return
 
         for _ in range(max_turns):
-            self.session.increment_turn()
+            turn = self.session.increment_turn()
             response_text = ""
             usage : TokenUsage | None = None
 
@@ -56,7 +60,7 @@ class Agent:
                 compaction_succeeded = False
                 try:
                     summary, summary_usage = await self.session.chat_compactor.compress(self.session.context_manager)
-                    print("Compaction summary:", summary, "Usage:", summary_usage.__dict__ if summary_usage else None)
+                    logger.debug(f"Compaction summary: {summary!r}, usage: {summary_usage.__dict__ if summary_usage else None}")
                     if summary and summary_usage:
                         self.session.context_manager.replace_chat_session(summary)
                         yield AgentEvent(type=AgentEventType.COMPACTION_FINISHED, data={"agent_name": self.session.agentId, "summary": summary, "usage": summary_usage.__dict__})
@@ -74,26 +78,62 @@ class Agent:
                 #     break
             
             tools = self.session.tool_registry.get_schemas()
+            self.session.context_manager.set_tool_schemas(tools)
             message = self.session.context_manager.get_context()
             tool_calls:list[ToolCall] = []
+            # NOTE: tools start as soon as their call is complete, overlapping with the rest of the generation.
+            # the scheduler orders calls that touch the same paths and caps concurrency per tool kind
+            tool_batch = self.session.tool_scheduler.batch(self.config.cwd)
+            short_circuited: set[str] = set()
+            batch_changes_state = False  # an earlier call of this batch may edit what a cached result describes
         
-            async for event in self.session.client.send_message(message, tools = tools if tools else None, stream=True):
-                if event.type == StreamEventType.TEXT_DELTA:
-                    content = event.text_delta.content if event.text_delta else ""
-                    response_text += content
-                    if content:
-                        yield AgentEvent.text_delta(agent_name=self.session.agentId, content=content)
-                elif event.type == StreamEventType.ERROR:
-                    error_message = event.error if event.error else "Unknown error"
-                    yield AgentEvent.agent_error(agent_name=self.session.agentId, message=error_message)
-                    break
-
-                elif event.type == StreamEventType.TOOL_CALL_END:
-                    # we have a complete tool call, now we can execute it
-                    if event.tool_call:
-                        tool_calls.append(event.tool_call)
-                elif event.type == StreamEventType.MESSAGE_COMPLETE:
-                        usage = event.usage if event.usage else None
+            try:
+                async for event in self.session.client.send_message(message, tools = tools if tools else None, stream=True):
+                    if event.type == StreamEventType.TEXT_DELTA:
+                        content = event.text_delta.content if event.text_delta else ""
+                        response_text += content
+                        if content:
+                            yield AgentEvent.text_delta(agent_name=self.session.agentId, content=content)
+                    elif event.type == StreamEventType.ERROR:
+                        error_message = event.error if event.error else "Unknown error"
+                        yield AgentEvent.agent_error(agent_name=self.session.agentId, message=error_message)
+                        break
+
+                    elif event.type == StreamEventType.TOOL_CALL_END:
+                        # we have a complete tool call, now we can execute it
+                        if event.tool_call:
+                            tool_calls.append(event.tool_call)
+                            yield AgentEvent.tool_started(
+                                call_id=event.tool_call.id,
+                                tool_name=event.tool_call.name if event.tool_call.name else "unknown_tool",
+                                arguments=event.tool_call.arguments if event.tool_call.arguments else {}
+                            )
+                            cached = loop_detector.check(event.tool_call, after_state_change=batch_changes_state)
+                            if cached is not None:
+                                short_circuited.add(event.tool_call.id)
+                                tool_batch.submit_resolved(event.tool_call, cached)
+                            else:
+                                tool_batch.submit(event.tool_call)
+                                tool = self.session.tool_registry.get_tool(event.tool_call.name or "")
+                                batch_changes_state = batch_changes_state or loop_detector.changes_state(tool.kind if tool else None)
+                    elif event.type == StreamEventType.MESSAGE_COMPLETE:
+                            usage = event.usage if event.usage else None
+                            # a replay from the response cache carries the original request's usage, it says nothing
+                            # about this prompt and must not reconcile the ledger or calibrate the estimate again
+                            replayed = event.metrics is not None and event.metrics.cached
+                            cache_stats = self.session.context_manager.record_prompt_usage(usage) if usage and not replayed else None
+                            if event.metrics:
+                                self._log_metrics(event.metrics)
+                                yield AgentEvent.llm_metrics(
+                                    agent_name=self.session.agentId,
+                                    turn=turn,
+                                    metrics=event.metrics,
+                                    prompt_cache_hit_ratio=cache_stats.hit_ratio if cache_stats else None,
+                                )
+            except BaseException:
+                # the caller went away mid-stream (Ctrl+C, closed generator), don't leave tools running in the background
+                await tool_batch.aclose()
+                raise
                         
             #NOTE: we will add the assistant message to the context manager after the response is complete, so that we have the full response text available for token counting and other processing if needed. This also allows us to yield a text_complete event with the full response text.
             self.session.context_manager.add_assistant_message(
@@ -115,35 +155,31 @@ class Agent:
                     self.session.prune_manager.prune(self.session.context_manager)
 
                 break
-            for tool_call in tool_calls:
-                yield AgentEvent.tool_started(
-                    call_id=tool_call.id,
-                    tool_name=tool_call.name if tool_call.name else "unknown_tool",
-                    arguments=tool_call.arguments if tool_call.arguments else {}
-                )
-
-
-            invocation_results = await asyncio.gather(
-                *[self._invoke(tc) for tc in tool_calls],
-                return_exceptions=True
-            )
+            try:
+                invocation_results = await tool_batch.results()
+            except BaseException:
+                await tool_batch.aclose()
+                raise
 
             tool_call_result: list[ToolResultMessage] = []
             batch_failed_calls = 0
-            for tc_orig, item in zip(tool_calls, invocation_results):
+            for tc, item in zip(tool_calls, invocation_results):
+                tool_name = tc.name if tc.name else "unknown_tool"
                 if isinstance(item, BaseException):
-                    tool_name = tc_orig.name if tc_orig.name else "unknown_tool"
                     result = ToolResult.error_result(str(item))
                     error_result = ToolResultMessage(
-                        tool_call_id=tc_orig.id,
+                        tool_call_id=tc.id,
                         content=result.to_model_output(),
                         is_error=True
                     )
-                    yield AgentEvent.tool_finished(call_id=tc_orig.id, tool_name=tool_name, result=result)
+                    yield AgentEvent.tool_finished(call_id=tc.id, tool_name=tool_name, result=result)
                     tool_call_result.append(error_result)
                     batch_failed_calls += 1
                     continue
-                tc, tool_name, result = item
+                result = item
+                if tc.id not in short_circuited:
+                    tool = self.session.tool_registry.get_tool(tool_name)
+                    loop_detector.record(tc, result, tool.kind if tool else None)
                 yield AgentEvent.tool_finished(call_id=tc.id, tool_name=tool_name, result=result)
                 if not result.success:
                     batch_failed_calls += 1
@@ -158,6 +194,19 @@ class Agent:
             for tool_result in tool_call_result:
                 self.session.context_manager.add_tool_result(tool_result.tool_call_id, tool_result.content)
 
+            if short_circuited:
+                repeated = sorted({tc.name or "unknown_tool" for tc in tool_calls if tc.id in short_circuited})
+                description = (
+                    f"You called {', '.join(repeated)} again with the same arguments and got the same result as before "
+                    f"({loop_detector.short_circuits} repeated calls this run)."
+                )
+                self.session.context_manager.add_user_message(create_loop_breaker_prompt(description))
+                yield AgentEvent.loop_detected(
+                    agent_name=self.session.agentId,
+                    tool_names=repeated,
+                    short_circuits=loop_detector.short_circuits,
+                )
+
             if usage:
                 self.session.context_manager.add_usage(usage)
 
@@ -168,6 +217,16 @@ class Agent:
             else:
                 consecutive_tool_failures = 0
 
+            if loop_detector.should_stop:
+                yield AgentEvent.agent_error(
+                    agent_name=self.session.agentId,
+                    message=(
+                        "Stopping execution, the agent keeps repeating the same tool calls "
+                        f"({loop_detector.short_circuits} repeated calls short-circuited)."
+                    ),
+                )
+                break
+
             if consecutive_tool_failures >= max_consecutive_tool_failures:
                 yield AgentEvent.agent_error(
                     agent_name=self.session.agentId,
@@ -178,11 +237,17 @@ class Agent:
                 )
                 break
 
-    async def _invoke(self,tc: ToolCall):
-        name = tc.name if tc.name else "unknown_tool"
-        args = tc.arguments if tc.arguments else {}
-        result = await self.session.tool_registry.invoke_tool(name, args, self.config.cwd)
-        return tc, name, result
+    def _log_metrics(self, metrics: RequestMetrics) -> None:
+        def fmt(value: float | None) -> str:
+            return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+        logger.info(
+            f"LLM request ({'cache' if metrics.cached else metrics.endpoint}): "
+            f"queue {fmt(metrics.queue_time)} ttfb {fmt(metrics.ttfb)} ttft {fmt(metrics.ttft)} "
+            f"gap p50/p90/p99 {fmt(metrics.gap_p50)}/{fmt(metrics.gap_p90)}/{fmt(metrics.gap_p99)} "
+            f"total {fmt(metrics.duration)} "
+            f"{f'{metrics.tokens_per_second:.1f} tok/s' if metrics.tokens_per_second else ''}"
+        )
 
     async def __aenter__(self) -> Agent:
         start = time.perf_counter()
@@ -195,5 +260,6 @@ class Agent:
         if self.session:
             if self.session.client:
                 await self.session.client.close()
-            if self.session.mcp_manager:
+            if self.session.mcp_manager and self.session.owns_mcp_manager:
                 await self.session.mcp_manager.shutdown()
+            self.session.close()
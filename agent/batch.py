@@ -0,0 +1,174 @@
+"""Headless batch mode: prompts from a JSONL file run on a fixed number of workers. Each worker owns one Agent for
+its whole life and only resets the session between prompts; all of them share one client pool and its rate limits."""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from config.config import Config
+from llm.pool import ClientPool, get_client_pool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItem:
+    id: str
+    prompt: str
+    index: int = 0
+
+
+@dataclass
+class BatchResult:
+    id: str
+    index: int
+    final_text: str | None = None
+    usage: dict[str, int] | None = None
+    turns: int = 0
+    wall_time: float = 0.0
+    error: str | None = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "success": self.success}
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    failed: int = 0
+    wall_time: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def prompts_per_second(self) -> float:
+        return self.total / self.wall_time if self.wall_time else 0.0
+
+
+def read_batch_file(path: Path) -> Iterator[BatchItem]:
+    """Each line is either {"prompt": ..., "id": ...} (id optional) or a bare JSON string."""
+    with open(path, "r", encoding="utf-8") as f:
+        index = 0
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            if not isinstance(record, dict) or not isinstance(record.get("prompt"), str):
+                raise ValueError(f"{path}:{number}: expected a string or an object with a 'prompt' string")
+            yield BatchItem(id=str(record.get("id", index)), prompt=record["prompt"], index=index)
+            index += 1
+
+
+class BatchRunner:
+    def __init__(self, config: Config, concurrency: int = 8, client_pool: ClientPool | None = None) -> None:
+        # a batch creates hundreds of throwaway conversations, don't journal them
+        self.config = config.model_copy(
+            update={"session_journal": config.session_journal.model_copy(update={"enabled": False})}
+        )
+        self.concurrency = max(1, concurrency)
+        self.client_pool = client_pool or get_client_pool()
+
+    async def run(self, items: Iterable[BatchItem], on_result: Callable[[BatchResult], None]) -> BatchStats:
+        stats = BatchStats()
+        # bounded, so a huge input file is read only as fast as the workers drain it
+        queue: asyncio.Queue[BatchItem | None] = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        def record(result: BatchResult) -> None:
+            stats.total += 1
+            stats.failed += 0 if result.success else 1
+            stats.latencies.append(result.wall_time)
+            if result.usage:
+                stats.prompt_tokens += result.usage.get("prompt_tokens", 0)
+                stats.completion_tokens += result.usage.get("completion_tokens", 0)
+            on_result(result)
+
+        async def produce() -> None:
+            # the items may come straight from a file, read them off the event loop the workers share
+            iterator = iter(items)
+            while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+                await queue.put(item)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(self._worker(queue, record)) for _ in range(self.concurrency)]
+        try:
+            # a worker that fails to start raises here instead of leaving the producer blocked on a full queue
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        stats.wall_time = time.perf_counter() - start
+        return stats
+
+    async def _worker(self, queue: asyncio.Queue[BatchItem | None], on_result: Callable[[BatchResult], None]) -> None:
+        async with Agent(self.config, client_pool=self.client_pool) as agent:
+            while (item := await queue.get()) is not None:
+                try:
+                    on_result(await self.run_one(agent, item))
+                finally:
+                    agent.session.reset()
+
+    async def run_one(self, agent: Agent, item: BatchItem) -> BatchResult:
+        result = BatchResult(id=item.id, index=item.index)
+        start = time.perf_counter()
+        try:
+            async for event in agent.run(item.prompt):
+                if event.type == AgentEventType.TEXT_COMPLETE:
+                    result.final_text = event.data.get("content")
+                elif event.type == AgentEventType.AGENT_ERROR:
+                    result.error = event.data.get("message") or "unknown error"
+        except Exception as e:
+            logger.exception(f"Batch item {item.id} failed")
+            result.error = f"{type(e).__name__}: {e}"
+
+        result.wall_time = time.perf_counter() - start
+        result.turns = agent.session.turn_count
+        if agent.session.context_manager is not None:
+            result.usage = asdict(agent.session.context_manager.get_total_usage())
+        return result
+
+
+async def run_batch_file(
+    config: Config, input_path: Path, output_path: Path | None, concurrency: int = 8, client_pool: ClientPool | None = None
+) -> BatchStats:
+    """Run every prompt of `input_path`, writing one JSON line per result to `output_path` (stdout when None)."""
+    runner = BatchRunner(config, concurrency=concurrency, client_pool=client_pool)
+    output = await asyncio.to_thread(open, output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    # results are written by one task on a worker thread, a slow disk or a piped stdout doesn't stall the workers
+    pending: asyncio.Queue[BatchResult | None] = asyncio.Queue()
+
+    def write(line: str) -> None:
+        output.write(line)
+        output.flush()
+
+    async def write_results() -> None:
+        while (result := await pending.get()) is not None:
+            await asyncio.to_thread(write, json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+
+    writer = asyncio.create_task(write_results())
+    try:
+        return await runner.run(read_batch_file(input_path), pending.put_nowait)
+    finally:
+        pending.put_nowait(None)
+        try:
+            await writer
+        finally:
+            if output_path:
+                await asyncio.to_thread(output.close)
+            await runner.client_pool.aclose()
@@ -0,0 +1,111 @@
+"""Sits between Agent.run() and a consumer (TUI, SSE). Consecutive TEXT_DELTAs are merged for a short window,
+any other event flushes them first, and a bounded queue makes the producer wait for a slow consumer."""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import AsyncGenerator, AsyncIterator
+
+from agent.events import AgentEvent, AgentEventType, TextDeltaEvent
+from config.config import EventBusConfig
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class EventBus:
+    def __init__(self, config: EventBusConfig | None = None) -> None:
+        self.config = config or EventBusConfig()
+        self.received = 0  # events from the source
+        self.delivered = 0  # events handed to the consumer, after coalescing
+
+    async def stream(self, source: AsyncIterator[AgentEvent]) -> AsyncGenerator[AgentEvent, None]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.config.queue_size)
+        producer = asyncio.create_task(self._produce(source, queue))
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self.delivered += 1
+                yield item
+        finally:
+            # the consumer went away (or finished): stop the producer, which closes the source
+            if not producer.done():
+                producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _produce(self, source: AsyncIterator[AgentEvent], queue: asyncio.Queue) -> None:
+        window = self.config.coalesce_window_ms / 1000
+        max_chars = self.config.coalesce_max_chars
+        parts: list[str] = []
+        size = 0
+        agent_name = ""
+        deadline = 0.0
+        pending: asyncio.Task | None = None
+
+        async def flush() -> None:
+            nonlocal size
+            if parts:
+                event = TextDeltaEvent(agent_name, "".join(parts))
+                parts.clear()
+                size = 0
+                await queue.put(event)
+
+        iterator = source.__aiter__()
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                if parts:
+                    # wait for the next event only until the buffered text is due
+                    done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - time.monotonic()))
+                    if not done:
+                        await flush()
+                        continue
+                else:
+                    await asyncio.wait({pending})
+
+                task, pending = pending, None
+                try:
+                    event = task.result()
+                except StopAsyncIteration:
+                    break
+                self.received += 1
+
+                if event.type == AgentEventType.TEXT_DELTA and window > 0:
+                    content = event.content if isinstance(event, TextDeltaEvent) else event.data.get("content", "")
+                    if not parts:
+                        agent_name = event.agent_name if isinstance(event, TextDeltaEvent) else event.data.get("agent_name", "")
+                        deadline = time.monotonic() + window
+                    parts.append(content)
+                    size += len(content)
+                    if size >= max_chars:
+                        await flush()
+                    continue
+
+                await flush()
+                await queue.put(event)
+
+            await flush()
+            await queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            if pending is not None:
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                    pass
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -1,10 +1,10 @@
 from __future__ import annotations
 from enum import Enum
-from dataclasses import dataclass , field
+from dataclasses import asdict
 from typing import Any
 
-from lib.response import TokenUsage
-from tools.base import ToolResult
+from lib.response import RequestMetrics, TokenUsage
+from tools.base import FileDiff, ToolResult
 
 
 class AgentEventType(str,Enum):
@@ -20,17 +20,43 @@ class AgentEventType(str,Enum):
     COMPACTION_FINISHED = "compaction_finished"
     COMPACTION_FAILED = "compaction_failed"
 
+    # per-request latency breakdown, see lib.response.RequestMetrics
+    LLM_METRICS = "llm_metrics"
+
+    # a tool call was short-circuited as a repeat, see agent.loop_detector
+    LOOP_DETECTED = "loop_detected"
+
     # Tool events
     TOOL_STARTED = "tool_started"
     TOOL_FINISHED = "tool_finished"
     TOOL_ERROR = "tool_error"
 
 
-@dataclass
 class AgentEvent:
-    type: AgentEventType
-    data: dict[str,Any] = field(default_factory=dict)
-    
+    # NOTE: __slots__ instead of a dataclass, a fast model produces hundreds of these per second
+    __slots__ = ("type", "_data")
+
+    def __init__(self, type: AgentEventType, data: dict[str, Any] | None = None) -> None:
+        self.type = type
+        self._data = data if data is not None else {}
+
+    @property
+    def data(self) -> dict[str, Any]:
+        return self._data
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AgentEvent) and self.type == other.type and self.data == other.data
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(type={self.type.value!r}, data={self.data!r})"
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON-ready form for clients outside the process (server mode)."""
+        data = {key: value for key, value in self.data.items() if key != "result"}  # 'result' repeats the other keys
+        if isinstance(data.get("diff"), FileDiff):
+            data["diff"] = data["diff"].to_diff()
+        return {"type": self.type.value, "data": data}
+
     @classmethod
     def agent_started(cls, agent_name: str, message:str) -> AgentEvent:
         return cls(
@@ -61,11 +87,8 @@ class AgentEvent:
 
 
     @classmethod
-    def text_delta(cls, agent_name: str, content:str) -> AgentEvent:
-        return cls(
-            type=AgentEventType.TEXT_DELTA,
-            data={"agent_name": agent_name , 'content':content }
-        )
+    def text_delta(cls, agent_name: str, content:str) -> TextDeltaEvent:
+        return TextDeltaEvent(agent_name, content)
 
 
     @classmethod
@@ -77,6 +100,27 @@ class AgentEvent:
                   }
             )
 
+    @classmethod
+    def llm_metrics(
+        cls, agent_name: str, turn: int, metrics: RequestMetrics, prompt_cache_hit_ratio: float | None = None
+    ) -> AgentEvent:
+        return cls(
+            type=AgentEventType.LLM_METRICS,
+            data={
+                "agent_name": agent_name,
+                "turn": turn,
+                **asdict(metrics),
+                "prompt_cache_hit_ratio": prompt_cache_hit_ratio,  # cached / prompt tokens over the session
+            }
+        )
+
+    @classmethod
+    def loop_detected(cls, agent_name: str, tool_names: list[str], short_circuits: int) -> AgentEvent:
+        return cls(
+            type=AgentEventType.LOOP_DETECTED,
+            data={"agent_name": agent_name, "tool_names": tool_names, "short_circuits": short_circuits}
+        )
+
     @classmethod
     def tool_started(cls, call_id: str , tool_name :str , arguments:dict[str,Any]) -> AgentEvent:
         return cls(
@@ -103,3 +147,19 @@ class AgentEvent:
                 }
         )
 
+
+class TextDeltaEvent(AgentEvent):
+    """The hot path: no dict is built unless a consumer asks for `data`, read `content` directly instead."""
+    __slots__ = ("agent_name", "content")
+
+    def __init__(self, agent_name: str, content: str) -> None:
+        self.type = AgentEventType.TEXT_DELTA
+        self._data = None
+        self.agent_name = agent_name
+        self.content = content
+
+    @property
+    def data(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = {"agent_name": self.agent_name, "content": self.content}
+        return self._data
@@ -0,0 +1,106 @@
+"""Detects the agent repeating itself within one run. A call that already returned the same result
+`short_circuit_after` times in the window isn't run again, it gets the cached result with a loop notice; after
+`stop_after` of those the run stops. Calls that can change the workspace reset the window."""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass, replace
+
+from config.config import LoopDetectionConfig
+from lib.response import ToolCall
+from tools.base import ToolKind, ToolResult
+
+logger = logging.getLogger(__name__)
+
+_CHANGES_STATE = frozenset({ToolKind.WRITE, ToolKind.SHELL, ToolKind.MCP})
+
+
+@dataclass
+class _Seen:
+    result: ToolResult
+    pair_hash: str
+
+
+class LoopDetector:
+    def __init__(self, config: LoopDetectionConfig) -> None:
+        self.config = config
+        self._window: deque[str] = deque()
+        self._counts: Counter[str] = Counter()
+        self._last: dict[str, _Seen] = {}  # call hash -> latest result of that call
+        self.short_circuits = 0
+
+    @staticmethod
+    def _call_hash(tool_call: ToolCall) -> str:
+        payload = json.dumps([tool_call.name, tool_call.arguments or {}], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _result_digest(result: ToolResult) -> str:
+        digest = hashlib.sha1()
+        digest.update(b"1" if result.success else b"0")
+        digest.update((result.output or "").encode("utf-8", errors="replace"))
+        digest.update((result.error or "").encode("utf-8", errors="replace"))
+        return digest.hexdigest()
+
+    def repeats(self, tool_call: ToolCall) -> int:
+        """How often this call already returned its latest result within the window."""
+        seen = self._last.get(self._call_hash(tool_call))
+        return self._counts[seen.pair_hash] if seen else 0
+
+    @staticmethod
+    def changes_state(kind: ToolKind | None) -> bool:
+        return kind in _CHANGES_STATE
+
+    def check(self, tool_call: ToolCall, after_state_change: bool = False) -> ToolResult | None:
+        """The cached result with a loop notice when the call shouldn't run again, None to run it.
+
+        `after_state_change` is set when an earlier call of the same batch can change the workspace. That call may
+        still be running and isn't recorded yet, so a cached result could be stale and the call always runs."""
+        if not self.config.enabled or after_state_change:
+            return None
+        seen = self._last.get(self._call_hash(tool_call))
+        if seen is None:
+            return None
+        count = self._counts[seen.pair_hash]
+        if count < self.config.short_circuit_after:
+            return None
+
+        self.short_circuits += 1
+        logger.warning(f"Loop detected: '{tool_call.name}' returned the same result {count} times, not running it again")
+        notice = (
+            f"\n\n[loop detected: this exact call already returned this result {count} times. "
+            "The tool was not run again, the result above is cached. Try a different approach.]"
+        )
+        return replace(
+            seen.result,
+            output=(seen.result.output or "") + notice,
+            metadata={**seen.result.metadata, "loop_detected": True, "repeats": count},
+        )
+
+    def record(self, tool_call: ToolCall, result: ToolResult, kind: ToolKind | None = None) -> None:
+        if not self.config.enabled:
+            return
+        call_hash = self._call_hash(tool_call)
+        pair_hash = hashlib.sha1((call_hash + self._result_digest(result)).encode("ascii")).hexdigest()
+
+        if kind in _CHANGES_STATE:
+            # the workspace may have changed, earlier results of other calls say nothing about a loop anymore
+            kept = self._last.get(call_hash)
+            self._last = {call_hash: kept} if kept else {}
+            self._window = deque(h for h in self._window if kept and h == kept.pair_hash)
+            self._counts = Counter(self._window)
+
+        self._last[call_hash] = _Seen(result=result, pair_hash=pair_hash)
+        self._window.append(pair_hash)
+        self._counts[pair_hash] += 1
+        while len(self._window) > self.config.window:
+            old = self._window.popleft()
+            self._counts[old] -= 1
+            if self._counts[old] <= 0:
+                del self._counts[old]
+
+    @property
+    def should_stop(self) -> bool:
+        return self.config.enabled and self.short_circuits >= self.config.stop_after
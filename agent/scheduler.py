@@ -0,0 +1,153 @@
+"""Runs the tool calls of a turn as concurrently as is safe. A call waits for the earlier calls of its batch that
+touch the same paths (write/write or read/write, parent directories included); shell and MCP calls count as a write
+of the whole workspace, read-only sub-agents as a read of it. Each ToolKind also has its own concurrency cap, and the batch a global one."""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from config.config import Config
+from lib.response import ToolCall
+from tools.base import ResourceAccess, ToolInvocation, ToolResult
+from tools.registry import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ScheduledCall:
+    tool_call: ToolCall
+    resources: list[ResourceAccess]
+    task: asyncio.Task | None = None
+
+
+@dataclass
+class SchedulerStats:
+    submitted: int = 0
+    waited_on_conflict: int = 0  # calls that had to wait for an earlier conflicting call
+    peak_running: int = 0
+
+
+class ToolScheduler:
+    def __init__(self, registry: ToolRegistry, config: Config) -> None:
+        self.registry = registry
+        self.config = config
+        self.stats = SchedulerStats()
+        self._running = 0
+        self._global: asyncio.Semaphore | None = None
+        self._per_kind: dict[str, asyncio.Semaphore] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _semaphores(self, kind: str) -> list[asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # semaphores are bound to the loop they are first used on
+            self._loop = loop
+            self._global = asyncio.Semaphore(self.config.tool_scheduler.max_concurrent_tools)
+            self._per_kind = {}
+
+        semaphores = []
+        limit = self.config.tool_scheduler.max_concurrent_per_kind.get(kind)
+        if limit is not None:
+            if kind not in self._per_kind:
+                self._per_kind[kind] = asyncio.Semaphore(max(1, limit))
+            semaphores.append(self._per_kind[kind])
+        semaphores.append(self._global)
+        return semaphores
+
+    def batch(self, cwd: Path | None = None) -> ToolBatch:
+        return ToolBatch(self, cwd or self.config.cwd, self.config.tool_timeouts.turn_budget_seconds)
+
+    async def _run(self, call: _ScheduledCall, depends_on: list[asyncio.Task], cwd: Path, deadline: float | None) -> ToolResult:
+        if depends_on:
+            self.stats.waited_on_conflict += 1
+            # the outcome of the earlier call doesn't matter, only that it's no longer touching the resource
+            await asyncio.gather(*depends_on, return_exceptions=True)
+
+        name = call.tool_call.name or "unknown_tool"
+        tool = self.registry.get_tool(name)
+        kind = tool.kind.value if tool else ""
+
+        acquired: list[asyncio.Semaphore] = []
+        try:
+            for semaphore in self._semaphores(kind):
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            self._running += 1
+            self.stats.peak_running = max(self.stats.peak_running, self._running)
+            try:
+                return await self.registry.invoke_tool(name, call.tool_call.arguments or {}, cwd, deadline=deadline)
+            finally:
+                self._running -= 1
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+
+class ToolBatch:
+    """The tool calls of one model response. Calls can be submitted while the response is still streaming."""
+
+    def __init__(self, scheduler: ToolScheduler, cwd: Path, budget: float | None = None) -> None:
+        self.scheduler = scheduler
+        self.cwd = cwd
+        self.budget = budget
+        # time.monotonic() value shared by every call of the batch. the batch is created before the response
+        # streams, so the clock starts with the first call, the model's generation time isn't tool time
+        self.deadline: float | None = None
+        self._calls: list[_ScheduledCall] = []
+
+    def _resources(self, tool_call: ToolCall) -> list[ResourceAccess]:
+        tool = self.scheduler.registry.get_tool(tool_call.name or "")
+        if tool is None:
+            return []
+        try:
+            return tool.get_resource_access(ToolInvocation(cwd=self.cwd, params=tool_call.arguments or {}))
+        except Exception as e:
+            logger.warning(f"Could not determine resources of '{tool_call.name}', running it unordered: {e}")
+            return []
+
+    def submit(self, tool_call: ToolCall) -> asyncio.Task:
+        if self.deadline is None and self.budget is not None:
+            self.deadline = time.monotonic() + self.budget
+        call = _ScheduledCall(tool_call=tool_call, resources=self._resources(tool_call))
+        depends_on = [
+            earlier.task
+            for earlier in self._calls
+            if earlier.task is not None and any(
+                mine.conflicts_with(theirs) for mine in call.resources for theirs in earlier.resources
+            )
+        ]
+        call.task = asyncio.create_task(self.scheduler._run(call, depends_on, self.cwd, self.deadline))
+        self._calls.append(call)
+        self.scheduler.stats.submitted += 1
+        return call.task
+
+    def submit_resolved(self, tool_call: ToolCall, result: ToolResult) -> asyncio.Future:
+        """Add a call whose result is already known (e.g. short-circuited by loop detection), it doesn't run."""
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        # no resources: nothing runs, so later calls have nothing to wait for
+        self._calls.append(_ScheduledCall(tool_call=tool_call, resources=[], task=future))
+        return future
+
+    @property
+    def tool_calls(self) -> list[ToolCall]:
+        return [call.tool_call for call in self._calls]
+
+    async def results(self) -> list[ToolResult | BaseException]:
+        """Results in submission order, exceptions are returned rather than raised."""
+        return await asyncio.gather(*(call.task for call in self._calls), return_exceptions=True)
+
+    def cancel(self) -> None:
+        for call in self._calls:
+            if call.task is not None:
+                call.task.cancel()
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Cancel the calls still running and wait for their cleanup, e.g. killing a shell's process group."""
+        self.cancel()
+        tasks = [call.task for call in self._calls if call.task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
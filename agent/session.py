@@ -1,26 +1,34 @@
 import uuid
 import asyncio
 from datetime import datetime
+from pathlib import Path
 
+from agent.scheduler import ToolScheduler
 from config.config import Config
+from config.loader import get_data_dir
 from context.compaction import ChatCompactor
 from context.context_manager import ContextManager
+from context.journal import SessionInfo, SessionJournal, list_sessions
 from context.pruning import PruningConfig, SlidingWindowPruner
 from llm.client import LLMProvider
+from llm.pool import ClientPool
 from tools.discovery import ToolDiscoveryManger
 from tools.mcp.mcp_manager import MCPManager
 from tools.registry import create_tool_registry
 
 
 class Session:
-    def __init__(self,config:Config):
-        self.client = LLMProvider(config)
+    def __init__(self,config:Config, client_pool: ClientPool | None = None, mcp_manager: MCPManager | None = None):
+        self.client = LLMProvider(config, client_pool=client_pool)
         self.agentId : str = "agent_black"
-        self.tool_registry = create_tool_registry(config)
+        self.tool_registry = create_tool_registry(config, client_pool=self.client.pool)
+        self.tool_scheduler = ToolScheduler(self.tool_registry, config)
         self.context_manager = None
         self.config = config
         self.discovery_manager = ToolDiscoveryManger(config,self.tool_registry)
-        self.mcp_manager = MCPManager(config)
+        # a manager passed in is shared with other sessions (server mode) and shut down by its owner
+        self.owns_mcp_manager = mcp_manager is None
+        self.mcp_manager = mcp_manager or MCPManager(config)
         self.chat_compactor = ChatCompactor(self.client)
         self.prune_manager = SlidingWindowPruner(
             PruningConfig(
@@ -41,10 +49,79 @@ class Session:
     async def initialize(self):
         self.mcp_manager.start_background_tasks(self.tool_registry)
         self.discovery_manager.discover_all() # discover tools again after registering mcp tools, so that we can update the tool registry with the new tools
-        self.context_manager = ContextManager(self.config,tools=self.tool_registry.get_tools())
+        self.context_manager = ContextManager(self.config,tools=self.tool_registry.get_tools(), journal=self._new_journal())
+
+    def reset(self) -> None:
+        """Start a new conversation on this session, keeping its tools, MCP servers and LLM clients warm."""
+        self.close()
+        self.sessionId = str(uuid.uuid4())
+        self.createdAt = self.updatedAt = datetime.now()
+        self._turn_count = 0
+        self.tool_registry.reset()
+        self.context_manager = ContextManager(self.config,tools=self.tool_registry.get_tools(), journal=self._new_journal())
+
+    def _new_journal(self) -> SessionJournal | None:
+        if not self.config.session_journal.enabled:
+            return None
+        return SessionJournal(
+            get_sessions_dir() / f"{self.sessionId}.jsonl",
+            self.sessionId,
+            snapshot_every=self.config.session_journal.snapshot_every,
+        )
+
+    def resume(self, session_id: str) -> bool:
+        """Replace the context with a saved session's. `session_id` may be a unique prefix."""
+        if self.context_manager is None:
+            return False
+        path = get_sessions_dir() / f"{session_id}.jsonl"
+        if not path.is_file():
+            matches = [info for info in list_sessions(get_sessions_dir()) if info.session_id.startswith(session_id)]
+            if len(matches) != 1:
+                return False
+            path = matches[0].path
+
+        journal, state = SessionJournal.load(path, snapshot_every=self.config.session_journal.snapshot_every)
+        if self.context_manager.journal is not None:
+            self.context_manager.journal.close()
+        self.context_manager.journal = journal
+        self.context_manager.restore(state)
+        self.sessionId = state.session_id
+        self.updatedAt = datetime.now()
+        return True
+
+    def close(self) -> None:
+        if self.context_manager is not None and self.context_manager.journal is not None:
+            self.context_manager.journal.close()
 
 
+    def get_stats(self) -> dict:
+        cache = self.tool_registry.result_cache.stats
+        stats = {
+            "session_id": self.sessionId,
+            "turns": self.turn_count,
+            "tool_calls": self.tool_scheduler.stats.submitted,
+            "tool_cache_hits": cache.hits,
+            "tool_cache_misses": cache.misses,
+            "tool_cache_hit_rate": cache.hit_rate,
+            "tool_cache_invalidations": cache.invalidations,
+        }
+        if self.context_manager is not None:
+            stats["prompt_cache_hit_ratio"] = self.context_manager.prompt_cache_stats.hit_ratio
+        return stats
+
+    @property
+    def turn_count(self) -> int:
+        return self._turn_count
+
     def increment_turn(self)->int:
         self._turn_count += 1
         self.updatedAt = datetime.now()
         return self._turn_count
+
+
+def get_sessions_dir() -> Path:
+    return get_data_dir() / "sessions"
+
+
+def get_saved_sessions() -> list[SessionInfo]:
+    return list_sessions(get_sessions_dir())
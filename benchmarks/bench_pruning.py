@@ -0,0 +1,67 @@
+"""Cost of one prune as a session grows: n messages, one prune to build the index, then a prune every `--every`
+appended messages like a long running session:
+
+    python -m benchmarks.bench_pruning --sizes 1000 10000 50000"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from context.context_manager import ContextManager
+from context.pruning import PruningConfig, SlidingWindowPruner
+from lib.text import estimate_token_count
+
+
+def _fill(manager: ContextManager, start: int, count: int) -> None:
+    for index in range(start, start + count):
+        kind = index % 4
+        if kind == 0:
+            manager.add_user_message(f"step {index}: " + "please continue " * 8)
+        elif kind == 1:
+            call = {"id": f"call_{index}", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}
+            manager.add_assistant_message("", [call])
+        elif kind == 2:
+            manager.add_tool_result(f"call_{index - 1}", "line of output\n" * 40)
+        else:
+            manager.add_assistant_message("checked the output " * 10, None)
+
+
+def run(size: int, every: int, rounds: int) -> tuple[float, float]:
+    manager = ContextManager(Config(), tools=[])
+    _fill(manager, 0, size)
+    budget = manager.ledger.message_tokens * 9 // 10  # a prune evicts roughly `every` messages' worth
+    pruner = SlidingWindowPruner(PruningConfig(max_window_tokens=manager.ledger.overhead_tokens + budget, keep_recent_tool_results=size))
+
+    start = time.perf_counter()
+    pruner.prune(manager)
+    first = time.perf_counter() - start
+
+    elapsed = 0.0
+    for round_index in range(rounds):
+        _fill(manager, size + round_index * every, every)
+        start = time.perf_counter()
+        pruner.prune(manager)
+        elapsed += time.perf_counter() - start
+    return first, elapsed / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark incremental context pruning")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="messages in the context")
+    parser.add_argument("--every", type=int, default=8, help="messages appended between prunes")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch("context.context_manager.get_data_dir", return_value=Path(tmp)), \
+            mock.patch("context.context_manager.count_tokens", side_effect=lambda text, model=None: estimate_token_count(text)):
+        print(f"{'messages':>9} {'first prune ms':>15} {'steady prune ms':>16}")
+        for size in args.sizes:
+            first, steady = run(size, args.every, args.rounds)
+            print(f"{size:>9} {first * 1000:>15.2f} {steady * 1000:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
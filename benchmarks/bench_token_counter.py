@@ -0,0 +1,68 @@
+"""Token counting the way the context manager and pruner do it, the same messages counted again and again. Compares
+resolving the encoding on every call with the cached TokenCounter, one by one and through count_many:
+
+    python -m benchmarks.bench_token_counter --messages 2000 --rounds 5
+
+Needs the tiktoken encoding in its cache (or network access), otherwise only the estimate is timed."""
+import argparse
+import random
+import string
+import time
+
+import tiktoken
+
+from lib.tokens import TokenCounter
+
+
+def _messages(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))) for _ in range(2000)]
+    # mostly short chat turns, every tenth a tool output of a few KB
+    return [" ".join(rng.choices(words, k=rng.randint(20, 80) if index % 10 else rng.randint(500, 2000))) for index in range(count)]
+
+
+def _uncached(texts: list[str], model: str) -> int:
+    total = 0
+    for text in texts:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        total += len(encoding.encode_ordinary(text))
+    return total
+
+
+def _timed(fn) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cached token counting")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5, help="times the whole conversation is counted again")
+    parser.add_argument("--model", default="gpt-4")
+    args = parser.parse_args()
+
+    texts = _messages(args.messages)
+    counter = TokenCounter(args.model)
+    print(f"model {args.model}: {'tiktoken ' + counter.encoding.name if counter.exact else 'no encoding, estimating'}")
+    print(f"{'variant':>18} {'seconds':>9} {'tokens':>10}")
+
+    if counter.exact:
+        elapsed, total = _timed(lambda: sum(_uncached(texts, args.model) for _ in range(args.rounds)))
+        print(f"{'uncached':>18} {elapsed:>9.3f} {total:>10}")
+
+    elapsed, total = _timed(lambda: sum(counter.count(text) for _ in range(args.rounds) for text in texts))
+    print(f"{'TokenCounter.count':>18} {elapsed:>9.3f} {total:>10}")
+
+    print(f"cache hits {counter.hits} misses {counter.misses}")
+
+    counter.clear()
+    elapsed, total = _timed(lambda: sum(sum(counter.count_many(texts)) for _ in range(args.rounds)))
+    print(f"{'count_many':>18} {elapsed:>9.3f} {total:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Throughput of LLMProvider._stream_response on one large tool call (think write_file with a big `content`).
+The chunks are pre-parsed, so only the provider's per-chunk work is timed:
+
+    python -m benchmarks.bench_tool_call_stream --sizes 10000 200000 1000000 --fragment 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from unittest import mock
+
+from config.config import Config
+from lib.response import StreamEventType
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+from llm.replay import FakeChatClient, make_tool_call_response
+
+
+async def run(size: int, fragment: int) -> tuple[float, int]:
+    arguments = json.dumps({"path": "big.txt", "content": "x" * size})
+    client = FakeChatClient(make_tool_call_response([("write_file", arguments)], chunk_size=fragment))
+
+    with mock.patch.dict(os.environ, {"API_KEY": "bench", "BASE_URL": "http://bench.invalid/v1"}):
+        provider = LLMProvider(Config(), client_pool=ClientPool())
+
+    start = time.perf_counter()
+    received = 0
+    async for event in provider._stream_response(client, {}):
+        if event.type == StreamEventType.TOOL_CALL_DELTA:
+            received += len(event.tool_call_delta.arguments)
+        elif event.type == StreamEventType.TOOL_CALL_END:
+            assert len(event.tool_call.arguments["content"]) == size
+    return time.perf_counter() - start, received
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark streaming of large tool-call arguments")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 200_000, 1_000_000], help="size of the `content` argument in bytes")
+    parser.add_argument("--fragment", type=int, default=8, help="characters per streamed argument fragment")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'chunks':>8} {'seconds':>9} {'MB/s':>8}")
+    for size in args.sizes:
+        elapsed, received = asyncio.run(run(size, args.fragment))
+        print(f"{size:>10} {received // args.fragment:>8} {elapsed:>9.3f} {received / elapsed / 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
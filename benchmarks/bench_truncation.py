@@ -0,0 +1,104 @@
+"""Truncating multi-megabyte tool outputs through the registry's output limiter and truncate_text_by_tokens. The
+"legacy" rows are the previous algorithms, one count per line and a binary search re-tokenizing a prefix per probe:
+
+    python -m benchmarks.bench_truncation --sizes 1 4 10 --max-tokens 50000
+
+Needs the tiktoken encoding in its cache (or network access), otherwise only the estimate is timed."""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from config.config import Config
+from lib.text import truncate_text_by_tokens
+from lib.tokens import TokenCounter, get_token_counter
+from tools.base import ToolInvocation
+from tools.builtin.read_file import ReadFileTool
+from tools.output_store import BlobStore, ToolOutputLimiter
+
+
+def _legacy_by_lines(text: str, allowed_tokens: int, counter: TokenCounter, suffix: str) -> str:
+    truncated_text = ""
+    current_tokens = 0
+    for line in text.splitlines():
+        line_tokens = counter._encode_count(line + "\n")
+        if current_tokens + line_tokens > allowed_tokens:
+            break
+        truncated_text += line + "\n"
+        current_tokens += line_tokens
+    return truncated_text.rstrip("\n") + suffix
+
+
+def _legacy_by_chars(text: str, allowed_tokens: int, counter: TokenCounter, suffix: str) -> str:
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high) // 2
+        if counter._encode_count(text[:mid] + suffix) <= allowed_tokens:
+            low = mid + 1
+        else:
+            high = mid
+    return text[:low - 1] + suffix
+
+
+def _source(size_mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["def", "return", "self", "value", "config", "import", "result", "=", "(", ")", ":", "None", "if", "for"]
+    lines = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        line = "    " * rng.randint(0, 3) + " ".join(rng.choices(words, k=rng.randint(3, 14)))
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def _timed(fn) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark token-exact truncation of large outputs")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 10], help="output sizes in MB")
+    parser.add_argument("--max-tokens", type=int, default=50_000)
+    parser.add_argument("--legacy", action="store_true", help="also time the previous algorithms (slow)")
+    args = parser.parse_args()
+
+    counter = get_token_counter()
+    print(f"tokenizer: {'tiktoken ' + counter.encoding.name if counter.exact else 'no encoding, estimating'}")
+    print(f"{'MB':>6} {'variant':>22} {'seconds':>9} {'output chars':>13}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = ToolOutputLimiter(args.max_tokens, BlobStore(Path(tmp) / "blobs"), token_counter=counter)
+        read_file = ReadFileTool(Config(cwd=Path(tmp)))
+        for size_mb in args.sizes:
+            text = _source(size_mb)
+            path = Path(tmp) / "big.py"
+            path.write_text(text, encoding="utf-8")
+            counter.clear()
+
+            async def read() -> str:
+                result = await read_file.execute(ToolInvocation(cwd=Path(tmp), params={"path": str(path)}))
+                return limiter.apply(result).output or result.error
+
+            rows = [
+                ("read_file + limiter", lambda: asyncio.run(read())),
+                ("shell, middle", lambda: truncate_text_by_tokens(text, args.max_tokens, mode="middle")),
+                ("head, lines", lambda: truncate_text_by_tokens(text, args.max_tokens)),
+            ]
+            if args.legacy:
+                suffix = "\n...[truncated]"
+                rows += [
+                    ("legacy head, lines", lambda: _legacy_by_lines(text, args.max_tokens - 5, counter, suffix)),
+                    ("legacy head, chars", lambda: _legacy_by_chars(text, args.max_tokens - 5, counter, suffix)),
+                ]
+            for name, fn in rows:
+                elapsed, output = _timed(fn)
+                print(f"{size_mb:>6} {name:>22} {elapsed:>9.3f} {len(output):>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,10 @@ import time
 from pathlib import Path
 from typing import Callable
 from agent.agent import Agent
+from agent.event_bus import EventBus
+from agent.session import get_saved_sessions
 from config.config import Config
+from llm.pool import get_client_pool
 from agent.events import AgentEventType
 from ui.tui import TUI, get_console
 from prompt_toolkit import PromptSession
@@ -22,7 +25,7 @@ console = get_console()
 COMMANDS = [
     "/help", "/exit", "/quit", "/clear",
     "/config", "/model", "/stats", "/tools",
-    "/save", "/sessions", "/mcp"
+    "/save", "/sessions", "/resume", "/mcp"
 ]
 
 class SystemCommandCompleter(Completer):
@@ -154,9 +157,12 @@ class CLI:
             str | None: final response from the agent, or None if there was an error
         """
 
-        async with Agent(self.config) as agent:
-            self.agent = agent
-            return await self._process_message(message)
+        try:
+            async with Agent(self.config) as agent:
+                self.agent = agent
+                return await self._process_message(message)
+        finally:
+            await get_client_pool().aclose()
 
     async def _process_message(self, message:str) -> str | None:
         """ Process a user message by sending it to the agent and handling the response events.
@@ -193,7 +199,7 @@ class CLI:
         self.tui.begin_assistant()
         final_response = None
         
-        async for event in self.agent.run(message):
+        async for event in EventBus(self.config.event_bus).stream(self.agent.run(message)):
             # print("Received event:", event.type, event.data)  # Debugging log
             match event.type:
                 case AgentEventType.AGENT_STARTED:
@@ -203,8 +209,7 @@ class CLI:
                     self.tui.assistant_thinking("Thinking")
                     
                 case AgentEventType.TEXT_DELTA:
-                    content = event.data.get("content", "")
-                    self.tui.stream_assistant_delta(content)
+                    self.tui.stream_assistant_delta(event.content)
                     
                 case AgentEventType.TEXT_COMPLETE:
                     content = event.data.get("content", "No content")
@@ -257,6 +262,14 @@ class CLI:
                     reason = event.data.get('reason', 'Unknown reason')
                     self.tui.warning(f"Context compaction failed: {reason}")
 
+                case AgentEventType.LOOP_DETECTED:
+                    tool_names = ", ".join(event.data.get('tool_names', []))
+                    self.tui.warning(f"Loop detected: repeated call to {tool_names} was not run again")
+
+                case AgentEventType.LLM_METRICS:
+                    if self.config.debug:
+                        self.tui.llm_metrics(event.data)
+
 
         self.tui.end_assistant()
         return final_response
@@ -315,6 +328,25 @@ class CLI:
                     self.tui.show_help()
                 elif cmd == "/clear":
                     console.clear()
+                elif cmd == "/save":
+                    self.agent.session.context_manager.save()
+                    self.tui.success(f"Session saved: {self.agent.session.sessionId}")
+                elif cmd == "/sessions":
+                    sessions = get_saved_sessions()
+                    if sessions:
+                        self.tui.show_sessions(sessions, current=self.agent.session.sessionId)
+                    else:
+                        self.tui.warning("No saved sessions.")
+                elif cmd.startswith("/resume"):
+                    session_id = cmd.removeprefix("/resume").strip()
+                    if not session_id:
+                        self.tui.warning("Usage: /resume <session id>")
+                    elif self.agent.session.resume(session_id):
+                        self.tui.success(f"Resumed session {self.agent.session.sessionId}")
+                    else:
+                        self.tui.warning(f"No unique saved session matches '{session_id}'.")
+                elif cmd == "/stats":
+                    self.tui.show_stats(self.agent.session.get_stats())
                 elif cmd == "/mcp":
                     mcp_servers = self.agent.session.mcp_manager.get_all_servers()
                     if mcp_servers:
@@ -339,6 +371,8 @@ class CLI:
                         self.tui.end_assistant()
                         console.print("\n[dim]⏹ Cancelled[/dim]")
 
+        await get_client_pool().aclose()
+
     def _get_tool_kind(self, tool_name:str) -> str:
         if not self.agent:
             return "unknown"
@@ -9,10 +9,88 @@ import dotenv
 dotenv.load_dotenv()
 
 
+class EndpointConfig(BaseModel):
+    name: str
+    base_url: str
+    model: str | None = None  # falls back to [model].name
+    api_key_env: str = "API_KEY"  # environment variable holding the key for this endpoint
+
+    @property
+    def api_key(self) -> str | None:
+        return os.getenv(self.api_key_env)
+
 class ModelConfig(BaseModel):
     name: str = "arcee-ai/trinity-large-preview:free" # NOTE:default model
     temperature: float = Field(default=0.7, ge=0.0, le=1.0, description="Sampling temperature for the model, between 0 and 1")
     context_window: int  = 128_000 
+    # optional failover list, tried in health order. when empty the BASE_URL/API_KEY endpoint is used
+    endpoints: list[EndpointConfig] = Field(default_factory=list)
+    hedge: bool = False  # fire a second request at the next endpoint when the first token is late
+    hedge_percentile: float = Field(default=0.9, gt=0.0, lt=1.0, description="TTFT percentile of the primary endpoint after which a hedge request is sent")
+    hedge_min_delay: float = Field(default=1.0, ge=0.0, description="Lower bound (seconds) for the hedge delay, also used until enough TTFT samples exist")
+
+class HttpPoolConfig(BaseModel):
+    max_connections: int = Field(default=100, ge=1, description="Maximum number of concurrent connections per pooled LLM client")
+    max_keepalive_connections: int = Field(default=20, ge=0, description="Maximum number of idle connections kept alive per pooled LLM client")
+    keepalive_expiry: float = Field(default=30.0, ge=0.0, description="Seconds an idle keep-alive connection is kept open")
+    connect_timeout: float = Field(default=5.0, gt=0.0)
+    read_timeout: float = Field(default=600.0, gt=0.0)
+    http2: bool = False  # requires the optional `h2` package, falls back to HTTP/1.1 when missing
+
+class RateLimitConfig(BaseModel):
+    requests_per_minute: int | None = Field(default=None, ge=1, description="Shared request budget per endpoint, None disables the limit")
+    tokens_per_minute: int | None = Field(default=None, ge=1, description="Shared token budget per endpoint, None disables the limit")
+    max_concurrent_requests: int = Field(default=8, ge=1, description="Maximum in-flight requests per endpoint across all sessions")
+    max_retries: int = Field(default=3, ge=0)
+    backoff_base: float = Field(default=1.0, gt=0.0, description="Base delay in seconds for jittered exponential backoff")
+    backoff_max: float = Field(default=30.0, gt=0.0)
+
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = False  # opt-in, only useful for deterministic workloads (CI re-runs, repeated sub-agent goals)
+    max_size_mb: int = Field(default=256, ge=1, description="Size bound of the on-disk cache, least recently used entries are evicted first")
+    ttl_seconds: int = Field(default=7 * 24 * 3600, ge=1)
+
+class ToolSchedulerConfig(BaseModel):
+    max_concurrent_tools: int = Field(default=16, ge=1, description="Upper bound on tool calls running at once within a turn")
+    # per ToolKind value, kinds not listed are only bound by max_concurrent_tools
+    max_concurrent_per_kind: dict[str, int] = Field(
+        # no shell cap: a shell call is a write of the whole workspace, shells of one batch never overlap anyway
+        default_factory=lambda: {"network": 8, "mcp": 4, "write": 4, "memory": 1}
+    )
+
+class ToolTimeoutConfig(BaseModel):
+    default_seconds: float = Field(default=120.0, gt=0.0, description="Deadline for a single tool call unless overridden below")
+    per_tool: dict[str, float] = Field(
+        default_factory=lambda: {"web_scrap": 60.0, "web_search": 30.0, "grep": 60.0, "glob": 30.0}
+    )
+    turn_budget_seconds: float | None = Field(default=900.0, gt=0.0, description="Wall-clock budget for all tool calls of one turn, None disables it")
+    grace_seconds: float = Field(default=5.0, ge=0.0, description="Extra time given to tools that enforce their own timeout (shell, sub-agents)")
+
+class ToolResultCacheConfig(BaseModel):
+    enabled: bool = True  # memoizes READ/FILE_SYSTEM tool results within a session
+    max_entries: int = Field(default=256, ge=1)
+    ttl_seconds: float = Field(default=300.0, gt=0.0, description="Upper bound on how long a result is reused, covers edits made outside the agent")
+
+class SessionJournalConfig(BaseModel):
+    enabled: bool = True  # journal every session under <data dir>/sessions so it can be resumed
+    snapshot_every: int = Field(default=200, ge=1, description="Records after which the journal is folded into one snapshot, bounds replay time")
+
+class LoopDetectionConfig(BaseModel):
+    enabled: bool = True
+    window: int = Field(default=20, ge=1, description="Number of recent tool calls compared for repeats")
+    short_circuit_after: int = Field(default=2, ge=1, description="A call that already returned the same result this many times gets the cached result instead of running")
+    stop_after: int = Field(default=3, ge=1, description="Short-circuited calls in one run after which the agent stops")
+
+class EventBusConfig(BaseModel):
+    coalesce_window_ms: float = Field(default=30.0, ge=0.0, description="Text deltas arriving within this window are merged into one event, 0 disables coalescing")
+    coalesce_max_chars: int = Field(default=2048, ge=1, description="A merged text delta is flushed early once it reaches this size")
+    queue_size: int = Field(default=64, ge=1, description="Events buffered for a slow consumer before the agent waits for it")
+
+class ServerConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = Field(default=8765, ge=0, le=65535)
+    max_sessions: int = Field(default=64, ge=1, description="Sessions kept in memory, the least recently used one is saved and evicted beyond this")
+    idle_timeout_seconds: float = Field(default=1800.0, gt=0.0, description="Sessions idle for longer are saved and evicted")
 
 class MCPServerConfig(BaseModel):
     enable: bool = True
@@ -55,6 +133,11 @@ class PruningPolicy(BaseModel):
             "deleted", "moved", "renamed",
         ]
     )
+class PromptCachePolicy(BaseModel):
+    # keep the system prompt byte-identical across turns and send memory/compaction summary after it,
+    # so provider-side prompt caching can reuse the prefix
+    stable_prefix: bool = True
+
 class ApprovalPolicy(BaseModel):
     ON_REQUEST: str = "on_request"
     AUTOMATIC: str = "automatic"
@@ -70,10 +153,22 @@ class Config(BaseModel):
     max_tool_output_tokens : int = 50_000
     shell_environment : ShellEnvironmentPolicy = Field(default_factory=ShellEnvironmentPolicy)
     pruning: PruningPolicy = Field(default_factory=PruningPolicy)
+    prompt_cache: PromptCachePolicy = Field(default_factory=PromptCachePolicy)
+    tool_scheduler: ToolSchedulerConfig = Field(default_factory=ToolSchedulerConfig)
+    tool_timeouts: ToolTimeoutConfig = Field(default_factory=ToolTimeoutConfig)
+    tool_result_cache: ToolResultCacheConfig = Field(default_factory=ToolResultCacheConfig)
+    session_journal: SessionJournalConfig = Field(default_factory=SessionJournalConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
+    event_bus: EventBusConfig = Field(default_factory=EventBusConfig)
+    loop_detection: LoopDetectionConfig = Field(default_factory=LoopDetectionConfig)
+    http: HttpPoolConfig = Field(default_factory=HttpPoolConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    response_cache: ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
     mcp_servers: dict[str, MCPServerConfig] = Field(default_factory=dict) 
 
     user_instructions:str | None = None
     debug: bool = False
+    record_path: Path | None = None  # append raw streamed LLM chunks here as JSONL, see llm/replay.py
 
     allowed_tools: list[str] | None = None
     approval : ApprovalPolicy = Field(default_factory=ApprovalPolicy)
@@ -87,6 +182,13 @@ class Config(BaseModel):
     def get_base_url(self) -> str | None:
         return os.getenv("BASE_URL")
 
+    @property
+    def get_record_path(self) -> Path | None:
+        if self.record_path is not None:
+            return self.record_path
+        path = os.getenv("LLM_RECORD_PATH")
+        return Path(path) if path else None
+
     @property
     def get_model_name(self) -> str:
         return self.model.name
@@ -110,11 +212,16 @@ class Config(BaseModel):
     def validate(self) -> list[str]:
         errors: list[str] = []
 
-        if not self.get_api_key:
-            errors.append("API_KEY environment variable is not set")
+        if self.model.endpoints:
+            for endpoint in self.model.endpoints:
+                if not endpoint.api_key:
+                    errors.append(f"{endpoint.api_key_env} environment variable is not set (endpoint '{endpoint.name}')")
+        else:
+            if not self.get_api_key:
+                errors.append("API_KEY environment variable is not set")
 
-        if not self.get_base_url:
-            errors.append("BASE_URL environment variable is not set")
+            if not self.get_base_url:
+                errors.append("BASE_URL environment variable is not set")
 
         if not self.cwd.exists() or not self.cwd.is_dir():
             errors.append(f"CWD path '{self.cwd}' does not exist or is not a directory")
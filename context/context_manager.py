@@ -1,15 +1,25 @@
 
-from dataclasses import dataclass, field
-from typing import Any
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass, field
+from typing import Any, overload
 from config.config import Config
 from config.loader import get_data_dir
+from context.journal import JournalState, SessionJournal
+from context.sticky import StickyMatcher, get_sticky_matcher
+from context.token_ledger import MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, TokenLedger
 from lib.contants.config import CONTEXT_RESET_SIZE
 from lib.response import TokenUsage
-from lib.text import count_tokens
-from propmpts.system import get_system_prompt
+from lib.text import count_tokens, count_tokens_many
+from lib.tokens import get_token_counter
+from propmpts.system import get_context_restoration_prompt, get_system_prompt, get_volatile_context_prompt
 from tools.base import Tool
 import json
+import os
 import time
+from pathlib import Path
+
+# lower number = higher priority, kept longer by the pruner
+ROLE_PRIORITY = {"system": 0, "tool": 1, "assistant": 2, "user": 3}
 
 @dataclass
 class MessageItem:
@@ -19,6 +29,20 @@ class MessageItem:
     tool_call_id : str | None = None
     tool_calls: list[dict[str, Any]] | None = field(default_factory=list)
 
+    def __post_init__(self) -> None:
+        # NOTE: pruning features, computed once here instead of on every prune. Plain attributes, not fields, so
+        # asdict() and the journal don't carry them
+        self.priority = ROLE_PRIORITY.get(self.role, 3)
+        self._sticky_matcher: StickyMatcher | None = None
+        self._sticky = False
+
+    def is_sticky(self, matcher: StickyMatcher) -> bool:
+        """Whether the content hits one of the matcher's keywords, rescanned only when the keywords changed."""
+        if matcher is not self._sticky_matcher:
+            self._sticky = matcher.matches(self.content)
+            self._sticky_matcher = matcher
+        return self._sticky
+
     def to_dict(self) -> dict[str, Any]:
         result: dict[str, Any] = {"role": self.role}
 
@@ -34,50 +58,246 @@ class MessageItem:
             result["content"] = self.content
 
         return result
+
+class MessagesView(Sequence):
+    """Read-only request payload: the prompt prefix followed by the first `length` serialized messages, with an
+    optional `inserted` message placed before the message at `insert_at`.
+
+    Nothing is copied. The messages list is only ever appended to, and a prune or compaction swaps in a new list, so
+    a view keeps showing what it showed when it was taken. The dicts are shared with the context manager, don't
+    mutate them."""
+
+    __slots__ = ("_prefix", "_messages", "_length", "_inserted", "_insert_at")
+
+    def __init__(
+        self,
+        prefix: list[dict[str, Any]],
+        messages: list[dict[str, Any]],
+        inserted: dict[str, Any] | None = None,
+        insert_at: int = 0,
+    ) -> None:
+        self._prefix = prefix
+        self._messages = messages
+        self._length = len(messages)
+        self._inserted = inserted
+        self._insert_at = insert_at
+
+    def __len__(self) -> int:
+        return len(self._prefix) + self._length + (self._inserted is not None)
+
+    @overload
+    def __getitem__(self, index: int) -> dict[str, Any]: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[dict[str, Any]]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        prefix_length = len(self._prefix)
+        if index < prefix_length:
+            return self._prefix[index]
+        index -= prefix_length
+        if self._inserted is not None and index >= self._insert_at:
+            if index == self._insert_at:
+                return self._inserted
+            index -= 1
+        return self._messages[index]
+
+    def __iter__(self):
+        yield from self._prefix
+        for index in range(self._length):
+            if index == self._insert_at and self._inserted is not None:
+                yield self._inserted
+            yield self._messages[index]
+        if self._insert_at >= self._length and self._inserted is not None:
+            yield self._inserted
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"MessagesView({list(self)!r})"
+
+
+@dataclass
+class PromptCacheStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
 class ContextManager:
-    def __init__(self,config:Config,tools:list[Tool]) -> None:
+    def __init__(self,config:Config,tools:list[Tool], journal: SessionJournal | None = None) -> None:
+        # NOTE: with a stable prefix, memory and the compaction summary live in a separate block right before the newest
+        # user message, so a memory edit doesn't change the cached history in front of it
+        self._stable_prefix = config.prompt_cache.stable_prefix
+        self._memory: str | None = None
+        self._memory_signature: tuple | None = None
+        self._summary: str | None = None
+        self.prompt_cache_stats = PromptCacheStats()
         self.system_prompts  = get_system_prompt(
                 config,
-                self._load_memory(),
+                None if self._stable_prefix else self._load_memory(),
                 tools
                 )
         self._messages: list[MessageItem] = []
+        # NOTE: serialized form of _messages, kept in step on every append and rebuilt only on prune/compaction/restore
+        self._payload: list[dict[str, Any]] = []
+        self._system_message = {"role": "system", "content": self.system_prompts}
         self._config:Config = config
         self._model = config.get_model_name
+        self.ledger = TokenLedger(system_tokens=count_tokens(self.system_prompts, self._model) + MESSAGE_OVERHEAD_TOKENS)
+        self._tool_schemas: list[dict[str, Any]] | None = None
+        self.set_tool_schemas([tool.to_openai_schema() for tool in tools])
         self._latest_usage = TokenUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0, cached_tokens=0)
         self._total_usage = TokenUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0, cached_tokens=0)
+        # NOTE: every change to the messages or usage is mirrored to the journal so the session can be resumed
+        self.journal = journal
+
+    def _append(self, item: MessageItem) -> None:
+        self._messages.append(item)
+        self._payload.append(item.to_dict())
+        item.is_sticky(get_sticky_matcher(self._config.pruning.sticky_keywords))
+        self.ledger.add(self.message_tokens(item))
+        if self.journal is not None:
+            self.journal.append_message(asdict(item))
+            if self.journal.should_snapshot():
+                self.journal.snapshot(self.get_state())
+
+    def get_state(self) -> JournalState:
+        return JournalState(
+            session_id=self.journal.session_id if self.journal else "",
+            messages=[asdict(m) for m in self._messages],
+            summary=self._summary,
+            total_usage=self._total_usage,
+            latest_usage=self._latest_usage,
+        )
+
+    def restore(self, state: JournalState) -> None:
+        """Load a replayed journal, token counts come from the journal so nothing is re-tokenized."""
+        self._messages = [MessageItem(**item) for item in state.messages]
+        # journals written before token counts were kept, or edited by hand, are counted in one batch
+        uncounted = [message for message in self._messages if message.token_count is None]
+        if uncounted:
+            texts = [(m.content or "") + (json.dumps(m.tool_calls) if m.tool_calls else "") for m in uncounted]
+            for message, count in zip(uncounted, count_tokens_many(texts, self._model)):
+                message.token_count = count
+        self._rebuild()
+        self._summary = state.summary
+        self._total_usage = state.total_usage
+        self._latest_usage = state.latest_usage
+
+    def _rebuild(self) -> None:
+        # a new list, views handed out earlier keep the old one
+        self._payload = [message.to_dict() for message in self._messages]
+        self.ledger.reset_messages(sum(self.message_tokens(message) for message in self._messages))
+
+    def message_tokens(self, item: MessageItem) -> int:
+        """What the message adds to a request, framing included. token_count already covers the tool_calls JSON."""
+        tokens = item.token_count if item.token_count is not None else count_tokens(item.content, self._model)
+        return tokens + MESSAGE_OVERHEAD_TOKENS
+
+    def set_tool_schemas(self, schemas: list[dict[str, Any]] | None) -> None:
+        # the registry hands out the same list until its tools change, so this is usually an identity check
+        if schemas is self._tool_schemas:
+            return
+        self._tool_schemas = schemas
+        self.ledger.tool_schema_tokens = count_tokens(json.dumps(schemas), self._model) if schemas else 0
+
+    @property
+    def current_tokens(self) -> int:
+        """Size of the prompt the next request sends, reconciled with the provider's count."""
+        return self.ledger.current_tokens
+
+    def remove_messages(self, positions: list[int]) -> None:
+        """Drop the messages at the given ascending positions, journaled as one small record instead of a snapshot."""
+        if not positions:
+            return
+        removed_tokens = sum(self.message_tokens(self._messages[position]) for position in positions)
+        # new lists, views handed out earlier keep the old ones
+        self._messages = _without(self._messages, positions)
+        self._payload = _without(self._payload, positions)
+        self.ledger.add(-removed_tokens)
+        if self.journal is not None:
+            self.journal.append_removal(positions)
+            if self.journal.should_snapshot():
+                self.journal.snapshot(self.get_state())
+
+    def replace_messages(self, messages: list[MessageItem], reason: str = "prune") -> None:
+        self._messages = messages
+        self._rebuild()
+        if self.journal is not None:
+            self.journal.snapshot(self.get_state(), reason=reason)
+
+    def save(self) -> None:
+        """Fold the journal into a snapshot and sync it to disk."""
+        if self.journal is not None:
+            self.journal.snapshot(self.get_state(), reason="save")
 
 
     def add_user_message(self, content: str) -> None:
-        self._messages.append(MessageItem(role="user", content=content , token_count=count_tokens(content )))
+        self._append(MessageItem(role="user", content=content , token_count=count_tokens(content, self._model)))
 
     def add_assistant_message(self, content: str,tool_calls:list[dict[str,Any]] | None) -> None:
-        self._messages.append(
+        self._append(
                 MessageItem(
                     role="assistant", 
                     content=content,
-                    token_count=count_tokens(content),
+                    # the tool_calls JSON is sent too, counted here once so restore and prune never re-tokenize it
+                    token_count=count_tokens(content, self._model) + (count_tokens(json.dumps(tool_calls), self._model) if tool_calls else 0),
                     tool_calls=tool_calls or []
                     )
                 )
 
-    def get_context(self) -> list[dict[str, Any]]:
-        context = [{"role": "system", "content": self.system_prompts}]
-        for message in self._messages:
-            context.append(message.to_dict())
-        return context
+    def get_context(self) -> MessagesView:
+        if not self._stable_prefix:
+            return MessagesView([self._system_message], self._payload)
+        volatile = get_volatile_context_prompt(self._current_memory(), self._summary)
+        self.ledger.volatile_tokens = count_tokens(volatile, self._model) + MESSAGE_OVERHEAD_TOKENS if volatile else 0
+        if not volatile:
+            return MessagesView([self._system_message], self._payload)
+        # before the newest user message: everything up to it stays a cacheable prefix, and within a turn's tool loop
+        # the block doesn't move
+        insert_at = len(self._payload)
+        for index in range(len(self._payload) - 1, -1, -1):
+            if self._payload[index]["role"] == "user":
+                insert_at = index
+                break
+        return MessagesView([self._system_message], self._payload, {"role": "user", "content": volatile}, insert_at)
 
     def add_tool_result(self, tool_call_id : str , content:str) -> None:
         item= MessageItem(
                 role="tool",
                 content=content,
-                token_count=count_tokens(content),
+                token_count=count_tokens(content, self._model),
                 tool_call_id=tool_call_id
                 )
 
-        self._messages.append(item)
+        self._append(item)
 
 
+    def _current_memory(self) -> str | None:
+        # reload only when a memory file changed, so the block stays byte-identical between turns
+        data_dir = get_data_dir()
+        signature = tuple(
+            (stat.st_mtime_ns, stat.st_size) if (stat := _stat(data_dir / name)) else None
+            for name in ("user_memory.json", "short_term_memory.json")
+        )
+        if signature != self._memory_signature:
+            self._memory = self._load_memory()
+            self._memory_signature = signature
+        return self._memory
+
     def _load_memory(self) -> str | None:
         data_dir = get_data_dir()
         long_memory_file = data_dir / "user_memory.json"
@@ -134,85 +354,58 @@ class ContextManager:
     
     def is_need_to_reset(self) -> bool:
         context_limit = self._config.model.context_window
-        current_tokens = self._total_usage.total_tokens
-
-        return current_tokens >= (context_limit * CONTEXT_RESET_SIZE)  # reset when reaching 90% of context limit
+        return self.ledger.current_tokens >= (context_limit * CONTEXT_RESET_SIZE)  # reset when reaching 90% of context limit
 
     def get_latest_usage(self) -> TokenUsage:
         return self._latest_usage
     
     def replace_chat_session(self,summary:str)->None:
-        self._messages = []
-
-        new_system_prompt = f"""
-        # Context Restoration (Previous conversation Compacted):
-        The previos conversation has been compacted into the following summary to save tokens, but it may still contain important information.
-        Please use this summary to restore any important context or information that may be relevant for the current conversation.
-
-        Summary:
-        {summary}
-
-        **Important Notes**:
-        - The summary may not include all details from the original conversation, so please consider it as a reference rather than a complete replacement for the original context.
-        - If there are any ambiguities or missing information in the summary, please use your best judgment to fill in the gaps based on the information provided and the current conversation.
-        - Action listed under 'COMPLETED ACTIONS' are already executed, so you should not execute them again, but you can use the information from those actions if needed.
-        """
-
-        system_tokens = count_tokens(new_system_prompt)
-        self._messages.append(
-            MessageItem(
-                role="system", 
-                content=new_system_prompt,
-                token_count=system_tokens
+        messages: list[MessageItem] = []
+
+        restoration_prompt = get_context_restoration_prompt(summary)
+        if self._stable_prefix:
+            # rendered in the volatile block instead of a system message in the middle of the history
+            self._summary = summary
+            self.ledger.volatile_tokens = count_tokens(
+                get_volatile_context_prompt(self._current_memory(), self._summary), self._model
+            ) + MESSAGE_OVERHEAD_TOKENS
+        else:
+            messages.append(
+                MessageItem(
+                    role="system", 
+                    content=restoration_prompt,
+                    token_count=count_tokens(restoration_prompt, self._model)
+                )
             )
-        )
-
-        self._total_usage = TokenUsage(
-            prompt_tokens=system_tokens,
-            completion_tokens=0,
-            total_tokens=system_tokens,
-            cached_tokens=0
-        )
 
         # acknowledgement message for assistant
         ack_content = "Context has been restored based on the provided summary. I will use this information to continue the conversation."
-        ack_tokens = count_tokens(ack_content)
-        self._messages.append(
+        messages.append(
             MessageItem(
                 role="assistant", 
                 content=ack_content,
-                token_count=ack_tokens
+                token_count=count_tokens(ack_content, self._model)
             )
         )
-
-        self.add_usage(TokenUsage(
-            prompt_tokens=ack_tokens,
-            completion_tokens=0,
-            total_tokens=ack_tokens,
-            cached_tokens=0
-        ))
         # continue content
         continue_content = """
         Now Continue with the REMAINING work only.
         Do NOT repeat or redo any of the COMPLETED ACTIONS mentioned in the summary, as they have already been executed.
         Focus only on the REMAINING ACTIONS and the current conversation to move forward effectively.
         """
-
-        continue_tokens = count_tokens(continue_content)
-        self._messages.append(
+        messages.append(
             MessageItem(
                 role="user", 
                 content=continue_content,
-                token_count=continue_tokens
+                token_count=count_tokens(continue_content, self._model)
             )
         )
 
-        self.add_usage(TokenUsage(
-            prompt_tokens=continue_tokens,
-            completion_tokens=0,
-            total_tokens=continue_tokens,
-            cached_tokens=0
-        ))
+        # NOTE: the ledger tracks the context size now, the usage totals are left alone and stay real provider usage
+        self._messages = messages
+        self._rebuild()
+        if self.journal is not None:
+            self.journal.snapshot(self.get_state(), reason="compaction")
 
 
 
@@ -222,6 +415,44 @@ class ContextManager:
     def add_usage(self, usage: TokenUsage) -> None:
         self._latest_usage = usage
         self._total_usage+= usage
+        if self.journal is not None:
+            self.journal.append_usage(usage)
 
     def get_total_usage(self) -> TokenUsage:
         return self._total_usage
+
+    def record_prompt_usage(self, usage: TokenUsage) -> PromptCacheStats:
+        # only real provider usage, not the synthetic usage added on compaction
+        self.prompt_cache_stats.requests += 1
+        self.prompt_cache_stats.prompt_tokens += usage.prompt_tokens
+        self.prompt_cache_stats.cached_tokens += usage.cached_tokens
+        # the request was built from the current state, nothing has been appended since it was sent
+        self.ledger.reconcile(usage.prompt_tokens)
+        token_counter = get_token_counter(self._model)
+        if not token_counter.exact and usage.prompt_tokens:
+            # no tokenizer for this model, teach the estimate what the provider actually counted. the ledger's
+            # estimate covers the same request (tool schemas, tool_calls JSON and the volatile block included),
+            # and everything but the fixed per-message framing was estimated from characters
+            framing = MESSAGE_OVERHEAD_TOKENS * (len(self._messages) + 1 + bool(self.ledger.volatile_tokens)) + REPLY_PRIMING_TOKENS
+            estimated = self.ledger.estimated_tokens - framing
+            if estimated > 0 and usage.prompt_tokens > framing:
+                token_counter.calibrate(round(estimated * token_counter.chars_per_token), usage.prompt_tokens - framing)
+        return self.prompt_cache_stats
+
+
+def _stat(path: Path) -> os.stat_result | None:
+    try:
+        return path.stat()
+    except OSError:
+        return None
+
+
+def _without(items: list, positions: list[int]) -> list:
+    """Copy of `items` without the ascending `positions`, slices in between are copied in C."""
+    result: list = []
+    start = 0
+    for position in positions:
+        result.extend(items[start:position])
+        start = position + 1
+    result.extend(items[start:])
+    return result
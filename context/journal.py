@@ -0,0 +1,209 @@
+"""Append-only JSONL journal of a session's context, so a crashed session is resumed by replaying the file. Every
+`snapshot_every` records the file is rewritten as header + one snapshot, so replay stays bounded however long the
+session ran."""
+from __future__ import annotations
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, TextIO
+
+from lib.response import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+TITLE_LENGTH = 80
+
+
+@dataclass
+class JournalState:
+    """Context state rebuilt from a journal."""
+    session_id: str
+    messages: list[dict[str, Any]] = field(default_factory=list)
+    summary: str | None = None
+    total_usage: TokenUsage = field(default_factory=TokenUsage)
+    latest_usage: TokenUsage = field(default_factory=TokenUsage)
+    records: int = 0  # lines replayed, header excluded
+
+
+@dataclass
+class SessionInfo:
+    session_id: str
+    path: Path
+    title: str | None
+    created_at: float | None
+    updated_at: float
+    size: int
+
+
+class SessionJournal:
+    def __init__(self, path: Path, session_id: str, snapshot_every: int = 200) -> None:
+        self.path = Path(path)
+        self.session_id = session_id
+        self.snapshot_every = max(1, snapshot_every)
+        self.title: str | None = None
+        self.created_at: float | None = None
+        self._file: TextIO | None = None
+        self._since_snapshot = 0
+
+    def _open(self) -> TextIO:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            is_new = not self.path.exists() or self.path.stat().st_size == 0
+            # line buffered: every record reaches the OS as soon as it's written
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            if is_new:
+                self.created_at = time.time()
+                self._file.write(self._header_line())
+        return self._file
+
+    def _header_line(self) -> str:
+        header = {"type": "header", "session_id": self.session_id, "created_at": self.created_at, "title": self.title}
+        return json.dumps(header, ensure_ascii=False) + "\n"
+
+    def _write(self, record: dict[str, Any]) -> None:
+        self._open().write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._since_snapshot += 1
+
+    def append_message(self, item: dict[str, Any]) -> None:
+        if self.title is None and item.get("role") == "user" and item.get("content"):
+            self.title = _title(item["content"])
+        self._write({"type": "message", "item": item})
+
+    def append_removal(self, positions: list[int]) -> None:
+        """Messages dropped by the pruner, by their ascending positions in the message list at that point."""
+        self._write({"type": "remove", "positions": positions})
+
+    def append_usage(self, usage: TokenUsage) -> None:
+        self._write({"type": "usage", "usage": asdict(usage)})
+
+    def should_snapshot(self) -> bool:
+        return self._since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state: JournalState, reason: str = "periodic") -> None:
+        """Rewrite the journal as header + a single snapshot of `state`."""
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.created_at is None:
+            self.created_at = time.time()
+        record = {
+            "type": "snapshot",
+            "reason": reason,
+            "messages": state.messages,
+            "summary": state.summary,
+            "total_usage": asdict(state.total_usage),
+            "latest_usage": asdict(state.latest_usage),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self._header_line())
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self._since_snapshot = 0
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @classmethod
+    def load(cls, path: Path, snapshot_every: int = 200) -> tuple[SessionJournal, JournalState]:
+        """Replay a journal, the returned journal appends to the same file."""
+        path = Path(path)
+        state = JournalState(session_id=path.stem)
+        journal = cls(path, path.stem, snapshot_every=snapshot_every)
+
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+
+        for number, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash can leave the last line half written, anything before it is intact
+                if number == len(lines) - 1:
+                    logger.warning(f"Ignoring truncated last record of {path}")
+                    break
+                raise
+            kind = record.get("type")
+            if kind == "header":
+                state.session_id = journal.session_id = record.get("session_id") or state.session_id
+                journal.title = record.get("title")
+                journal.created_at = record.get("created_at")
+                continue
+
+            state.records += 1
+            if kind == "message":
+                state.messages.append(record["item"])
+                if journal.title is None and record["item"].get("role") == "user":
+                    journal.title = _title(record["item"].get("content"))
+            elif kind == "remove":
+                removed = set(record["positions"])
+                state.messages = [item for position, item in enumerate(state.messages) if position not in removed]
+            elif kind == "usage":
+                usage = TokenUsage(**record["usage"])
+                state.latest_usage = usage
+                state.total_usage = state.total_usage + usage
+            elif kind == "snapshot":
+                state.messages = list(record.get("messages") or [])
+                state.summary = record.get("summary")
+                state.total_usage = TokenUsage(**record.get("total_usage", {}))
+                state.latest_usage = TokenUsage(**record.get("latest_usage", {}))
+            else:
+                logger.warning(f"Unknown journal record type {kind!r} in {path}")
+
+        journal._since_snapshot = state.records
+        if lines and not lines[-1].endswith("\n"):
+            # drop the torn record before appending after it
+            journal.snapshot(state, reason="repair")
+        return journal, state
+
+
+def list_sessions(directory: Path) -> list[SessionInfo]:
+    """Saved sessions, most recently updated first. Only the header line of each file is read."""
+    sessions: list[SessionInfo] = []
+    if not directory.is_dir():
+        return sessions
+    for path in directory.glob("*.jsonl"):
+        try:
+            stat = path.stat()
+            with open(path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                title = header.get("title")
+                if title is None:
+                    # the title is only in the header after the first snapshot, before that it's the first message
+                    first = json.loads(f.readline() or "{}")
+                    title = _title((first.get("item") or {}).get("content"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        sessions.append(
+            SessionInfo(
+                session_id=header.get("session_id") or path.stem,
+                path=path,
+                title=title,
+                created_at=header.get("created_at"),
+                updated_at=stat.st_mtime,
+                size=stat.st_size,
+            )
+        )
+    sessions.sort(key=lambda info: info.updated_at, reverse=True)
+    return sessions
+
+
+def _title(content: str | None) -> str | None:
+    text = (content or "").strip()
+    return text.splitlines()[0][:TITLE_LENGTH] if text else None
@@ -1,6 +1,9 @@
-from dataclasses import dataclass
-from context.context_manager import ContextManager, MessageItem
-from lib.text import count_tokens
+import bisect
+import heapq
+from collections import deque
+from dataclasses import dataclass, field
+from context.context_manager import ContextManager, MessageItem, _without
+from context.sticky import get_sticky_matcher
 
 
 @dataclass
@@ -29,137 +32,165 @@ class PruningConfig:
             ]
 
 
+@dataclass
+class _Unit:
+    """What gets evicted as a whole: one message, or an assistant message with tool_calls plus its tool results."""
+    seqs: list[int]
+    tokens: int
+    priority: int
+    sticky: bool
+    call_ids: set[str] = field(default_factory=set)
+    has_tool_result: bool = False
+    version: int = 0
+    alive: bool = True
+
+
 class SlidingWindowPruner:
     """Sliding window based context pruning."""
 
     def __init__(self, config: PruningConfig | None = None):
         self.config = config or PruningConfig()
-        self._cached_signature: tuple[int, int] | None = None
-        self._cached_total_tokens: int = 0
-
-    def _context_signature(self, messages: list[MessageItem]) -> tuple[int, int]:
-        if not messages:
-            return (0, 0)
-        return (len(messages), id(messages[-1]))
-
-    def _compute_total_tokens(self, messages: list[MessageItem]) -> int:
-        signature = self._context_signature(messages)
-        if self._cached_signature == signature:
-            return self._cached_total_tokens
-
-        total = sum(m.token_count or self._count_message_tokens(m) for m in messages)
-        self._cached_signature = signature
-        self._cached_total_tokens = total
-        return total
+        self._keywords = tuple(self.config.sticky_keywords or ())
+        self._matcher = get_sticky_matcher(self._keywords)
+        self._reset_index(None)
+
+    def _reset_index(self, messages: list[MessageItem] | None) -> None:
+        self._indexed: list[MessageItem] | None = messages  # the context manager's list this index describes
+        self._seqs: list[int] = []  # sequence number of each indexed message, increasing, aligned with the list
+        self._next_seq = 0
+        self._units: dict[int, _Unit] = {}  # first seq of the unit -> unit
+        self._unit_of: dict[int, int] = {}  # seq -> first seq of its unit
+        self._open_calls: dict[str, int] = {}  # tool_call_id -> unit still waiting for that result
+        self._heap: list[tuple[int, int, int, int]] = []  # (sticky, -priority, first seq, version), smallest evicted first
+        self._tool_units: deque[int] = deque()  # non-sticky units with tool results, oldest first
+        self._tool_units_alive = 0
+
+    def _sync(self, context_manager: ContextManager) -> None:
+        """Index the messages appended since the last call, or everything when the list was replaced."""
+        messages = context_manager._messages
+        keywords = tuple(self.config.sticky_keywords or ())
+        if keywords != self._keywords:
+            # every unit's stickiness may have changed, messages rescan themselves against the new matcher
+            self._keywords = keywords
+            self._matcher = get_sticky_matcher(keywords)
+            self._reset_index(None)
+        if messages is not self._indexed:
+            self._reset_index(messages)
+        for message in messages[len(self._seqs):]:
+            self._index(message, context_manager.message_tokens(message))
+
+    def _index(self, message: MessageItem, tokens: int) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._seqs.append(seq)
+        if message.role == "system" and self.config.preserve_system:
+            return  # never evicted, not a candidate
+
+        head = self._open_calls.pop(message.tool_call_id, None) if message.role == "tool" and message.tool_call_id else None
+        unit = self._units.get(head) if head is not None else None
+        if unit is None or not unit.alive:
+            head = seq
+            unit = self._units[seq] = _Unit(seqs=[], tokens=0, priority=message.priority, sticky=False)
+            for call in message.tool_calls or []:
+                if call.get("id"):
+                    unit.call_ids.add(call["id"])
+                    self._open_calls[call["id"]] = seq
+
+        was_tool_unit = unit.has_tool_result and not unit.sticky
+        unit.seqs.append(seq)
+        unit.tokens += tokens
+        unit.priority = min(unit.priority, message.priority)
+        unit.sticky = unit.sticky or self._is_sticky(message)
+        unit.has_tool_result = unit.has_tool_result or message.role == "tool"
+        unit.version += 1
+        self._unit_of[seq] = head
+        # a unit that changed is pushed again, the stale heap entry is skipped when it comes up
+        heapq.heappush(self._heap, (int(unit.sticky), -unit.priority, head, unit.version))
+
+        is_tool_unit = unit.has_tool_result and not unit.sticky
+        if is_tool_unit and not was_tool_unit:
+            self._tool_units.append(head)
+            self._tool_units_alive += 1
+        elif was_tool_unit and not is_tool_unit:
+            self._tool_units_alive -= 1  # turned sticky, left in the deque and skipped as not a tool unit
+
+    def _is_recent(self, unit: _Unit) -> bool:
+        # a unit reaching into the recent window is kept whole, a tool_calls message isn't split from its results
+        cutoff = len(self._seqs) - self.config.keep_recent_messages
+        return cutoff <= 0 or unit.seqs[-1] >= self._seqs[cutoff]
+
+    def _evict(self, head: int, evicted: list[int]) -> int:
+        unit = self._units.pop(head)
+        unit.alive = False
+        if unit.has_tool_result and not unit.sticky:
+            self._tool_units_alive -= 1
+        for call_id in unit.call_ids:
+            self._open_calls.pop(call_id, None)
+        for seq in unit.seqs:
+            del self._unit_of[seq]
+        evicted.extend(unit.seqs)
+        return unit.tokens
 
     def prune(self, context_manager: ContextManager) -> int:
-        messages = context_manager._messages
-        if not messages or len(messages) <= self.config.keep_recent_messages:
+        """Evict the least valuable messages until the context fits, O(k log n) for k evicted messages."""
+        self._sync(context_manager)
+        if len(self._seqs) <= self.config.keep_recent_messages:
             return 0 # No pruning needed
 
-        preserved: list[MessageItem] = []
-        preserved_ids: set[int] = set()
-
-        system_msgs = [m for m in messages if m.role == "system"]
-        non_system = [m for m in messages if m.role != "system"]
-
-        idx_map = { id(m): i for i, m in enumerate(messages) }
-        
-        if self.config.preserve_system:
-            for msg in system_msgs:
-                preserved.append(msg)
-                preserved_ids.add(id(msg))
-
-        total_tokens = sum(self._count_message_tokens(m) for m in preserved)
-        recent_message_cutoff = len(messages) - self.config.keep_recent_messages # keep (n) recent messages 
-
-        for msg in non_system:
-            msg_position = idx_map[id(msg)]
-            if msg_position >= recent_message_cutoff:
-                preserved.append(msg)
-                preserved_ids.add(id(msg))
-                total_tokens += (msg.token_count or self._count_message_tokens(msg))
-
-        # explicitly preserve sticky older messages before normal prioritization.
-        sticky_older = [m for m in non_system if id(m) not in preserved_ids and self._is_sticky(m)]
-        sticky_older_sorted = sorted(sticky_older, key=lambda m: -idx_map[id(m)])
-
-        for msg in sticky_older_sorted:
-            msg_token = msg.token_count or self._count_message_tokens(msg)
-            if total_tokens + msg_token <= self.config.max_window_tokens:
-                preserved.append(msg)
-                preserved_ids.add(id(msg))
-                total_tokens += msg_token
-
-        # fill remaining budget with higher-priority older messages.
-        older_candidates = [m for m in non_system if id(m) not in preserved_ids]
-        older_candidates_sorted = sorted(
-            older_candidates,
-            key=lambda m: (self._get_message_priority(m), -idx_map[id(m)]),
-        )
-
-        kept_older_tool_results = 0
-
-        for msg in older_candidates_sorted:
-            if total_tokens >= self.config.max_window_tokens:
+        # the window covers the whole request, messages get what the system prompt and tool schemas leave over
+        ledger = context_manager.ledger
+        budget = int(self.config.max_window_tokens / ledger.scale) - ledger.overhead_tokens
+        total_tokens = ledger.message_tokens
+        evicted: list[int] = []
+
+        # only the newest keep_recent_tool_results older tool results are kept, whatever the budget
+        recent_tool_units = 0
+        for head in reversed(self._tool_units):
+            unit = self._units.get(head)
+            if unit is None or not unit.has_tool_result or unit.sticky:
+                continue
+            if not self._is_recent(unit):
                 break
-
-            msg_token = msg.token_count or self._count_message_tokens(msg)
-
-            # keep older tool results up to limit
-            if msg.role == "tool":
-                if kept_older_tool_results < self.config.keep_recent_tool_results and total_tokens + msg_token <= self.config.max_window_tokens:
-                    preserved.append(msg)
-                    preserved_ids.add(id(msg))
-                    total_tokens += msg_token
-                    if not self._is_sticky(msg):
-                        kept_older_tool_results += 1
-                    continue
-
-
-            if total_tokens + msg_token <= self.config.max_window_tokens:
-                preserved.append(msg)
-                preserved_ids.add(id(msg))
-                total_tokens += msg_token
-
-        
-        # rebuild original order
-        preserved.sort(key=lambda m: idx_map[id(m)])
-        removed_count = len(messages) - len(preserved)
-        
-        context_manager._messages = preserved
-        self._cached_signature = self._context_signature(preserved)
-        self._cached_total_tokens = total_tokens
-        return removed_count
-
-
-
-    def _is_sticky(self, message:MessageItem) -> bool:
-        """Determine if a message is sticky based on its content and the configuration."""
-        if not message.content or not self.config.preserve_sticky:
-            return False
-        if not self.config.sticky_keywords:
-            return False
-        content_lower = message.content.lower()
-        return any(keyword in content_lower for keyword in self.config.sticky_keywords)
-
-    def _count_message_tokens(self, message: MessageItem) -> int:
-        """Count the number of tokens in a message."""
-        if not message.content:
+            recent_tool_units += 1  # the recent window doesn't count against the limit
+        excess = self._tool_units_alive - recent_tool_units - self.config.keep_recent_tool_results
+        while excess > 0 and self._tool_units:
+            head = self._tool_units.popleft()
+            unit = self._units.get(head)
+            if unit is None or not unit.has_tool_result or unit.sticky:
+                continue
+            if self._is_recent(unit):
+                self._tool_units.appendleft(head)
+                break
+            total_tokens -= self._evict(head, evicted)
+            excess -= 1
+
+        deferred: list[tuple[int, int, int, int]] = []
+        while total_tokens > budget and self._heap:
+            entry = heapq.heappop(self._heap)
+            unit = self._units.get(entry[2])
+            if unit is None or unit.version != entry[3]:
+                continue  # evicted already or superseded by a newer entry
+            if self._is_recent(unit):
+                deferred.append(entry)
+                continue
+            total_tokens -= self._evict(entry[2], evicted)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+        if not evicted:
             return 0
-        return count_tokens(message.content)
+        evicted.sort()
+        positions = [bisect.bisect_left(self._seqs, seq) for seq in evicted]
+        context_manager.remove_messages(positions)
+        self._seqs = _without(self._seqs, positions)
+        self._indexed = context_manager._messages
+        return len(positions)
 
-    def _get_message_priority(self, message: MessageItem) -> int:
-        """Lower number = higher priority (keep longer)."""
-        if message.role == "system":
-            return 0
-        if message.role == "tool":
-            return 1
-        if message.role == "assistant":
-            return 2
-        return 3  # user messages
+
+    def _is_sticky(self, message: MessageItem) -> bool:
+        """Determine if a message is sticky, computed once per message and keyword set."""
+        return self.config.preserve_sticky and message.is_sticky(self._matcher)
 
     def should_prune(self, context_manager: ContextManager) -> bool:
-        """Check if pruning is needed based on token count."""
-        total = self._compute_total_tokens(context_manager._messages)
-        return total >= self.config.max_window_tokens
+        """Check if pruning is needed based on token count, O(1) from the context manager's ledger."""
+        return context_manager.current_tokens >= self.config.max_window_tokens
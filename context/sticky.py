@@ -0,0 +1,35 @@
+"""Sticky-keyword matching for the pruner. The keywords are one alternation matched against the lower-cased content,
+much faster in CPython than re.IGNORECASE. Matchers are shared per keyword set so messages can cache their result."""
+from __future__ import annotations
+import re
+from collections.abc import Iterable
+from functools import lru_cache
+
+
+class StickyMatcher:
+    """Compiled matcher for one set of sticky keywords, get one through get_sticky_matcher so it's shared."""
+
+    __slots__ = ("keywords", "_pattern")
+
+    def __init__(self, keywords: tuple[str, ...]) -> None:
+        self.keywords = keywords
+        words = sorted({keyword.lower() for keyword in keywords if keyword}, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(word) for word in words)) if words else None
+
+    def matches(self, text: str | None) -> bool:
+        if not text or self._pattern is None:
+            return False
+        return self._pattern.search(text.lower()) is not None
+
+    def __repr__(self) -> str:
+        return f"StickyMatcher({self.keywords!r})"
+
+
+@lru_cache(maxsize=16)
+def _matcher(keywords: tuple[str, ...]) -> StickyMatcher:
+    return StickyMatcher(keywords)
+
+
+def get_sticky_matcher(keywords: Iterable[str] | None) -> StickyMatcher:
+    """Shared matcher for the keywords, the same object for the same keywords so cached results stay valid."""
+    return _matcher(tuple(keywords or ()))
@@ -0,0 +1,46 @@
+"""Running size of the prompt the next request will send, so `is_need_to_reset` and `should_prune` are O(1). The
+provider's `prompt_tokens` for each request is compared with the ledger's estimate and the ratio scales the count
+until the next response."""
+from __future__ import annotations
+from dataclasses import dataclass
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and delimiters around every message in the chat format
+REPLY_PRIMING_TOKENS = 3  # every request ends with the start of the assistant's reply
+
+
+@dataclass
+class TokenLedger:
+    system_tokens: int = 0
+    tool_schema_tokens: int = 0
+    volatile_tokens: int = 0  # memory and compaction summary block, see ContextManager.get_context
+    message_tokens: int = 0
+    scale: float = 1.0  # provider prompt_tokens / local estimate at the last reconciliation
+    reconciliations: int = 0
+
+    @property
+    def overhead_tokens(self) -> int:
+        """Everything in a request except the messages."""
+        return self.system_tokens + self.tool_schema_tokens + self.volatile_tokens + REPLY_PRIMING_TOKENS
+
+    @property
+    def estimated_tokens(self) -> int:
+        return self.overhead_tokens + self.message_tokens
+
+    @property
+    def current_tokens(self) -> int:
+        return round(self.estimated_tokens * self.scale)
+
+    def add(self, tokens: int) -> None:
+        self.message_tokens += tokens
+
+    def reset_messages(self, tokens: int) -> None:
+        self.message_tokens = tokens
+
+    def reconcile(self, prompt_tokens: int) -> None:
+        """Settle against the provider's count for the request built from the current state."""
+        estimated = self.estimated_tokens
+        if prompt_tokens <= 0 or estimated <= 0:
+            return
+        # bounded, a provider that reports nonsense (or a cached-only count) shouldn't wreck the thresholds
+        self.scale = min(2.0, max(0.5, prompt_tokens / estimated))
+        self.reconciliations += 1
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 from typing import Any
 import json
+import re
 
 
 class StreamEventType(str,Enum):
@@ -39,6 +40,23 @@ class TokenUsage:
             cached_tokens=self.cached_tokens + other.cached_tokens,
         )
 
+@dataclass
+class RequestMetrics:
+    # all durations in seconds, measured from just before the request is sent
+    ttfb: float | None = None  # response headers received
+    ttft: float | None = None  # first text or tool-call fragment
+    duration: float = 0.0
+    queue_time: float = 0.0  # waiting for a rate limiter slot, not part of duration
+    gap_p50: float | None = None  # inter-chunk gaps after the first token
+    gap_p90: float | None = None
+    gap_p99: float | None = None
+    gap_max: float | None = None
+    chunks: int = 0
+    output_tokens: int = 0
+    tokens_per_second: float | None = None  # output tokens over the time after the first token
+    endpoint: str | None = None
+    cached: bool = False  # replayed from the response cache
+
 @dataclass
 class ToolCallDelta:
     id : str
@@ -72,6 +90,42 @@ class StreamEvent:
     error : str | None = None
     finished_reason : str | None = None
     usage : TokenUsage | None = None
+    metrics : RequestMetrics | None = None  # set on MESSAGE_COMPLETE
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"type": self.type.value}
+        if self.text_delta is not None:
+            data["text_delta"] = asdict(self.text_delta)
+        if self.tool_call_delta is not None:
+            data["tool_call_delta"] = asdict(self.tool_call_delta)
+        if self.tool_call is not None:
+            data["tool_call"] = {
+                "id": self.tool_call.id,
+                "name": self.tool_call.name,
+                "arguments": self.tool_call.arguments,
+            }
+        if self.error is not None:
+            data["error"] = self.error
+        if self.finished_reason is not None:
+            data["finished_reason"] = self.finished_reason
+        if self.usage is not None:
+            data["usage"] = asdict(self.usage)
+        if self.metrics is not None:
+            data["metrics"] = asdict(self.metrics)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> StreamEvent:
+        return cls(
+            type=StreamEventType(data["type"]),
+            text_delta=TextDelta(**data["text_delta"]) if data.get("text_delta") else None,
+            tool_call_delta=ToolCallDelta(**data["tool_call_delta"]) if data.get("tool_call_delta") else None,
+            tool_call=ToolCall(**data["tool_call"]) if data.get("tool_call") else None,
+            error=data.get("error"),
+            finished_reason=data.get("finished_reason"),
+            usage=TokenUsage(**data["usage"]) if data.get("usage") else None,
+            metrics=RequestMetrics(**data["metrics"]) if data.get("metrics") else None,
+        )
 
 
 def parase_tool_call_arguments(arguments:str) -> dict[str, Any]:
@@ -96,6 +150,53 @@ def parase_tool_call_arguments(arguments:str) -> dict[str, Any]:
         return {"raw_arguments": arguments}
 
 
+_JSON_STRUCTURAL = re.compile(r'["\\{}\[\]]')
+
+
+class JsonCompletenessDetector:
+    """Tracks streamed JSON fragments and reports when the top-level object/array has been closed.
+    Only structural characters are visited, so feeding n characters costs O(n) with a small constant."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.complete = False
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, fragment: str) -> bool:
+        pos = 0
+        if self._escaped and fragment:
+            # the backslash was the last character of the previous fragment
+            self._escaped = False
+            pos = 1
+
+        while not self.complete:
+            match = _JSON_STRUCTURAL.search(fragment, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+
+            if self._in_string:
+                if char == "\\":
+                    if pos >= len(fragment):
+                        self._escaped = True
+                    pos += 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            else:
+                self.depth -= 1
+                if self.started and self.depth <= 0:
+                    self.complete = True
+        return self.complete
+
+
 @dataclass
 class ToolResultMessage:
     tool_call_id:str
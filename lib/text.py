@@ -1,66 +1,97 @@
-import tiktoken
-def get_tokenizer(model:str="gpt-4"):
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return encoding.encode
-    except ImportError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return encoding.encode
+from dataclasses import dataclass
+from typing import Literal
 
-def count_tokens(text:str, model:str="gpt-4") -> int:
-    tokenizer = get_tokenizer(model)
-    tokens = tokenizer(text)
+from lib.tokens import TokenCounter, get_token_counter
 
-    return estimate_token_count(text) if tokens is None else len(tokens)
+TruncationMode = Literal["head", "tail", "middle"]
+
+def count_tokens(text:str, model:str | None = None) -> int:
+    """Token count of `text` for `model`, cached per model, see lib.tokens.TokenCounter."""
+    return get_token_counter(model).count(text)
+
+def count_tokens_many(texts:list[str], model:str | None = None) -> list[int]:
+    return get_token_counter(model).count_many(texts)
 
 def estimate_token_count(text:str) -> int:
     return max(1,len(text) // 4)  # Rough estimate: 1 token ~ 4 characters
 
+def fits_in_tokens(text:str, max_tokens:int) -> bool:
+    """Cheap upper bound, no tokenizer: a token is at least one UTF-8 byte."""
+    return len(text) <= max_tokens and (text.isascii() or len(text.encode("utf-8")) <= max_tokens)
+
+@dataclass
+class TokenSplit:
+    head: str
+    tail: str
+    total_tokens: int
+    truncated: bool
+
+def split_by_tokens(
+    text:str,
+    head_tokens:int,
+    tail_tokens:int = 0,
+    model:str | None = None,
+    preserve_lines:bool = True,
+    counter:TokenCounter | None = None,
+) -> TokenSplit:
+    """The first `head_tokens` and last `tail_tokens` tokens of `text`, encoded once and sliced.
+
+    Without a tokenizer the cut is made by characters using the counter's estimate. With `preserve_lines` a cut that
+    lands mid-line moves back to the line boundary, unless the piece is a single partial line."""
+    counter = counter or get_token_counter(model)
+    head_tokens, tail_tokens = max(0, head_tokens), max(0, tail_tokens)
+    tokens = counter.encode(text)
+    if tokens is not None:
+        total = len(tokens)
+        if total <= head_tokens + tail_tokens:
+            return TokenSplit(text, "", total, False)
+        head = counter.decode(tokens[:head_tokens]) if head_tokens else ""
+        tail = counter.decode(tokens[total - tail_tokens:]) if tail_tokens else ""
+    else:
+        total = counter.estimate(text)
+        if total <= head_tokens + tail_tokens:
+            return TokenSplit(text, "", total, False)
+        chars_per_token = len(text) / total
+        head = text[:int(head_tokens * chars_per_token)]
+        tail = text[len(text) - int(tail_tokens * chars_per_token):] if tail_tokens else ""
+
+    if preserve_lines:
+        if head and len(head) < len(text) and text[len(head)] != "\n" and "\n" in head:
+            head = head[:head.rindex("\n") + 1]
+        start = len(text) - len(tail)
+        if tail and start > 0 and text[start - 1] != "\n" and "\n" in tail:
+            tail = tail[tail.index("\n") + 1:]
+    return TokenSplit(head, tail, total, True)
+
 def truncate_text_by_tokens(
     text:str,
     max_tokens:int,
-    model:str="gpt-4",
+    model:str | None = None,
     suffix:str = "\n...[truncated]",
-    preserve_lines:bool = True
+    preserve_lines:bool = True,
+    mode:TruncationMode = "head",
+    head_share:float = 0.7,
 ) -> str:
-    current_tokens = count_tokens(text, model)
-    if current_tokens <= max_tokens:
+    """Fit `text` in `max_tokens`, marker included. `mode` picks what is kept: the start ("head"), the end ("tail",
+    e.g. build logs) or both with the middle elided ("middle", `head_share` of the budget goes to the start).
+    The text is tokenized once, however large it is."""
+    if mode not in ("head", "tail", "middle"):
+        raise ValueError(f"Unknown truncation mode: {mode}")
+    if fits_in_tokens(text, max_tokens):
         return text
-    suffix_tokens = count_tokens(suffix, model)
-    allowed_tokens = max_tokens - suffix_tokens
 
+    counter = get_token_counter(model)
+    allowed_tokens = max_tokens - counter.count(suffix)
     if allowed_tokens <= 0:
         return suffix[:max_tokens]
 
-    if preserve_lines:
-        return _truncate_by_lines(text, allowed_tokens, model, suffix)
-    else:
-        return _truncate_by_chars(text, allowed_tokens, model, suffix)
-
-
-def _truncate_by_lines(text:str, allowed_tokens:int, model:str="gpt-4", suffix:str = "\n...[truncated]") -> str:
-    lines = text.splitlines()
-    truncated_text = ""
-    current_tokens = 0
-
-    for line in lines:
-        line_tokens = count_tokens(line + "\n", model)
-        if current_tokens + line_tokens > allowed_tokens:
-            break
-        truncated_text += line + "\n"
-        current_tokens += line_tokens
-
-    return truncated_text.rstrip("\n") + suffix
-
-def _truncate_by_chars(text:str, allowed_tokens:int, model:str="gpt-4", suffix:str = "\n...[truncated]") -> str:
-    low,high = 0, len(text)
-
-    while low < high:
-        mid = (low + high) // 2
-        if count_tokens(text[:mid] + suffix, model) <= allowed_tokens:
-            low = mid + 1
-        else:
-            high = mid
-
+    head_tokens = {"head": allowed_tokens, "tail": 0, "middle": int(allowed_tokens * head_share)}[mode]
+    split = split_by_tokens(text, head_tokens, allowed_tokens - head_tokens, preserve_lines=preserve_lines, counter=counter)
+    if not split.truncated or split.total_tokens <= max_tokens:
+        return text
 
-    return text[:low-1] + suffix
+    if mode == "head":
+        return split.head.rstrip("\n") + suffix
+    if mode == "tail":
+        return suffix.lstrip("\n") + "\n" + split.tail
+    return split.head.rstrip("\n") + suffix + "\n" + split.tail
@@ -0,0 +1,176 @@
+"""Token counting, one TokenCounter per model for the whole process (see get_token_counter). Models tiktoken doesn't
+know use cl100k_base; without any encoding (offline, empty cache) counts are estimated from the length and calibrated
+against the provider's prompt tokens. Counts are memoized in an LRU keyed by (hash, length) of the text."""
+from __future__ import annotations
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4"
+FALLBACK_ENCODING = "cl100k_base"
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+_PARALLEL_MIN_CHARS = 64 * 1024  # below this a batch is encoded inline, the thread handoff costs more than it saves
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # tiktoken releases the GIL while encoding, so the threads do run in parallel
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tokenizer")
+        return _executor
+
+
+class TokenCounter:
+    def __init__(self, model: str = DEFAULT_MODEL, cache_size: int = 4096, encoding: Any | None = None, estimate_only: bool = False) -> None:
+        self.model = model
+        self.cache_size = cache_size
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
+        self.hits = 0
+        self.misses = 0
+        self._encoding = encoding
+        self._resolved = encoding is not None or estimate_only
+        self._cache: OrderedDict[tuple[int, int], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self) -> Any | None:
+        """The tiktoken encoding, None when counts are estimated."""
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    self._encoding = _load_encoding(self.model)
+                    self._resolved = True
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def estimate(self, text: str) -> int:
+        return max(1, int(len(text) / self.chars_per_token)) if text else 0
+
+    def _encode_count(self, text: str) -> int:
+        encoding = self.encoding
+        # encode_ordinary: special tokens like <|endoftext|> in a file are plain text here, not an error
+        return len(encoding.encode_ordinary(text)) if encoding is not None else self.estimate(text)
+
+    def _get(self, key: tuple[int, int]) -> int | None:
+        with self._lock:
+            count = self._cache.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def _put(self, key: tuple[int, int], count: int) -> None:
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = (hash(text), len(text))
+        count = self._get(key)
+        if count is None:
+            count = self._encode_count(text)
+            self._put(key, count)
+        return count
+
+    def count_many(self, texts: Iterable[str]) -> list[int]:
+        """Counts of several texts, the ones not in the cache are encoded together on the tokenizer threads."""
+        texts = list(texts)
+        counts: list[int | None] = []
+        missing: dict[tuple[int, int], str] = {}
+        for text in texts:
+            key = (hash(text), len(text)) if text else None
+            count = 0 if key is None else self._get(key)
+            if count is None:
+                missing[key] = text
+            counts.append(count)
+
+        if missing:
+            keys = list(missing)
+            values = list(missing.values())
+            encoding = self.encoding
+            if encoding is None:
+                fresh = [self.estimate(text) for text in values]
+            elif len(values) > 1 and sum(map(len, values)) >= _PARALLEL_MIN_CHARS:
+                fresh = [len(tokens) for tokens in _get_executor().map(encoding.encode_ordinary, values)]
+            else:
+                fresh = [len(encoding.encode_ordinary(text)) for text in values]
+            computed = dict(zip(keys, fresh))
+            for key, count in computed.items():
+                self._put(key, count)
+            counts = [computed[(hash(text), len(text))] if count is None else count for text, count in zip(texts, counts)]
+        return counts
+
+    def encode(self, text: str) -> list[int] | None:
+        """Token ids of the text, None when there is no encoding to produce them."""
+        encoding = self.encoding
+        return encoding.encode_ordinary(text) if encoding is not None else None
+
+    def decode(self, tokens: list[int]) -> str:
+        # a slice of the tokens can start or end inside a multi-byte character, drop the partial bytes
+        return self.encoding.decode_bytes(tokens).decode("utf-8", errors="ignore")
+
+    def calibrate(self, chars: int, tokens: int) -> None:
+        """Feed an observed (characters, provider tokens) pair, only used while counts are estimated.
+
+        Only later counts use the new ratio. Counts already handed out, like MessageItem.token_count and the
+        ledger built from them, are not re-estimated, the ledger's scale covers the difference."""
+        if self.exact or chars <= 0 or tokens <= 0:
+            return
+        observed = min(8.0, max(1.5, chars / tokens))
+        # moving average, one odd request (lots of JSON, CJK text) shouldn't swing every count
+        self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * observed
+        with self._lock:
+            self._cache.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def _load_encoding(model: str) -> Any | None:
+    # "openai/gpt-4o" style names from routers map to the plain model name
+    for name in dict.fromkeys((model, model.rsplit("/", 1)[-1])):
+        try:
+            return tiktoken.encoding_for_model(name)
+        except KeyError:
+            continue
+        except Exception as e:
+            logger.warning(f"Could not load the tokenizer for '{name}', estimating token counts: {e}")
+            return None
+    try:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        logger.warning(f"Could not load the {FALLBACK_ENCODING} tokenizer, estimating token counts: {e}")
+        return None
+
+
+_counters: dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: str | None = None) -> TokenCounter:
+    model = model or DEFAULT_MODEL
+    with _counters_lock:
+        counter = _counters.get(model)
+        if counter is None:
+            counter = _counters[model] = TokenCounter(model)
+        return counter
@@ -0,0 +1,143 @@
+"""Content-addressed cache of complete LLM responses, one JSON file per request hash. The file mtime is the LRU
+clock: it's bumped on every hit and the oldest files go first once the cache outgrows its size bound."""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from collections.abc import Sequence
+from typing import Any
+
+from config.config import ResponseCacheConfig
+from lib.response import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+EVICT_TO_RATIO = 0.9  # evict down to 90% of the bound so we don't evict on every write
+
+
+def make_cache_key(
+    model: str,
+    messages: Sequence[dict[str, Any]],
+    tools: list[dict[str, Any]] | None,
+    temperature: float | None,
+) -> str:
+    payload = {
+        "model": model,
+        "messages": list(messages),
+        "tools": tools or [],
+        "temperature": temperature,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory: Path, config: ResponseCacheConfig) -> None:
+        self.directory = directory
+        self.max_bytes = config.max_size_mb * 1024 * 1024
+        self.ttl_seconds = config.ttl_seconds
+        self._size: int | None = None  # computed lazily on first write
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> list[StreamEvent] | None:
+        path = self._path(key)
+        try:
+            raw = path.read_text(encoding="utf-8")
+            entry = json.loads(raw)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            events = [StreamEvent.from_dict(item) for item in entry["events"]]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Dropping corrupt response cache entry {path.name}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return events
+
+    def put(self, key: str, events: list[StreamEvent]) -> None:
+        path = self._path(key)
+        data = json.dumps(
+            {"created_at": time.time(), "events": [event.to_dict() for event in events]},
+            ensure_ascii=False,
+        ).encode("utf-8")
+
+        size_before = self._current_size()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            previous = path.stat().st_size if path.exists() else 0
+            # write to a temp file first so concurrent readers never see a partial entry
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry: {e}")
+            return
+
+        self._size = size_before + len(data) - previous
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._entries())
+        return self._size
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        entries: list[tuple[float, Path, int]] = []
+        if not self.directory.exists():
+            return entries
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        target = int(self.max_bytes * EVICT_TO_RATIO)
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, _, entry_size in entries)
+        for _, path, entry_size in entries:
+            if size <= target:
+                break
+            self._remove(path)
+            size -= entry_size
+        self._size = size
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        if self._size is not None:
+            self._size = max(0, self._size - size)
+
+    def clear(self) -> None:
+        for _, path, _ in self._entries():
+            self._remove(path)
+        self._size = 0
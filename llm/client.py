@@ -1,30 +1,83 @@
 import asyncio
 import logging
+import time
 import dotenv
 from config.config import Config
-from lib.response import StreamEventType, StreamEvent, TextDelta, TokenUsage, ToolCall, ToolCallDelta, parase_tool_call_arguments
+from config.loader import get_data_dir
+from lib.response import JsonCompletenessDetector, RequestMetrics, StreamEventType, StreamEvent, TextDelta, TokenUsage, ToolCall, ToolCallDelta, parase_tool_call_arguments
+from llm.cache import ResponseCache, make_cache_key
+from llm.metrics import RequestTimer
+from llm.pool import ClientPool, get_client_pool
+from llm.rate_limit import RateLimiter, get_rate_limiter, parse_retry_after
+from llm.replay import ChunkRecorder, get_chunk_recorder
+from llm.routing import Endpoint, EndpointRouter, resolve_endpoints
 from openai import AsyncOpenAI , RateLimitError, APIConnectionError
+from collections.abc import Sequence
 from typing import Any, AsyncGenerator
 
 dotenv.load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+class HedgedRequestError(Exception):
+    """Every request of a hedged stream failed before producing an event, with the endpoint each error came from."""
+
+    def __init__(self, failures: list[tuple[Endpoint, Exception]]) -> None:
+        super().__init__("; ".join(f"{endpoint.name}: {error}" for endpoint, error in failures))
+        self.failures = failures
+
+
 class LLMProvider:
-    def __init__(self,config:Config) -> None:
-        self._client: AsyncOpenAI | None = None
+    def __init__(self,config:Config, client_pool: ClientPool | None = None) -> None:
+        self._clients: dict[str, AsyncOpenAI] = {}
+        self.pool: ClientPool = client_pool or get_client_pool() # shared across sessions and sub-agents
         self.model: str = config.get_model_name  # default model, can be overridden by passing a different model name to the constructor
-        self.max_retries: int = 3  # maximum number of retries for rate limit errors
+        self.max_retries: int = config.rate_limit.max_retries  # maximum number of retries for rate limit errors
         self.config = config
-
-    def get_client(self) -> AsyncOpenAI:
-        if self._client is None:
-            self._client = AsyncOpenAI(
-                api_key=self.config.get_api_key,
-                base_url=self.config.get_base_url,
+        self.router = EndpointRouter(resolve_endpoints(config))
+        self.response_cache: ResponseCache | None = (
+            ResponseCache(get_data_dir() / "llm_cache", config.response_cache)
+            if config.response_cache.enabled
+            else None
+        )
+        record_path = config.get_record_path
+        self.recorder: ChunkRecorder | None = get_chunk_recorder(record_path) if record_path else None
+        self._tools_source: list[dict[str, Any]] | None = None
+        self._tools_payload: list[dict[str, Any]] = []
+
+    def get_client(self, endpoint: Endpoint | None = None) -> AsyncOpenAI:
+        endpoint = endpoint or self.router.endpoints[0]
+        client = self._clients.get(endpoint.key)
+        if client is None:
+            client = self.pool.acquire(
+                base_url=endpoint.base_url,
+                api_key=endpoint.api_key,
+                http_config=self.config.http,
             )
-        return self._client
-    
+            self._clients[endpoint.key] = client
+        return client
+
+    def get_rate_limiter(self, endpoint: Endpoint | None = None) -> RateLimiter:
+        # one limiter per endpoint, shared with every other provider in the process
+        endpoint = endpoint or self.router.endpoints[0]
+        return get_rate_limiter(endpoint.base_url or "", self.config.rate_limit)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self.get_rate_limiter()
+
+    def _estimate_prompt_tokens(self, message: Sequence[dict[str, Any]]) -> int:
+        # cheap pre-request estimate, settled against the real usage once the response completes
+        chars = sum(len(str(m.get("content") or "")) for m in message)
+        return max(1, chars // 4)  # same 1 token ~ 4 characters heuristic as lib.text.estimate_token_count
+
     def _build_tools(self,tools: list[dict[str,Any]]):
-        return [ 
+        # the registry hands out the same schema list until its tools change, so re-wrap only when it's a new list
+        if tools is self._tools_source:
+            return self._tools_payload
+        self._tools_source = tools
+        self._tools_payload = [ 
                 {
                     "type": "function",
                     "function": {
@@ -37,134 +90,372 @@ class LLMProvider:
                         }
                     } for tool in tools
                 ]
+        return self._tools_payload
+
     async def send_message(
-        self, message: list[dict[str, Any]],
+        self, message: Sequence[dict[str, Any]],
         tools: list[dict[str, Any]] | None = None,
-        stream: bool = True
+        stream: bool = True,
+        use_cache: bool = True,
         ) -> AsyncGenerator[StreamEvent, None]:
 
-        client = self.get_client()
-        kwargs = {"model": self.model, "messages": message, "stream": stream}
+        kwargs = {"messages": message, "stream": stream}
 
         if tools:
             kwargs["tools"] = self._build_tools(tools)
             kwargs["tool_choice"] = "auto"  # let the model decide which tool to use, we can also implement a more complex tool selection strategy if needed
 
-        for attempt in range(self.max_retries+1):
-            try :
+        if self.response_cache is None or not use_cache:
+            async for event in self._send_live(message, kwargs, stream):
+                yield event
+            return
+
+        models = sorted({endpoint.model or self.model for endpoint in self.router.endpoints})
+        cache_key = make_cache_key(",".join(models), message, kwargs.get("tools"), self.config.get_temperature)
+        lookup_start = time.perf_counter()
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            for event in cached:
+                if event.type == StreamEventType.MESSAGE_COMPLETE:
+                    # the stored timings belong to the original request
+                    event.metrics = RequestMetrics(duration=time.perf_counter() - lookup_start, cached=True)
+                yield event
+            return
+
+        # only complete, error-free responses are cached
+        recorded: list[StreamEvent] = []
+        completed = False
+        failed = False
+        async for event in self._send_live(message, kwargs, stream):
+            recorded.append(event)
+            if event.type == StreamEventType.MESSAGE_COMPLETE:
+                completed = True
+            elif event.type == StreamEventType.ERROR:
+                failed = True
+            yield event
+
+        if completed and not failed:
+            self.response_cache.put(cache_key, recorded)
+
+    async def _send_live(
+        self, message: Sequence[dict[str, Any]], kwargs: dict[str, Any], stream: bool
+        ) -> AsyncGenerator[StreamEvent, None]:
+        estimated_tokens = self._estimate_prompt_tokens(message)
 
-                if stream:
-                    async for event in self._stream_response(client, kwargs):
-                        yield event
-                else:
-                    event = await self._non_stream_response(client, kwargs)
-                    yield event
-                return
-            except RateLimitError as e:
-                if attempt < self.max_retries:
-                    # backoff strategy: wait for a short period before retrying, you can implement exponential backoff if desired
-                    await asyncio.sleep(2 ** attempt)  # simple exponential backoff
+        for attempt in range(self.max_retries+1):
+            endpoints = self.router.ordered()
+            retry_after: float | None = None
+            rate_limited = False
+            connection_error: APIConnectionError | None = None
+
+            tried: set[Endpoint] = set()  # endpoints that already failed this attempt, e.g. as the hedge
+            # fail over to the next endpoint as long as nothing has been streamed to the caller yet
+            for index, endpoint in enumerate(endpoints):
+                if endpoint in tried:
                     continue
-                else:
-                    yield StreamEvent(type=StreamEventType.ERROR, error="Rate limit exceeded. Please try again later.")
+                emitted = False
+                try :
+                    if stream:
+                        hedge_endpoint = endpoints[index + 1] if self.config.model.hedge and index + 1 < len(endpoints) else None
+                        if hedge_endpoint is not None:
+                            events = self._hedged_stream(endpoint, hedge_endpoint, kwargs, estimated_tokens)
+                        else:
+                            events = self._stream_endpoint(endpoint, kwargs, estimated_tokens)
+                        async for event in events:
+                            emitted = True
+                            yield event
+                    else:
+                        event = await self._non_stream_endpoint(endpoint, kwargs, estimated_tokens)
+                        yield event
                     return
-            except APIConnectionError as e:
-                yield StreamEvent(type=StreamEventType.ERROR, error=f"API connection error: {str(e)}. Please check your network connection and try again.")
+                except RateLimitError as e:
+                    if emitted:
+                        yield StreamEvent(type=StreamEventType.ERROR, error="Rate limit exceeded. Please try again later.")
+                        return
+                    failures = [(endpoint, e)]
+                except APIConnectionError as e:
+                    if emitted:
+                        yield StreamEvent(type=StreamEventType.ERROR, error=f"API connection error: {str(e)}. Please check your network connection and try again.")
+                        return
+                    failures = [(endpoint, e)]
+                except HedgedRequestError as e:
+                    failures = e.failures
+                except Exception as e:
+                    yield StreamEvent(type=StreamEventType.ERROR, error=str(e))
+                    return
+
+                # the hedge reports both endpoints, each one is throttled or failed over on its own account
+                for failed, error in failures:
+                    tried.add(failed)
+                    if isinstance(error, RateLimitError):
+                        # honour the server's Retry-After (pauses every caller on this endpoint) and try the next endpoint
+                        endpoint_retry_after = parse_retry_after(error.response.headers if error.response is not None else None)
+                        self.get_rate_limiter(failed).record_throttle(endpoint_retry_after)
+                        rate_limited = True
+                        if endpoint_retry_after is not None:
+                            retry_after = endpoint_retry_after if retry_after is None else min(retry_after, endpoint_retry_after)
+                    elif isinstance(error, APIConnectionError):
+                        logger.warning(f"Endpoint '{failed.name}' connection failed, failing over: {error}")
+                        connection_error = error
+                    else:
+                        yield StreamEvent(type=StreamEventType.ERROR, error=str(error))
+                        return
+
+            if not rate_limited:
+                yield StreamEvent(type=StreamEventType.ERROR, error=f"API connection error: {str(connection_error)}. Please check your network connection and try again.")
                 return
+
+            if attempt < self.max_retries:
+                # every endpoint is throttled, back off with jitter unless the server told us how long to wait
+                if retry_after is None:
+                    await asyncio.sleep(self.get_rate_limiter(endpoints[0]).backoff_delay(attempt))
+                continue
+
+            yield StreamEvent(type=StreamEventType.ERROR, error="Rate limit exceeded. Please try again later.")
+            return
+
+    def _request_kwargs(self, endpoint: Endpoint, kwargs: dict[str, Any]) -> dict[str, Any]:
+        return {**kwargs, "model": endpoint.model or self.model}
+
+    async def _stream_endpoint(
+        self, endpoint: Endpoint, kwargs: dict[str, Any], estimated_tokens: int
+        ) -> AsyncGenerator[StreamEvent, None]:
+        limiter = self.get_rate_limiter(endpoint)
+        health = self.router.health(endpoint)
+        client = self.get_client(endpoint)
+
+        queued_at = time.perf_counter()
+        async with limiter.slot(estimated_tokens):
+            start = time.perf_counter()
+            first_event = True
+            try:
+                async for event in self._stream_response(client, self._request_kwargs(endpoint, kwargs)):
+                    if first_event:
+                        health.record_ttft(time.perf_counter() - start)
+                        first_event = False
+                    if event.type == StreamEventType.MESSAGE_COMPLETE:
+                        if event.usage:
+                            limiter.record_usage(estimated_tokens, event.usage.total_tokens)
+                        if event.metrics:
+                            event.metrics.queue_time = start - queued_at
+                            event.metrics.endpoint = endpoint.name
+                    yield event
+            except (APIConnectionError, RateLimitError):
+                health.record_failure()
+                raise
+        health.record_success()
+
+    async def _non_stream_endpoint(
+        self, endpoint: Endpoint, kwargs: dict[str, Any], estimated_tokens: int
+        ) -> StreamEvent:
+        limiter = self.get_rate_limiter(endpoint)
+        health = self.router.health(endpoint)
+
+        queued_at = time.perf_counter()
+        async with limiter.slot(estimated_tokens):
+            start = time.perf_counter()
+            try:
+                event = await self._non_stream_response(self.get_client(endpoint), self._request_kwargs(endpoint, kwargs))
+            except (APIConnectionError, RateLimitError):
+                health.record_failure()
+                raise
+        health.record_success()
+        if event.usage:
+            limiter.record_usage(estimated_tokens, event.usage.total_tokens)
+        if event.metrics:
+            event.metrics.queue_time = start - queued_at
+            event.metrics.endpoint = endpoint.name
+        return event
+
+    async def _hedged_stream(
+        self, primary: Endpoint, secondary: Endpoint, kwargs: dict[str, Any], estimated_tokens: int
+        ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream from `primary`, but if no first event arrives within its TTFT percentile also start `secondary`.
+        Whichever endpoint produces the first event wins and the other request is cancelled."""
+        queue: asyncio.Queue[tuple[Endpoint, Any]] = asyncio.Queue()
+        done = object()
+
+        async def pump(endpoint: Endpoint) -> None:
+            try:
+                async for event in self._stream_endpoint(endpoint, kwargs, estimated_tokens):
+                    await queue.put((endpoint, event))
+                await queue.put((endpoint, done))
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                yield StreamEvent(type=StreamEventType.ERROR, error=str(e))
-                return
+                await queue.put((endpoint, e))
+
+        tasks: dict[Endpoint, asyncio.Task] = {primary: asyncio.create_task(pump(primary))}
+        hedge_delay = self.router.hedge_delay(primary, self.config.model.hedge_percentile, self.config.model.hedge_min_delay)
+        winner: Endpoint | None = None
+        hedged = False
+        failures: list[tuple[Endpoint, Exception]] = []
+
+        try:
+            while True:
+                timeout = hedge_delay if winner is None and not hedged else None
+                try:
+                    endpoint, item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    logger.info(f"No first token from '{primary.name}' after {hedge_delay:.2f}s, hedging to '{secondary.name}'")
+                    tasks[secondary] = asyncio.create_task(pump(secondary))
+                    hedged = True
+                    continue
+
+                if winner is None:
+                    if item is done or isinstance(item, BaseException):
+                        if isinstance(item, BaseException):
+                            failures.append((endpoint, item))
+                        tasks.pop(endpoint, None)
+                        if tasks:
+                            continue  # the other request may still succeed
+                        if failures:
+                            raise HedgedRequestError(failures)
+                        return
+                    winner = endpoint
+                    for other, task in tasks.items():
+                        if other is not winner:
+                            task.cancel()
+                elif endpoint is not winner:
+                    continue  # late events from the cancelled request
+
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
 
     async def _stream_response(
         self, client: AsyncOpenAI, kwargs: dict[str, Any]
         ) -> AsyncGenerator[StreamEvent, None]:
 
+        timer = RequestTimer()
         resposne = await client.chat.completions.create(**kwargs)
+        timer.first_byte()  # the SDK hands back the stream once the response headers are in
         usage : TokenUsage | None = None
         finished_reason : str | None = None
         tool_calls:dict[int, dict[str, Any]] = {}
+        response_id = self.recorder.start_response() if self.recorder else None
+
+        # close the response explicitly so a cancelled (e.g. hedged) request frees its connection right away
+        try:
+            async for chunk in resposne:
+                if self.recorder is not None:
+                    self.recorder.record(response_id, chunk)
+
+                # if the chunk contains usage information, we can extract it and include it in the StreamEvent
+                if hasattr(chunk, "usage") and chunk.usage is not None:
+                    usage = TokenUsage(
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        completion_tokens=chunk.usage.completion_tokens,
+                        total_tokens=chunk.usage.total_tokens,
+                        cached_tokens=chunk.usage.prompt_tokens_details.cached_tokens if hasattr(chunk.usage, "prompt_tokens_details") and hasattr(chunk.usage.prompt_tokens_details, "cached_tokens") else 0
+                    )
 
-        async for chunk in resposne:
+                if not hasattr(chunk, "choices") or len(chunk.choices) == 0:
+                    timer.chunk()
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+                text_delta = None
+                output_chars = len(delta.content or "")
+                for tool_call in delta.tool_calls or []:
+                    output_chars += len((tool_call.function.arguments or "") if tool_call.function else "")
+                timer.chunk(output_chars)
+
+                if delta.tool_calls:
+                    for tool_call in delta.tool_calls:
+                        call_index = tool_call.index if hasattr(tool_call, "index") and tool_call.index is not None else 0
+
+                        if call_index not in tool_calls:
+                            # a new call index means the previous calls are done, hand them over right away
+                            for index, previous in sorted(tool_calls.items(), key=lambda item: item[0]):
+                                if index < call_index and not previous['ended']:
+                                    yield self._tool_call_end(previous)
+                            tool_calls[call_index] = {
+                                'id' : tool_call.id if hasattr(tool_call, "id") and tool_call.id else "",
+                                "name": '',
+                                'arguments': [], # fragments, joined once when the call ends
+                                'detector': JsonCompletenessDetector(),
+                                'ended': False,
+                            }
+                        elif (not tool_calls[call_index]['id']) and hasattr(tool_call, "id") and tool_call.id:
+                            tool_calls[call_index]['id'] = tool_call.id
+
+                        if tool_call.function:
+                            if tool_call.function.name:
+                                tool_calls[call_index]["name"] = tool_call.function.name
+                                yield StreamEvent(
+                                        type = StreamEventType.TOOL_CALL_START,
+                                        tool_call_delta= ToolCallDelta(
+                                            id=tool_calls[call_index]['id'],
+                                            name=tool_calls[call_index]['name'],
+                                            )
+                                        )
 
-            # if the chunk contains usage information, we can extract it and include it in the StreamEvent
-            if hasattr(chunk, "usage") and chunk.usage is not None:
-                usage = TokenUsage(
-                    prompt_tokens=chunk.usage.prompt_tokens,
-                    completion_tokens=chunk.usage.completion_tokens,
-                    total_tokens=chunk.usage.total_tokens,
-                    cached_tokens=chunk.usage.prompt_tokens_details.cached_tokens if hasattr(chunk.usage, "prompt_tokens_details") and hasattr(chunk.usage.prompt_tokens_details, "cached_tokens") else 0
-                )
 
-            if not hasattr(chunk, "choices") or len(chunk.choices) == 0:
-                continue
-            choice = chunk.choices[0]
-            delta = choice.delta
-            text_delta = None
-
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
-                    call_index = tool_call.index if hasattr(tool_call, "index") and tool_call.index is not None else 0
-
-                    if call_index not in tool_calls:
-                        tool_calls[call_index] = {
-                            'id' : tool_call.id if hasattr(tool_call, "id") and tool_call.id else "",
-                            "name": '',
-                            'arguments': ''
-                        }
-                    elif (not tool_calls[call_index]['id']) and hasattr(tool_call, "id") and tool_call.id:
-                        tool_calls[call_index]['id'] = tool_call.id
-
-                    if tool_call.function:
-                        if tool_call.function.name:
-                            tool_calls[call_index]["name"] = tool_call.function.name
-                            yield StreamEvent(
-                                    type = StreamEventType.TOOL_CALL_START,
+                            if hasattr(tool_call.function,"arguments") and tool_call.function.arguments:
+                                # NOTE: the delta carries only the new fragment, consumers accumulate it themselves
+                                tool_calls[call_index]['arguments'].append(tool_call.function.arguments)
+                                yield StreamEvent(
+                                    type = StreamEventType.TOOL_CALL_DELTA,
                                     tool_call_delta= ToolCallDelta(
                                         id=tool_calls[call_index]['id'],
                                         name=tool_calls[call_index]['name'],
-                                        arguments=tool_calls[call_index]['arguments']
+                                        arguments=tool_call.function.arguments
                                         )
                                     )
+                                # NOTE: emit the call as soon as its argument JSON closes, so the agent can start it while the model keeps generating
+                                entry = tool_calls[call_index]
+                                if not entry['ended'] and entry['detector'].feed(tool_call.function.arguments):
+                                    yield self._tool_call_end(entry)
+                if delta.content:
+                    text_delta = TextDelta(content=delta.content, role=delta.role)
+
+                    yield StreamEvent(
+                        type=StreamEventType.TEXT_DELTA,
+                        text_delta=text_delta,
+                    )
+        finally:
+            if self.recorder is not None:
+                self.recorder.flush()
+            close = getattr(resposne, "close", None)
+            if close is not None:
+                await close()
 
-
-                        if hasattr(tool_call.function,"arguments") and tool_call.function.arguments:
-                            tool_calls[call_index]['arguments'] += tool_call.function.arguments
-                            yield StreamEvent(
-                                type = StreamEventType.TOOL_CALL_DELTA,
-                                tool_call_delta= ToolCallDelta(
-                                    id=tool_calls[call_index]['id'],
-                                    name=tool_calls[call_index]['name'],
-                                    arguments=tool_calls[call_index]['arguments']
-                                    )
-                                )
-            if delta.content:
-                text_delta = TextDelta(content=delta.content, role=delta.role)
-
-                yield StreamEvent(
-                    type=StreamEventType.TEXT_DELTA,
-                    text_delta=text_delta,
-                )
         for _, tool_call in sorted(tool_calls.items(), key=lambda item: item[0]):
-            yield StreamEvent(
-                    type = StreamEventType.TOOL_CALL_END,
-                    tool_call = ToolCall(
-                        id=tool_call['id'],
-                        name = tool_call['name'],
-                        arguments = parase_tool_call_arguments(tool_call['arguments']),
-                    )
-                )
+            if not tool_call['ended']:
+                yield self._tool_call_end(tool_call)
         yield StreamEvent(
             type=StreamEventType.MESSAGE_COMPLETE,
             finished_reason=finished_reason,
-            usage=usage
+            usage=usage,
+            metrics=timer.finish(usage.completion_tokens if usage else None),
         )
 
+    def _tool_call_end(self, tool_call: dict[str, Any]) -> StreamEvent:
+        tool_call['ended'] = True
+        return StreamEvent(
+                type = StreamEventType.TOOL_CALL_END,
+                tool_call = ToolCall(
+                    id=tool_call['id'],
+                    name = tool_call['name'],
+                    arguments = parase_tool_call_arguments("".join(tool_call['arguments'])),
+                )
+            )
+
     async def _non_stream_response(
         self, client: AsyncOpenAI, kwargs: dict[str, Any]
     ) -> StreamEvent:
+        timer = RequestTimer()
         response = await client.chat.completions.create(**kwargs)
         choice = response.choices[0]
         message = choice.message
+        timer.chunk(len(message.content or ""))
 
 
         text_delta = None
@@ -197,14 +488,18 @@ class LLMProvider:
             type=StreamEventType.MESSAGE_COMPLETE,
             text_delta=text_delta,
             finished_reason=choice.finish_reason,
-            usage=usage
+            usage=usage,
+            metrics=timer.finish(usage.completion_tokens if usage else None),
         )
 
 
     async def close(self) -> None:
-        if self._client is not None:
-            await self._client.close()
-            self._client = None
+        # hand the clients back to the pool instead of closing them, so their warm connections can be reused
+        for client in self._clients.values():
+            self.pool.release(client)
+        self._clients.clear()
+        if self.recorder is not None:
+            self.recorder.close()
 
     def change_model(self, model_name: str) -> None:
         self.model = model_name
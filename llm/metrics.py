@@ -0,0 +1,60 @@
+from __future__ import annotations
+import time
+
+from lib.response import RequestMetrics
+
+
+def _percentile(ordered: list[float], percentile: float) -> float | None:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(percentile * len(ordered)))
+    return ordered[index]
+
+
+class RequestTimer:
+    """Collects the latency breakdown of one LLM request, see RequestMetrics."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self._first_byte: float | None = None
+        self._first_token: float | None = None
+        self._last_chunk: float | None = None
+        self._gaps: list[float] = []
+        self._chunks = 0
+        self._output_chars = 0
+
+    def first_byte(self) -> None:
+        if self._first_byte is None:
+            self._first_byte = time.perf_counter()
+
+    def chunk(self, output_chars: int = 0) -> None:
+        now = time.perf_counter()
+        self.first_byte()
+        # gaps are only meaningful once tokens flow, the wait before the first token is ttft
+        if self._first_token is not None and self._last_chunk is not None:
+            self._gaps.append(now - self._last_chunk)
+        if output_chars and self._first_token is None:
+            self._first_token = now
+        self._last_chunk = now
+        self._chunks += 1
+        self._output_chars += output_chars
+
+    def finish(self, completion_tokens: int | None = None) -> RequestMetrics:
+        end = time.perf_counter()
+        self.first_byte()
+        output_tokens = completion_tokens if completion_tokens else self._output_chars // 4  # same 1 token ~ 4 chars heuristic
+        gaps = sorted(self._gaps)
+
+        generation_time = end - self._first_token if self._first_token is not None else 0.0
+        return RequestMetrics(
+            ttfb=self._first_byte - self.start,
+            ttft=self._first_token - self.start if self._first_token is not None else None,
+            duration=end - self.start,
+            gap_p50=_percentile(gaps, 0.5),
+            gap_p90=_percentile(gaps, 0.9),
+            gap_p99=_percentile(gaps, 0.99),
+            gap_max=gaps[-1] if gaps else None,
+            chunks=self._chunks,
+            output_tokens=output_tokens,
+            tokens_per_second=output_tokens / generation_time if generation_time > 0 and output_tokens else None,
+        )
@@ -0,0 +1,140 @@
+"""Process-wide pool of AsyncOpenAI clients. Every LLMProvider (main agent, sub-agents, compaction) borrows its
+client from here, so connections stay warm across sessions."""
+from __future__ import annotations
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+
+from config.config import HttpPoolConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    active_leases: int = 0
+    clients: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _PoolEntry:
+    client: AsyncOpenAI
+    loop: asyncio.AbstractEventLoop | None
+    leases: int = 0
+
+
+class ClientPool:
+    def __init__(self) -> None:
+        self._entries: dict[tuple, _PoolEntry] = {}
+        self._by_client: dict[int, _PoolEntry] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def _make_key(self, base_url: str | None, api_key: str | None, http_config: HttpPoolConfig) -> tuple:
+        return (
+            base_url or "",
+            api_key or "",
+            http_config.max_connections,
+            http_config.max_keepalive_connections,
+            http_config.keepalive_expiry,
+            http_config.connect_timeout,
+            http_config.read_timeout,
+            http_config.http2,
+        )
+
+    def _build_client(self, base_url: str | None, api_key: str | None, http_config: HttpPoolConfig) -> AsyncOpenAI:
+        http2 = http_config.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        http_client = DefaultAsyncHttpxClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=http_config.max_connections,
+                max_keepalive_connections=http_config.max_keepalive_connections,
+                keepalive_expiry=http_config.keepalive_expiry,
+            ),
+        )
+        # NOTE: openai.Timeout matches the httpx flavour the SDK was built against, a bare httpx.Timeout may not
+        timeout = Timeout(http_config.read_timeout, connect=http_config.connect_timeout)
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, timeout=timeout)
+
+    def acquire(self, base_url: str | None, api_key: str | None, http_config: HttpPoolConfig) -> AsyncOpenAI:
+        key = self._make_key(base_url, api_key, http_config)
+        loop = _running_loop()
+        entry = self._entries.get(key)
+
+        # a client is bound to the event loop it was first used on, so a new loop (e.g. a second asyncio.run) needs a new client
+        if entry is not None and (entry.loop is None or entry.loop is loop) and not entry.client.is_closed():
+            if entry.loop is None:
+                entry.loop = loop
+            entry.leases += 1
+            self._hits += 1
+            return entry.client
+
+        if entry is not None:
+            self._by_client.pop(id(entry.client), None)
+
+        self._misses += 1
+        client = self._build_client(base_url, api_key, http_config)
+        entry = _PoolEntry(client=client, loop=loop, leases=1)
+        self._entries[key] = entry
+        self._by_client[id(client)] = entry
+        return client
+
+    def release(self, client: AsyncOpenAI) -> None:
+        # connections are kept alive after the last lease so the next session or sub-agent can reuse them
+        entry = self._by_client.get(id(client))
+        if entry is None:
+            return
+        entry.leases = max(0, entry.leases - 1)
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            hits=self._hits,
+            misses=self._misses,
+            active_leases=sum(entry.leases for entry in self._entries.values()),
+            clients=len(self._entries),
+        )
+
+    async def aclose(self) -> None:
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self._by_client.clear()
+        loop = _running_loop()
+        for entry in entries:
+            if entry.loop is not None and entry.loop is not loop:
+                continue  # cannot close transports that belong to a different event loop
+            try:
+                await entry.client.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled LLM client: {e}")
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+_shared_pool: ClientPool | None = None
+
+
+def get_client_pool() -> ClientPool:
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = ClientPool()
+    return _shared_pool
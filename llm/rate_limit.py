@@ -0,0 +1,201 @@
+"""Per-endpoint rate limiting. One limiter is shared by every LLMProvider talking to the same endpoint, so parallel
+callers queue behind one token bucket instead of backing off together."""
+from __future__ import annotations
+import asyncio
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Mapping
+
+from config.config import RateLimitConfig
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self._updated = now
+
+    def time_until(self, amount: float, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        # a single request larger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float, now: float | None = None) -> None:
+        # the balance may go negative, later callers then wait until the debt is refilled
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= amount
+
+
+@dataclass
+class RateLimiterMetrics:
+    queue_depth: int = 0
+    in_flight: int = 0
+    last_wait_seconds: float = 0.0
+    total_wait_seconds: float = 0.0
+    requests: int = 0
+    throttled: int = 0
+
+
+class RateLimiter:
+    def __init__(self, config: RateLimitConfig) -> None:
+        self.config = config
+        rpm = config.requests_per_minute
+        tpm = config.tokens_per_minute
+        self._request_bucket = TokenBucket(rpm, rpm / 60.0) if rpm else None
+        self._token_bucket = TokenBucket(tpm, tpm / 60.0) if tpm else None
+        self._paused_until = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._capacity_lock: asyncio.Lock | None = None
+        self._metrics = RateLimiterMetrics()
+
+    def _ensure_primitives(self) -> None:
+        # asyncio primitives are bound to a loop, rebuild them when the limiter is reused from a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
+            self._capacity_lock = asyncio.Lock()
+            self._metrics.in_flight = 0
+            self._metrics.queue_depth = 0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        self._ensure_primitives()
+        assert self._semaphore is not None and self._capacity_lock is not None
+
+        start = time.monotonic()
+        self._metrics.queue_depth += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                # the lock keeps waiters FIFO, so only the head of the queue sleeps for capacity
+                async with self._capacity_lock:
+                    await self._wait_for_capacity(estimated_tokens)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self._metrics.queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self._metrics.last_wait_seconds = waited
+        self._metrics.total_wait_seconds += waited
+        self._metrics.requests += 1
+        self._metrics.in_flight += 1
+        try:
+            yield
+        finally:
+            self._metrics.in_flight -= 1
+            self._semaphore.release()
+
+    async def _wait_for_capacity(self, estimated_tokens: int) -> None:
+        while True:
+            now = time.monotonic()
+            delay = max(0.0, self._paused_until - now)
+            if self._request_bucket is not None:
+                delay = max(delay, self._request_bucket.time_until(1, now))
+            if self._token_bucket is not None and estimated_tokens > 0:
+                delay = max(delay, self._token_bucket.time_until(estimated_tokens, now))
+
+            if delay <= 0:
+                if self._request_bucket is not None:
+                    self._request_bucket.consume(1, now)
+                if self._token_bucket is not None and estimated_tokens > 0:
+                    self._token_bucket.consume(estimated_tokens, now)
+                return
+            await asyncio.sleep(delay)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Settle the difference between the pre-request estimate and the usage reported by the provider."""
+        if self._token_bucket is not None:
+            self._token_bucket.consume(actual_tokens - estimated_tokens)
+
+    def record_throttle(self, retry_after: float | None = None) -> None:
+        self._metrics.throttled += 1
+        if retry_after is not None and retry_after > 0:
+            # pause every caller on this endpoint, not just the one that got the 429
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def backoff_delay(self, attempt: int) -> float:
+        # full jitter: spread retries over [0, cap] so parallel callers don't retry in lockstep
+        cap = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def metrics(self) -> RateLimiterMetrics:
+        return RateLimiterMetrics(**self._metrics.__dict__)
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def _parse_duration(value: str) -> float | None:
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    # OpenAI style reset values such as "1s", "6m0s" or "250ms"
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, Any] | None) -> float | None:
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = _parse_duration(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    resets = []
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value:
+            seconds = _parse_duration(value)
+            if seconds is not None:
+                resets.append(seconds)
+    return max(resets) if resets else None
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(endpoint: str, config: RateLimitConfig) -> RateLimiter:
+    limiter = _limiters.get(endpoint)
+    if limiter is None or limiter.config != config:
+        limiter = RateLimiter(config)
+        _limiters[endpoint] = limiter
+    return limiter
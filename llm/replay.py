@@ -0,0 +1,359 @@
+"""Record/replay harness for offline runs of the agent loop.
+
+ChunkRecorder saves the raw chunks of every streamed response to JSONL (one shared recorder per file, see
+get_chunk_recorder), FakeOpenAIServer replays them (or synthetic
+ones) as an OpenAI-compatible SSE server with a configurable TTFT and tokens/sec. FakeChatClient streams them
+in-process, without HTTP:
+
+    python -m llm.replay session.jsonl --port 8765 --ttft 0.4 --tps 80
+    BASE_URL=http://127.0.0.1:8765/v1 API_KEY=fake cyberowl --prompt "..."
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, TextIO
+
+from openai.types.chat import ChatCompletionChunk
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkRecorder:
+    """Appends chunks through one buffered handle, opened on the first chunk and flushed once per response. Get one
+    through get_chunk_recorder, two recorders on the same file would hand out the same response ids."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._ids = itertools.count(self._next_response_id())
+        self._file: TextIO | None = None
+
+    def _next_response_id(self) -> int:
+        # keep ids unique when appending to an existing recording
+        if not self.path.is_file():
+            return 0
+        last = -1
+        for record in _read_jsonl(self.path):
+            last = max(last, int(record.get("response", -1)))
+        return last + 1
+
+    def start_response(self) -> int:
+        return next(self._ids)
+
+    def record(self, response_id: int, chunk: Any) -> None:
+        data = chunk.model_dump(exclude_none=True) if hasattr(chunk, "model_dump") else chunk
+        if self._file is None:
+            self._file = self.path.open("a", encoding="utf-8")
+        self._file.write(json.dumps({"response": response_id, "chunk": data}, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        # the next record() opens the file again, so closing a shared recorder is harmless
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@lru_cache(maxsize=None)
+def _recorder(path: Path) -> ChunkRecorder:
+    return ChunkRecorder(path)
+
+
+def get_chunk_recorder(path: Path) -> ChunkRecorder:
+    """Shared recorder for the file, its existing response ids are read only the first time."""
+    return _recorder(Path(path).resolve())
+
+
+def _read_jsonl(path: Path) -> list[dict[str, Any]]:
+    records = []
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def load_recording(path: Path) -> list[list[dict[str, Any]]]:
+    """Return the recorded responses in order, each as its list of raw chunks."""
+    grouped: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for record in _read_jsonl(path):
+        grouped[int(record["response"])].append(record["chunk"])
+    return [grouped[key] for key in sorted(grouped)]
+
+
+def _chunk(index: int, delta: dict[str, Any], finish_reason: str | None = None, model: str = "fake-model") -> dict[str, Any]:
+    return {
+        "id": f"chatcmpl-fake-{index}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def make_text_response(text: str, chunk_size: int = 16) -> list[dict[str, Any]]:
+    chunks = [_chunk(0, {"role": "assistant", "content": ""})]
+    for start in range(0, len(text), chunk_size):
+        chunks.append(_chunk(0, {"content": text[start:start + chunk_size]}))
+    chunks.append(_chunk(0, {}, finish_reason="stop"))
+    return chunks
+
+
+def make_tool_call_response(calls: list[tuple[str, str]], chunk_size: int = 16) -> list[dict[str, Any]]:
+    """Build the chunks of a response that calls each (tool name, JSON argument string) in order."""
+    chunks = [_chunk(0, {"role": "assistant", "content": None})]
+    for index, (name, arguments) in enumerate(calls):
+        chunks.append(_chunk(0, {"tool_calls": [{
+            "index": index,
+            "id": f"call_{index}",
+            "type": "function",
+            "function": {"name": name, "arguments": ""},
+        }]}))
+        for start in range(0, len(arguments), chunk_size):
+            chunks.append(_chunk(0, {"tool_calls": [{
+                "index": index,
+                "function": {"arguments": arguments[start:start + chunk_size]},
+            }]}))
+    chunks.append(_chunk(0, {}, finish_reason="tool_calls"))
+    return chunks
+
+
+def _chunk_tokens(chunk: dict[str, Any]) -> int:
+    text = 0
+    for choice in chunk.get("choices") or []:
+        delta = choice.get("delta") or {}
+        text += len(delta.get("content") or "")
+        for tool_call in delta.get("tool_calls") or []:
+            text += len((tool_call.get("function") or {}).get("arguments") or "")
+    return max(1, text // 4) if text else 0
+
+
+def _to_completion(chunks: list[dict[str, Any]]) -> dict[str, Any]:
+    # fold a streamed response into the equivalent non-streaming chat.completion body
+    content = ""
+    tool_calls: dict[int, dict[str, Any]] = {}
+    finish_reason = "stop"
+    usage = None
+    for chunk in chunks:
+        usage = chunk.get("usage") or usage
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            content += delta.get("content") or ""
+            finish_reason = choice.get("finish_reason") or finish_reason
+            for tool_call in delta.get("tool_calls") or []:
+                entry = tool_calls.setdefault(tool_call.get("index", 0), {
+                    "id": "", "type": "function", "function": {"name": "", "arguments": ""},
+                })
+                entry["id"] = tool_call.get("id") or entry["id"]
+                function = tool_call.get("function") or {}
+                entry["function"]["name"] = function.get("name") or entry["function"]["name"]
+                entry["function"]["arguments"] += function.get("arguments") or ""
+
+    message: dict[str, Any] = {"role": "assistant", "content": content or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    body = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": chunks[0].get("model", "fake-model") if chunks else "fake-model",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+    }
+    if usage:
+        body["usage"] = usage
+    return body
+
+
+class ChunkStream:
+    """Async iterator over chat-completion chunks, what the SDK's create(stream=True) returns."""
+
+    def __init__(self, chunks: list[Any]) -> None:
+        self._chunks = iter(chunks)
+
+    def __aiter__(self) -> ChunkStream:
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeChatClient:
+    """In-process stand-in for AsyncOpenAI that streams the same chunks on every request, no HTTP involved.
+    The chunks are parsed once up front, so only the provider's per-chunk work is left to time or test."""
+
+    def __init__(self, chunks: list[dict[str, Any]]) -> None:
+        self.chat = self
+        self.completions = self
+        self.chunks = [ChatCompletionChunk.model_validate(chunk) for chunk in chunks]
+
+    async def create(self, **kwargs: Any) -> ChunkStream:
+        return ChunkStream(self.chunks)
+
+
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        responses: list[list[dict[str, Any]]],
+        ttft: float = 0.0,
+        tokens_per_second: float | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        if not responses:
+            raise ValueError("FakeOpenAIServer needs at least one response to replay")
+        self.responses = responses
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.host = host
+        self.port = port
+        self.requests: list[dict[str, Any]] = []
+        self._next = 0
+        self._server: asyncio.base_events.Server | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> FakeOpenAIServer:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> FakeOpenAIServer:
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    def _next_response(self) -> list[dict[str, Any]]:
+        # replay in order and wrap around, so a short recording can drive a long benchmark
+        response = self.responses[self._next % len(self.responses)]
+        self._next += 1
+        return response
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+                await self._dispatch(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+            payload = json.loads(body or b"{}")
+            self.requests.append(payload)
+            chunks = self._next_response()
+            if payload.get("stream"):
+                await self._stream(chunks, writer)
+            else:
+                await asyncio.sleep(self.ttft)
+                await self._write_json(writer, 200, _to_completion(chunks))
+            return
+
+        if method == "GET" and path.rstrip("/").endswith("/models"):
+            await self._write_json(writer, 200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+            return
+
+        await self._write_json(writer, 404, {"error": {"message": f"{method} {path} is not supported by the fake server"}})
+
+    async def _write_json(self, writer: asyncio.StreamWriter, status: int, data: dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream(self, chunks: list[dict[str, Any]], writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await writer.drain()
+
+        await asyncio.sleep(self.ttft)
+        for chunk in chunks:
+            if self.tokens_per_second:
+                await asyncio.sleep(_chunk_tokens(chunk) / self.tokens_per_second)
+            self._write_chunked(writer, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await writer.drain()
+        self._write_chunked(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def _write_chunked(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded chat-completion streams as an OpenAI-compatible server")
+    parser.add_argument("recording", type=Path, help="JSONL file written by ChunkRecorder (LLM_RECORD_PATH)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds before the first chunk of every response")
+    parser.add_argument("--tps", type=float, default=None, help="output tokens per second, unlimited when omitted")
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        server = FakeOpenAIServer(
+            load_recording(args.recording),
+            ttft=args.ttft,
+            tokens_per_second=args.tps,
+            host=args.host,
+            port=args.port,
+        )
+        await server.start()
+        print(f"Replaying {len(server.responses)} responses on {server.base_url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
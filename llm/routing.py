@@ -0,0 +1,117 @@
+"""Health-scored routing over the configured [model] endpoints. Health is process-wide, so an endpoint failing for
+one session is avoided by the others too."""
+from __future__ import annotations
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from config.config import Config
+
+EWMA_ALPHA = 0.2
+MAX_COOLDOWN_SECONDS = 60.0
+TTFT_SAMPLE_SIZE = 200
+MIN_HEDGE_SAMPLES = 10
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    base_url: str | None
+    api_key: str | None
+    model: str | None = None  # None means "use the provider's current model"
+
+    @property
+    def key(self) -> str:
+        return f"{self.base_url or ''}|{self.model or ''}"
+
+
+@dataclass
+class EndpointHealth:
+    success_rate: float = 1.0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    ttft_samples: deque[float] = field(default_factory=lambda: deque(maxlen=TTFT_SAMPLE_SIZE))
+
+    def record_success(self) -> None:
+        self.success_rate = (1 - EWMA_ALPHA) * self.success_rate + EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self) -> None:
+        self.success_rate = (1 - EWMA_ALPHA) * self.success_rate
+        self.consecutive_failures += 1
+        cooldown = min(MAX_COOLDOWN_SECONDS, 2 ** (self.consecutive_failures - 1))
+        self.cooldown_until = time.monotonic() + cooldown
+
+    def record_ttft(self, seconds: float) -> None:
+        self.ttft_samples.append(seconds)
+
+    def is_cooling_down(self, now: float | None = None) -> bool:
+        return self.cooldown_until > (time.monotonic() if now is None else now)
+
+    def ttft_percentile(self, percentile: float) -> float | None:
+        if not self.ttft_samples:
+            return None
+        ordered = sorted(self.ttft_samples)
+        index = min(len(ordered) - 1, int(percentile * len(ordered)))
+        return ordered[index]
+
+
+_health: dict[str, EndpointHealth] = {}
+
+
+def get_endpoint_health(endpoint: Endpoint) -> EndpointHealth:
+    health = _health.get(endpoint.key)
+    if health is None:
+        health = EndpointHealth()
+        _health[endpoint.key] = health
+    return health
+
+
+def resolve_endpoints(config: Config) -> list[Endpoint]:
+    if not config.model.endpoints:
+        return [Endpoint(name="default", base_url=config.get_base_url, api_key=config.get_api_key)]
+
+    return [
+        Endpoint(
+            name=endpoint.name,
+            base_url=endpoint.base_url,
+            api_key=endpoint.api_key,
+            model=endpoint.model,
+        )
+        for endpoint in config.model.endpoints
+    ]
+
+
+class EndpointRouter:
+    def __init__(self, endpoints: list[Endpoint]) -> None:
+        if not endpoints:
+            raise ValueError("EndpointRouter needs at least one endpoint")
+        self.endpoints = endpoints
+
+    def health(self, endpoint: Endpoint) -> EndpointHealth:
+        return get_endpoint_health(endpoint)
+
+    def ordered(self) -> list[Endpoint]:
+        """Healthy endpoints first, then by success rate and median TTFT; config order breaks ties."""
+        now = time.monotonic()
+
+        def sort_key(item: tuple[int, Endpoint]) -> tuple[bool, float, float, int]:
+            index, endpoint = item
+            health = self.health(endpoint)
+            median_ttft = health.ttft_percentile(0.5)
+            return (
+                health.is_cooling_down(now),
+                -round(health.success_rate, 2),
+                median_ttft if median_ttft is not None else 0.0,
+                index,
+            )
+
+        return [endpoint for _, endpoint in sorted(enumerate(self.endpoints), key=sort_key)]
+
+    def hedge_delay(self, endpoint: Endpoint, percentile: float, min_delay: float) -> float:
+        health = self.health(endpoint)
+        if len(health.ttft_samples) < MIN_HEDGE_SAMPLES:
+            return min_delay
+        observed = health.ttft_percentile(percentile)
+        return max(min_delay, observed if observed is not None else min_delay)
@@ -18,7 +18,14 @@ logger = logging.getLogger(__name__)
 @click.option('--stream', is_flag=True, help='Whether to stream the response or not')
 @click.option('--prompt', help='The prompt to send to the LLM')
 @click.option('--cwd', '-c', type=click.Path(exists = True , file_okay = False , path_type = Path), help='The current working directory to use for the agent')
-def main(stream: bool, prompt: str, cwd: Path):
+@click.option('--batch', 'batch_file', type=click.Path(exists = True , dir_okay = False , path_type = Path), help='Run every prompt of a JSONL file headlessly')
+@click.option('--output', '-o', type=click.Path(dir_okay = False , path_type = Path), help='Where to write the JSONL batch results (default: stdout)')
+@click.option('--concurrency', type=click.IntRange(min=1), default=8, show_default=True, help='Number of prompts run at once in batch mode')
+@click.option('--serve', is_flag=True, help='Run as a server streaming agent events over HTTP (SSE)')
+@click.option('--host', help='Host to bind in server mode (default: [server].host)')
+@click.option('--port', type=click.IntRange(min=0, max=65535), help='Port to bind in server mode (default: [server].port)')
+def main(stream: bool, prompt: str, cwd: Path, batch_file: Path | None, output: Path | None, concurrency: int,
+         serve: bool, host: str | None, port: int | None):
 
     try:
         config = load_config(cwd)
@@ -35,6 +42,26 @@ def main(stream: bool, prompt: str, cwd: Path):
 
 
 
+    if serve:
+        from server import serve as serve_agents
+
+        try:
+            run(serve_agents(config, host=host, port=port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if batch_file:
+        from agent.batch import run_batch_file
+
+        stats = run(run_batch_file(config, batch_file, output, concurrency=concurrency))
+        click.echo(
+            f"{stats.total} prompts, {stats.failed} failed in {stats.wall_time:.1f}s "
+            f"({stats.prompts_per_second:.2f}/s, {stats.prompt_tokens} prompt / {stats.completion_tokens} completion tokens)",
+            err=True,
+        )
+        sys.exit(1 if stats.failed else 0)
+
     cli = CLI(config)
     try:
         if prompt:
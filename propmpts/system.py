@@ -34,7 +34,6 @@ def get_system_prompt(
     if user_memory:
         parts.append(_get_memory_section(user_memory))
 
-    parts.append(create_loop_breaker_prompt("The agent is repeating the same actions or responses without making progress towards the user's goal."))
     # Operational guidelines
     parts.append(_get_operational_section())
 
@@ -292,6 +291,33 @@ You have access to the following tools to accomplish your tasks:
 
     return guidelines
 
+def get_volatile_context_prompt(user_memory: str | None = None, summary: str | None = None) -> str | None:
+    """Content that changes during a session, sent after the stable system prompt so it doesn't break the cached prefix."""
+    parts = []
+    if summary:
+        parts.append(get_context_restoration_prompt(summary))
+    if user_memory:
+        parts.append(_get_memory_section(user_memory))
+    if not parts:
+        return None
+    return "\n\n".join(parts)
+
+
+def get_context_restoration_prompt(summary: str) -> str:
+    """Generate the section that carries a compacted conversation summary."""
+    return f"""# Context Restoration (Previous conversation Compacted):
+The previos conversation has been compacted into the following summary to save tokens, but it may still contain important information.
+Please use this summary to restore any important context or information that may be relevant for the current conversation.
+
+Summary:
+{summary}
+
+**Important Notes**:
+- The summary may not include all details from the original conversation, so please consider it as a reference rather than a complete replacement for the original context.
+- If there are any ambiguities or missing information in the summary, please use your best judgment to fill in the gaps based on the information provided and the current conversation.
+- Action listed under 'COMPLETED ACTIONS' are already executed, so you should not execute them again, but you can use the information from those actions if needed."""
+
+
 def get_compression_prompt(n: int) -> str:
     return f"""You are a high-precision conversation summarizer.
 
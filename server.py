@@ -0,0 +1,295 @@
+"""Long-running server hosting many sessions in one event loop:
+
+    POST   /sessions                     -> {"session_id": ...}
+    GET    /sessions                     -> sessions in memory
+    POST   /sessions/<id>/messages       {"message": ...} -> AgentEvents as server-sent events
+    DELETE /sessions/<id>                -> save and close
+    GET    /health
+
+The client pool and MCP servers are shared, tool registries are per session. Past `max_sessions` or
+`idle_timeout_seconds` the least recently used idle session is saved to its journal and closed, a later request
+resumes it."""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from agent.agent import Agent
+from agent.event_bus import EventBus
+from agent.session import get_sessions_dir
+from config.config import Config
+from llm.pool import ClientPool, get_client_pool
+from tools.mcp.mcp_manager import MCPManager
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict"}
+
+
+@dataclass
+class ManagedSession:
+    agent: Agent
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+    users: int = 0  # requests holding the session from SessionManager.get until release
+
+    @property
+    def session_id(self) -> str:
+        return self.agent.session.sessionId
+
+    @property
+    def busy(self) -> bool:
+        return self.users > 0 or self.lock.locked()
+
+
+class SessionManager:
+    def __init__(self, config: Config, client_pool: ClientPool | None = None) -> None:
+        self.config = config
+        self.client_pool = client_pool or get_client_pool()
+        self.mcp_manager = MCPManager(config)
+        self._sessions: OrderedDict[str, ManagedSession] = OrderedDict()
+        self._lock = asyncio.Lock()  # guards creation, resume and eviction
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def _open(self) -> ManagedSession:
+        agent = Agent(self.config, client_pool=self.client_pool, mcp_manager=self.mcp_manager)
+        await agent.__aenter__()
+        return ManagedSession(agent=agent)
+
+    async def create(self) -> ManagedSession:
+        async with self._lock:
+            managed = await self._open()
+            self._sessions[managed.session_id] = managed
+            # held while evicting, so a full table of busy sessions doesn't evict the one just created
+            managed.users += 1
+            try:
+                await self._evict_over_limit()
+            finally:
+                managed.users -= 1
+        return managed
+
+    async def get(self, session_id: str) -> ManagedSession | None:
+        """Session by id, resumed from its journal when it was evicted earlier. The session is marked in use before
+        the lock is released, so eviction leaves it alone until the caller hands it back with release()."""
+        async with self._lock:
+            managed = self._sessions.get(session_id)
+            if managed is None:
+                # an unknown or mistyped id shouldn't build a whole agent just to find there's no journal
+                if Path(session_id).name != session_id or not (get_sessions_dir() / f"{session_id}.jsonl").is_file():
+                    return None
+                managed = await self._open()
+                if not managed.agent.session.resume(session_id) or managed.session_id != session_id:
+                    await managed.agent.__aexit__(None, None, None)
+                    return None
+                self._sessions[session_id] = managed
+            managed.users += 1
+            await self._evict_over_limit()
+            self._sessions.move_to_end(session_id)
+            managed.last_used = time.monotonic()
+            return managed
+
+    def release(self, managed: ManagedSession) -> None:
+        managed.users -= 1
+        managed.last_used = time.monotonic()
+
+    def list(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {"session_id": session_id, "busy": managed.busy, "idle_seconds": round(now - managed.last_used, 1)}
+            for session_id, managed in self._sessions.items()
+        ]
+
+    async def close(self, session_id: str) -> bool:
+        async with self._lock:
+            managed = self._sessions.pop(session_id, None)
+        if managed is None:
+            return False
+        async with managed.lock:
+            await self._persist_and_close(managed)
+        return True
+
+    async def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.config.server.idle_timeout_seconds
+        async with self._lock:
+            idle = [m for m in self._sessions.values() if m.last_used < cutoff and not m.busy]
+            for managed in idle:
+                await self._evict(managed)
+        return len(idle)
+
+    async def _evict_over_limit(self) -> None:
+        # least recently used first, sessions handed out by get() or in the middle of a run are skipped
+        for managed in list(self._sessions.values()):
+            if len(self._sessions) <= self.config.server.max_sessions:
+                return
+            if not managed.busy:
+                await self._evict(managed)
+
+    async def _evict(self, managed: ManagedSession) -> None:
+        self._sessions.pop(managed.session_id, None)
+        self.evictions += 1
+        logger.info(f"Evicting session {managed.session_id}")
+        await self._persist_and_close(managed)
+
+    async def _persist_and_close(self, managed: ManagedSession) -> None:
+        session = managed.agent.session
+        try:
+            if session.context_manager is not None and session.turn_count:
+                session.context_manager.save()
+        finally:
+            await managed.agent.__aexit__(None, None, None)
+
+    async def aclose(self) -> None:
+        async with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for managed in sessions:
+            await self._persist_and_close(managed)
+        await self.mcp_manager.shutdown()
+
+
+class AgentServer:
+    def __init__(self, config: Config, host: str | None = None, port: int | None = None, client_pool: ClientPool | None = None) -> None:
+        self.config = config
+        self.host = host or config.server.host
+        self.port = config.server.port if port is None else port
+        self.sessions = SessionManager(config, client_pool=client_pool)
+        self._server: asyncio.Server | None = None
+        self._sweeper: asyncio.Task | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> AgentServer:
+        # MCP servers connect once here, every session then registers their tools from the shared manager
+        await self.sessions.mcp_manager.initialize()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep_idle())
+        logger.info(f"Agent server listening on {self.base_url}")
+        return self
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.sessions.aclose()
+        await self.sessions.client_pool.aclose()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _sweep_idle(self) -> None:
+        interval = min(60.0, self.config.server.idle_timeout_seconds / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sessions.evict_idle()
+            except Exception:
+                logger.exception("Idle session sweep failed")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers: dict[str, str] = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+            await self._dispatch(method, path.split("?", 1)[0].rstrip("/"), body, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["health"]:
+            await _write_json(writer, 200, {"status": "ok", "sessions": len(self.sessions)})
+        elif parts == ["sessions"] and method == "POST":
+            managed = await self.sessions.create()
+            await _write_json(writer, 201, {"session_id": managed.session_id})
+        elif parts == ["sessions"] and method == "GET":
+            await _write_json(writer, 200, {"sessions": self.sessions.list()})
+        elif len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            closed = await self.sessions.close(parts[1])
+            await _write_json(writer, 200 if closed else 404, {"closed": closed})
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages" and method == "POST":
+            await self._run_message(parts[1], body, writer)
+        else:
+            await _write_json(writer, 404, {"error": f"{method} {path or '/'} not found"})
+
+    async def _run_message(self, session_id: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            message = json.loads(body or b"{}").get("message")
+        except (json.JSONDecodeError, AttributeError):
+            message = None
+        if not isinstance(message, str) or not message.strip():
+            await _write_json(writer, 400, {"error": "body must be {\"message\": \"...\"}"})
+            return
+
+        managed = await self.sessions.get(session_id)
+        if managed is None:
+            await _write_json(writer, 404, {"error": f"session {session_id} not found"})
+            return
+        try:
+            # another request got the session first, it's running or about to
+            if managed.users > 1 or managed.lock.locked():
+                await _write_json(writer, 409, {"error": f"session {session_id} is already running"})
+                return
+
+            async with managed.lock:
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/event-stream\r\n"
+                    b"Cache-Control: no-cache\r\n"
+                    b"Connection: close\r\n\r\n"
+                )
+                await writer.drain()
+                events = EventBus(self.config.event_bus).stream(managed.agent.run(message))
+                try:
+                    async for event in events:
+                        payload = event.to_dict()
+                        writer.write(f"event: {payload['type']}\ndata: {json.dumps(payload, default=str)}\n\n".encode("utf-8"))
+                        # waits while the client is slow, a client that went away ends the run (tools are cancelled)
+                        await writer.drain()
+                finally:
+                    await events.aclose()
+        finally:
+            self.sessions.release(managed)
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: int, data: dict[str, Any]) -> None:
+    body = json.dumps(data).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+        "Content-Type: application/json\r\n"
+        "Connection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+
+async def serve(config: Config, host: str | None = None, port: int | None = None) -> None:
+    await AgentServer(config, host=host, port=port).serve_forever()
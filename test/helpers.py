@@ -0,0 +1,65 @@
+"""Fixtures shared by the tests: offline token counts, patch setup and a configurable fake tool."""
+import asyncio
+import unittest
+from collections.abc import Callable
+from typing import Any
+from unittest import mock
+
+from config.config import Config
+from lib.text import estimate_token_count
+from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+
+
+def offline_token_counts() -> Any:
+    """Patch for the context manager's token counts, the real tokenizer downloads its encoding on first use."""
+    return mock.patch("context.context_manager.count_tokens", side_effect=lambda text, model=None: estimate_token_count(text))
+
+
+def start_patches(case: unittest.TestCase, *patches: Any) -> None:
+    for patch in patches:
+        patch.start()
+        case.addCleanup(patch.stop)
+
+
+class FakeTool(Tool):
+    """Tool of any name and kind. Logs "start name:path" / "end name:path", sleeps `delay` in between and returns
+    `handler(invocation)`, or the label when there is no handler."""
+
+    schema = {"type": "object", "properties": {"path": {"type": "string"}, "text": {"type": "string"}}}
+
+    def __init__(
+        self,
+        config: Config,
+        name: str,
+        kind: ToolKind = ToolKind.READ,
+        handler: Callable[[ToolInvocation], ToolResult] | None = None,
+        delay: float = 0.0,
+        log: list[str] | None = None,
+    ) -> None:
+        super().__init__(config)
+        self.name = name
+        self.kind = kind
+        self.handler = handler
+        self.delay = delay
+        self.log = log if log is not None else []
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+        self.cancelled = False
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        label = f"{self.name}:{invocation.params.get('path', '')}"
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.log.append(f"start {label}")
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            self.running -= 1
+        self.log.append(f"end {label}")
+        return self.handler(invocation) if self.handler else ToolResult.success_result(label)
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from agent.batch import BatchItem, BatchRunner, read_batch_file, run_batch_file
+from config.config import Config
+from llm.pool import ClientPool
+from llm.replay import FakeOpenAIServer, make_text_response
+
+from helpers import offline_token_counts, start_patches
+
+
+class TestBatchRunner(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = await FakeOpenAIServer([make_text_response("all done", chunk_size=3)], host="127.0.0.5").start()
+        start_patches(
+            self,
+            mock.patch.dict(os.environ, {"API_KEY": "fake", "BASE_URL": self.server.base_url}),
+            offline_token_counts(),
+        )
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+        self.tmp.cleanup()
+
+    async def test_runs_every_prompt_with_bounded_workers(self):
+        pool = ClientPool()
+        runner = BatchRunner(Config(cwd=Path(self.tmp.name)), concurrency=2, client_pool=pool)
+        items = [BatchItem(id=f"p{i}", prompt=f"task {i}", index=i) for i in range(5)]
+        results = []
+
+        stats = await runner.run(items, results.append)
+        await pool.aclose()
+
+        self.assertEqual(stats.total, 5)
+        self.assertEqual(stats.failed, 0)
+        self.assertEqual(sorted(r.id for r in results), [f"p{i}" for i in range(5)])
+        self.assertTrue(all(r.final_text == "all done" and r.turns == 1 for r in results))
+        # every conversation starts fresh, the server never sees an earlier prompt
+        for request in self.server.requests:
+            self.assertEqual(sum(str(m.get("content", "")).startswith("task") for m in request["messages"]), 1)
+        self.assertEqual(json.loads(json.dumps(results[0].to_dict()))["success"], True)
+
+    async def test_run_batch_file_writes_every_result(self):
+        input_path = Path(self.tmp.name) / "prompts.jsonl"
+        output_path = Path(self.tmp.name) / "results.jsonl"
+        input_path.write_text("\n".join(json.dumps(f"task {i}") for i in range(4)) + "\n", encoding="utf-8")
+
+        stats = await run_batch_file(Config(cwd=Path(self.tmp.name)), input_path, output_path, concurrency=2, client_pool=ClientPool())
+
+        lines = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(stats.total, 4)
+        self.assertEqual(sorted(line["id"] for line in lines), ["0", "1", "2", "3"])
+        self.assertTrue(all(line["success"] for line in lines))
+
+    def test_read_batch_file(self):
+        path = Path(self.tmp.name) / "prompts.jsonl"
+        path.write_text('{"id": "a", "prompt": "first"}\n\n"second"\n', encoding="utf-8")
+
+        items = list(read_batch_file(path))
+
+        self.assertEqual([(i.id, i.prompt, i.index) for i in items], [("a", "first", 0), ("1", "second", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
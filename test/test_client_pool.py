@@ -0,0 +1,52 @@
+import os
+import unittest
+from unittest import mock
+
+from config.config import Config, HttpPoolConfig
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+
+
+class TestClientPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = ClientPool()
+
+    async def asyncTearDown(self):
+        await self.pool.aclose()
+
+    async def test_same_endpoint_reuses_client(self):
+        http_config = HttpPoolConfig()
+        first = self.pool.acquire("http://localhost:1/v1", "key", http_config)
+        second = self.pool.acquire("http://localhost:1/v1", "key", http_config)
+
+        self.assertIs(first, second)
+        stats = self.pool.stats()
+        self.assertEqual(stats.misses, 1)
+        self.assertEqual(stats.hits, 1)
+        self.assertEqual(stats.active_leases, 2)
+
+    async def test_different_limits_get_separate_clients(self):
+        first = self.pool.acquire("http://localhost:1/v1", "key", HttpPoolConfig(max_connections=10))
+        second = self.pool.acquire("http://localhost:1/v1", "key", HttpPoolConfig(max_connections=20))
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.stats().clients, 2)
+
+    @mock.patch.dict(os.environ, {"API_KEY": "test-key", "BASE_URL": "http://localhost:1/v1"})
+    async def test_provider_close_returns_client_to_pool(self):
+        config = Config()
+        provider = LLMProvider(config, client_pool=self.pool)
+        client = provider.get_client()
+        await provider.close()
+
+        self.assertFalse(client.is_closed())
+        self.assertEqual(self.pool.stats().active_leases, 0)
+
+        # a new provider (e.g. a sub-agent) borrows the same warm client
+        child = LLMProvider(config, client_pool=self.pool)
+        self.assertIs(child.get_client(), client)
+        self.assertEqual(self.pool.stats().hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
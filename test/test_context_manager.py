@@ -0,0 +1,143 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config, PromptCachePolicy
+from context.context_manager import ContextManager, MessageItem
+from lib.response import TokenUsage
+
+from helpers import offline_token_counts, start_patches
+
+
+class TestStablePrefix(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.tmp.name)
+        start_patches(
+            self,
+            mock.patch("context.context_manager.get_data_dir", return_value=self.data_dir),
+            offline_token_counts(),
+        )
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write_memory(self, entries: dict) -> None:
+        (self.data_dir / "user_memory.json").write_text(json.dumps(entries), encoding="utf-8")
+
+    def test_memory_change_keeps_system_prompt_identical(self):
+        self._write_memory({"editor": "vim"})
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("hello")
+
+        first = manager.get_context()
+        self._write_memory({"editor": "helix"})
+        second = manager.get_context()
+
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn("vim", first[0]["content"])
+        self.assertIn("vim", first[1]["content"])
+        self.assertIn("helix", second[1]["content"])
+        self.assertEqual(second[1]["role"], "user")
+        self.assertEqual(first[2:], second[2:])
+
+    def test_memory_change_keeps_serialized_history_identical(self):
+        self._write_memory({"editor": "vim"})
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("fix the parser")
+        manager.add_assistant_message("", [{"id": "call_0", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}])
+        manager.add_tool_result("call_0", "def parse(): ...")
+        manager.add_assistant_message("done", None)
+        manager.add_user_message("now add tests")
+
+        first = list(manager.get_context())
+        self._write_memory({"editor": "helix", "shell": "fish"})
+        second = list(manager.get_context())
+
+        # the block sits right before the newest user message, the history in front of it is the cached prefix
+        self.assertIn("vim", first[-2]["content"])
+        self.assertIn("helix", second[-2]["content"])
+        self.assertEqual(second[-1]["content"], "now add tests")
+        self.assertEqual(json.dumps(first[:-2]).encode(), json.dumps(second[:-2]).encode())
+        self.assertEqual(len(first), 7)
+
+        # within the turn's tool loop the block stays put
+        manager.add_assistant_message("", [{"id": "call_1", "type": "function", "function": {"name": "write_file", "arguments": "{}"}}])
+        manager.add_tool_result("call_1", "ok")
+        third = list(manager.get_context())
+        self.assertEqual(third[:7], second)
+
+    def test_summary_goes_to_volatile_block_not_mid_history_system(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("hello")
+        manager.replace_chat_session("we refactored the parser")
+
+        context = manager.get_context()
+
+        self.assertEqual([m["role"] for m in context].count("system"), 1)
+        self.assertIn("we refactored the parser", context[-2]["content"])
+
+    def test_legacy_mode_bakes_memory_into_system_prompt(self):
+        self._write_memory({"editor": "vim"})
+        manager = ContextManager(Config(prompt_cache=PromptCachePolicy(stable_prefix=False)), tools=[])
+
+        context = manager.get_context()
+
+        self.assertIn("vim", context[0]["content"])
+        self.assertEqual(len(context), 1)
+
+    def test_prompt_cache_hit_ratio(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.record_prompt_usage(TokenUsage(prompt_tokens=1000, cached_tokens=0))
+        stats = manager.record_prompt_usage(TokenUsage(prompt_tokens=1000, cached_tokens=900))
+
+        self.assertEqual(stats.requests, 2)
+        self.assertAlmostEqual(stats.hit_ratio, 0.45)
+
+
+class TestContextPayload(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        start_patches(
+            self,
+            mock.patch("context.context_manager.get_data_dir", return_value=Path(tmp.name)),
+            offline_token_counts(),
+        )
+
+    def test_messages_are_serialized_once(self):
+        manager = ContextManager(Config(), tools=[])
+        with mock.patch.object(MessageItem, "to_dict", autospec=True, side_effect=MessageItem.to_dict) as to_dict:
+            for index in range(10):
+                manager.add_user_message(f"message {index}")
+                manager.get_context()
+            manager.get_context()
+
+        self.assertEqual(to_dict.call_count, 10)
+
+    def test_view_is_a_stable_snapshot(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("first")
+        view = manager.get_context()
+
+        manager.add_user_message("second")
+        manager.replace_messages([MessageItem(role="user", content="pruned")])
+
+        self.assertEqual([m.get("content") for m in view][-1], "first")
+        self.assertEqual(view[-1], {"role": "user", "content": "first"})
+        self.assertEqual(list(manager.get_context())[-1], {"role": "user", "content": "pruned"})
+        self.assertEqual(json.loads(json.dumps(list(view))), list(view))
+
+    def test_compaction_rebuilds_the_payload(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("hello there")
+
+        manager.replace_chat_session("summary")
+
+        contents = [m.get("content") for m in manager.get_context()]
+        self.assertNotIn("hello there", contents)
+        self.assertEqual(len(manager.get_context()), len(manager._messages) + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from agent.event_bus import EventBus
+from agent.events import AgentEvent, AgentEventType
+from config.config import EventBusConfig
+
+
+class TestEventBus(unittest.IsolatedAsyncioTestCase):
+    async def test_deltas_are_coalesced_and_order_is_kept(self):
+        async def source():
+            yield AgentEvent.agent_started("a", "hi")
+            for index in range(100):
+                yield AgentEvent.text_delta("a", f"{index},")
+            yield AgentEvent.tool_started("call_1", "read_file", {})
+            yield AgentEvent.text_delta("a", "tail")
+
+        bus = EventBus(EventBusConfig(coalesce_window_ms=1000, coalesce_max_chars=10_000))
+        events = [event async for event in bus.stream(source())]
+
+        self.assertEqual([e.type for e in events], [
+            AgentEventType.AGENT_STARTED, AgentEventType.TEXT_DELTA, AgentEventType.TOOL_STARTED, AgentEventType.TEXT_DELTA,
+        ])
+        self.assertEqual(events[1].content, "".join(f"{i}," for i in range(100)))
+        self.assertEqual(events[1].data["agent_name"], "a")
+        self.assertEqual(events[3].content, "tail")
+        self.assertEqual((bus.received, bus.delivered), (103, 4))
+
+    async def test_window_and_size_flush(self):
+        async def source():
+            yield AgentEvent.text_delta("a", "x" * 8)
+            yield AgentEvent.text_delta("a", "y" * 8)  # reaches max_chars, flushed right away
+            yield AgentEvent.text_delta("a", "z")
+            await asyncio.sleep(0.1)  # longer than the window, "z" is flushed on its own
+            yield AgentEvent.text_delta("a", "w")
+
+        bus = EventBus(EventBusConfig(coalesce_window_ms=20, coalesce_max_chars=16))
+        contents = [event.content async for event in bus.stream(source())]
+
+        self.assertEqual(contents, ["x" * 8 + "y" * 8, "z", "w"])
+
+    async def test_slow_consumer_applies_backpressure(self):
+        produced = 0
+
+        async def source():
+            nonlocal produced
+            for index in range(50):
+                produced += 1
+                yield AgentEvent.tool_started(f"call_{index}", "read_file", {})
+
+        stream = EventBus(EventBusConfig(queue_size=2)).stream(source())
+        await stream.__anext__()
+        await asyncio.sleep(0.05)
+
+        # one delivered, two queued, one waiting to be put, the source isn't drained ahead of the consumer
+        self.assertLessEqual(produced, 5)
+        await stream.aclose()
+
+    async def test_closing_the_stream_closes_the_source(self):
+        closed = asyncio.Event()
+
+        async def source():
+            try:
+                while True:
+                    yield AgentEvent.tool_started("call", "shell", {})
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+
+        async for _ in EventBus().stream(source()):
+            break
+
+        await asyncio.wait_for(closed.wait(), timeout=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from agent.loop_detector import LoopDetector
+from config.config import Config, LoopDetectionConfig, SessionJournalConfig
+from lib.response import ToolCall
+from llm.pool import ClientPool
+from llm.replay import FakeOpenAIServer, make_text_response, make_tool_call_response
+from tools.base import ToolKind, ToolResult
+
+from helpers import offline_token_counts, start_patches
+
+
+def _call(name: str = "read_file", **arguments) -> ToolCall:
+    return ToolCall(id="call", name=name, arguments=arguments)
+
+
+class TestLoopDetector(unittest.TestCase):
+    def test_short_circuits_after_repeated_identical_results(self):
+        detector = LoopDetector(LoopDetectionConfig(short_circuit_after=2, stop_after=2))
+        call = _call(path="a.txt", limit=5)
+
+        for _ in range(2):
+            self.assertIsNone(detector.check(call))
+            detector.record(call, ToolResult.success_result("same"), ToolKind.READ)
+
+        # argument order doesn't matter, the args are canonicalized
+        cached = detector.check(_call(limit=5, path="a.txt"))
+        self.assertIsNotNone(cached)
+        self.assertTrue(cached.output.startswith("same"))
+        self.assertIn("loop detected", cached.output)
+        self.assertEqual(cached.metadata["repeats"], 2)
+        self.assertFalse(detector.should_stop)
+
+        detector.check(call)
+        self.assertTrue(detector.should_stop)
+
+    def test_changing_results_are_not_a_loop(self):
+        detector = LoopDetector(LoopDetectionConfig(short_circuit_after=2))
+        call = _call("shell", command="pytest")
+
+        for index in range(5):
+            self.assertIsNone(detector.check(call))
+            detector.record(call, ToolResult.success_result(f"run {index}"), ToolKind.SHELL)
+
+    def test_write_resets_other_calls(self):
+        detector = LoopDetector(LoopDetectionConfig(short_circuit_after=2))
+        read = _call(path="a.txt")
+        for _ in range(2):
+            detector.record(read, ToolResult.success_result("old"), ToolKind.READ)
+        self.assertEqual(detector.repeats(read), 2)
+
+        detector.record(_call("edit", path="a.txt", new="x"), ToolResult.success_result("ok"), ToolKind.WRITE)
+
+        self.assertEqual(detector.repeats(read), 0)
+        self.assertIsNone(detector.check(read))
+
+    def test_no_short_circuit_after_a_state_change_in_the_batch(self):
+        detector = LoopDetector(LoopDetectionConfig(short_circuit_after=2))
+        read = _call(path="a.txt")
+        for _ in range(2):
+            detector.record(read, ToolResult.success_result("old"), ToolKind.READ)
+
+        self.assertIsNone(detector.check(read, after_state_change=True))
+        self.assertIsNotNone(detector.check(read))
+
+    def test_window_forgets_old_calls(self):
+        detector = LoopDetector(LoopDetectionConfig(window=3, short_circuit_after=2))
+        call = _call(path="a.txt")
+        for _ in range(2):
+            detector.record(call, ToolResult.success_result("same"), ToolKind.READ)
+        for index in range(2):
+            detector.record(_call(path=f"{index}.txt"), ToolResult.success_result("other"), ToolKind.READ)
+
+        self.assertEqual(detector.repeats(call), 1)
+        self.assertIsNone(detector.check(call))
+
+
+class TestAgentLoopDetection(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        Path(self.tmp.name, "notes.txt").write_text("nothing new here\n", encoding="utf-8")
+        # the model asks for the same file on every turn
+        response = make_tool_call_response([("read_file", json.dumps({"path": "notes.txt"}))])
+        self.llm = await FakeOpenAIServer([response], host="127.0.0.7").start()
+        start_patches(
+            self,
+            mock.patch.dict(os.environ, {"API_KEY": "fake", "BASE_URL": self.llm.base_url}),
+            offline_token_counts(),
+        )
+
+    async def asyncTearDown(self):
+        await self.llm.stop()
+        self.tmp.cleanup()
+
+    async def test_repeated_call_is_short_circuited_then_stopped(self):
+        config = Config(
+            cwd=Path(self.tmp.name),
+            max_turns=10,
+            session_journal=SessionJournalConfig(enabled=False),
+            loop_detection=LoopDetectionConfig(short_circuit_after=2, stop_after=2),
+        )
+        pool = ClientPool()
+        async with Agent(config, client_pool=pool) as agent:
+            events = [event async for event in agent.run("what is in notes.txt?")]
+        await pool.aclose()
+
+        finished = [e for e in events if e.type == AgentEventType.TOOL_FINISHED]
+        self.assertEqual([bool(e.data["metadata"].get("loop_detected")) for e in finished], [False, False, True, True])
+        self.assertEqual(len([e for e in events if e.type == AgentEventType.LOOP_DETECTED]), 2)
+        self.assertEqual(len(self.llm.requests), 4)
+        errors = [e for e in events if e.type == AgentEventType.AGENT_ERROR]
+        self.assertEqual(len(errors), 1)
+        self.assertIn("repeating", errors[0].data["message"])
+
+        # the model saw the loop-breaker notice before its last request
+        last_messages = self.llm.requests[-1]["messages"]
+        self.assertIn("Loop Detected", last_messages[-1]["content"])
+
+    async def test_read_after_edit_in_the_same_batch_runs(self):
+        read = ("read_file", json.dumps({"path": "notes.txt"}))
+        edit = ("edit_file", json.dumps({"path": "notes.txt", "old_string": "nothing new", "new_string": "edited"}))
+        await self.llm.stop()
+        # two identical reads, then an edit and the same read again in one response
+        self.llm = await FakeOpenAIServer([
+            make_tool_call_response([read]),
+            make_tool_call_response([read]),
+            make_tool_call_response([edit, read]),
+            make_text_response("done"),
+        ], host="127.0.0.7").start()
+        os.environ["BASE_URL"] = self.llm.base_url
+        config = Config(
+            cwd=Path(self.tmp.name),
+            max_turns=10,
+            session_journal=SessionJournalConfig(enabled=False),
+            loop_detection=LoopDetectionConfig(short_circuit_after=2, stop_after=2),
+        )
+        pool = ClientPool()
+        async with Agent(config, client_pool=pool) as agent:
+            events = [event async for event in agent.run("edit notes.txt")]
+        await pool.aclose()
+
+        finished = [e for e in events if e.type == AgentEventType.TOOL_FINISHED]
+        self.assertFalse(any(e.data["metadata"].get("loop_detected") for e in finished))
+        self.assertIn("edited", finished[-1].data["output"])
+        self.assertEqual([e for e in events if e.type == AgentEventType.LOOP_DETECTED], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from context.context_manager import ContextManager
+from context.journal import SessionJournal
+from context.pruning import PruningConfig, SlidingWindowPruner
+
+from helpers import offline_token_counts, start_patches
+
+
+def _tool_turn(manager: ContextManager, index: int, content: str = "output") -> None:
+    calls = [{"id": f"call_{index}_{n}", "type": "function", "function": {"name": "read_file", "arguments": "{}"}} for n in range(2)]
+    manager.add_assistant_message("", calls)
+    for call in calls:
+        manager.add_tool_result(call["id"], f"{content} {index} " + "x" * 200)
+
+
+class TestSlidingWindowPruner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        start_patches(
+            self,
+            mock.patch("context.context_manager.get_data_dir", return_value=Path(self.tmp.name)),
+            offline_token_counts(),
+        )
+
+    def _pruner(self, manager: ContextManager, message_budget: int, **kwargs) -> SlidingWindowPruner:
+        return SlidingWindowPruner(PruningConfig(max_window_tokens=manager.ledger.overhead_tokens + message_budget, **kwargs))
+
+    def _assert_no_orphans(self, manager: ContextManager) -> None:
+        call_ids: set[str] = set()
+        answered: set[str] = set()
+        for message in manager._messages:
+            if message.role == "assistant":
+                call_ids.update(call["id"] for call in message.tool_calls or [])
+            elif message.role == "tool":
+                self.assertIn(message.tool_call_id, call_ids, "tool result without its tool_calls message")
+                answered.add(message.tool_call_id)
+        self.assertEqual(call_ids, answered, "tool_calls message without all of its results")
+
+    def test_tool_calls_and_results_are_evicted_together(self):
+        manager = ContextManager(Config(), tools=[])
+        for index in range(30):
+            manager.add_user_message(f"question {index}")
+            _tool_turn(manager, index)
+        pruner = self._pruner(manager, 800, keep_recent_messages=4, keep_recent_tool_results=3)
+
+        removed = pruner.prune(manager)
+
+        self.assertGreater(removed, 0)
+        self.assertLessEqual(manager.ledger.message_tokens, 800)
+        self._assert_no_orphans(manager)
+        # the last two messages are the results of the newest turn, its tool_calls message stays with them
+        self.assertIn("output 29", manager._messages[-1].content)
+        self.assertEqual(manager._messages[-3].tool_calls[0]["id"], "call_29_0")
+
+    def test_user_messages_go_first_and_sticky_ones_last(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("the important decision: keep the v1 api " + "y" * 200)
+        for index in range(20):
+            manager.add_user_message(f"chatter {index} " + "z" * 200)
+            manager.add_assistant_message(f"answer {index} " + "z" * 200, None)
+        pruner = self._pruner(manager, 1_000, keep_recent_messages=2)
+
+        pruner.prune(manager)
+
+        contents = [message.content for message in manager._messages]
+        self.assertTrue(contents[0].startswith("the important decision"))
+        self.assertFalse(any(content.startswith("chatter 0 ") for content in contents))
+        self.assertTrue(any(content.startswith("answer 10 ") for content in contents))
+
+    def test_index_is_kept_between_prunes(self):
+        manager = ContextManager(Config(), tools=[])
+        pruner = self._pruner(manager, 600, keep_recent_messages=2)
+        with mock.patch.object(pruner, "_reset_index", wraps=pruner._reset_index) as reset:
+            for index in range(50):
+                manager.add_user_message(f"message {index} " + "x" * 100)
+                if pruner.should_prune(manager):
+                    pruner.prune(manager)
+
+        self.assertEqual(reset.call_count, 1)  # the first prune indexes the list, later ones only add to it
+        self.assertLessEqual(manager.ledger.message_tokens, 600 + manager.message_tokens(manager._messages[-1]))
+        self.assertEqual(manager._messages[-1].content[:10], "message 49")
+
+    def test_compaction_rebuilds_the_index(self):
+        manager = ContextManager(Config(), tools=[])
+        for index in range(10):
+            _tool_turn(manager, index)
+        pruner = self._pruner(manager, 300, keep_recent_messages=2)
+        pruner.prune(manager)
+
+        manager.replace_chat_session("summary")
+        for index in range(10, 20):
+            _tool_turn(manager, index)
+        pruner.prune(manager)
+
+        self._assert_no_orphans(manager)
+
+    def test_prune_is_journaled_as_removals(self):
+        journal = SessionJournal(Path(self.tmp.name) / "s1.jsonl", "s1", snapshot_every=10_000)
+        manager = ContextManager(Config(), tools=[], journal=journal)
+        for index in range(20):
+            manager.add_user_message(f"question {index}")
+            _tool_turn(manager, index)
+        self._pruner(manager, 500, keep_recent_messages=3).prune(manager)
+        journal.close()
+
+        _, state = SessionJournal.load(journal.path)
+
+        self.assertEqual([item["content"] for item in state.messages], [m.content for m in manager._messages])
+        self.assertNotIn('"snapshot"', journal.path.read_text())
+
+    def test_message_features_are_computed_once(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("we fixed the critical bug " + "y" * 200)
+        manager.add_tool_result("call_1", "plain output " + "z" * 200)
+        sticky, plain = manager._messages
+        self.assertEqual((sticky.priority, plain.priority), (3, 1))
+
+        pruner = self._pruner(manager, 10_000)
+        with mock.patch("context.sticky.StickyMatcher.matches") as matches:
+            pruner.prune(manager)
+            pruner._reset_index(None)
+            pruner.prune(manager)
+
+        matches.assert_not_called()  # classified when the messages were added, with the same keywords
+        self.assertTrue(pruner._units[0].sticky)
+        self.assertFalse(pruner._units[1].sticky)
+
+    def test_keyword_change_reclassifies(self):
+        manager = ContextManager(Config(), tools=[])
+        manager.add_user_message("Renamed the module " + "y" * 200)
+        for index in range(10):
+            manager.add_user_message(f"chatter {index} " + "z" * 200)
+        pruner = self._pruner(manager, 400, keep_recent_messages=2)
+        pruner.config.sticky_keywords = ["nothing matches this"]
+
+        pruner.prune(manager)
+
+        self.assertFalse(any(message.content.startswith("Renamed") for message in manager._messages))
+        self.assertFalse(manager._messages[0].is_sticky(pruner._matcher))
+
+
+if __name__ == "__main__":
+    unittest.main()
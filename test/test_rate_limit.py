@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+from config.config import RateLimitConfig
+from llm.rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_prefers_retry_after_ms(self):
+        self.assertAlmostEqual(parse_retry_after({"retry-after-ms": "250", "retry-after": "3"}), 0.25)
+
+    def test_seconds_and_reset_durations(self):
+        self.assertEqual(parse_retry_after({"retry-after": "3"}), 3.0)
+        self.assertEqual(parse_retry_after({"x-ratelimit-reset-requests": "1m30s", "x-ratelimit-reset-tokens": "20ms"}), 90.0)
+
+    def test_missing_headers(self):
+        self.assertIsNone(parse_retry_after({}))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_debt_delays_next_request(self):
+        bucket = TokenBucket(capacity=60, refill_per_second=1)
+        bucket.consume(60, now=bucket._updated)
+        bucket.consume(30, now=bucket._updated)
+
+        self.assertAlmostEqual(bucket.time_until(1, now=bucket._updated), 31.0)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_caps_in_flight_requests_and_reports_queue_depth(self):
+        limiter = RateLimiter(RateLimitConfig(max_concurrent_requests=2))
+        release = asyncio.Event()
+        peak = 0
+
+        async def worker():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.metrics().in_flight)
+                await release.wait()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+
+        metrics = limiter.metrics()
+        self.assertEqual(metrics.in_flight, 2)
+        self.assertEqual(metrics.queue_depth, 3)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.metrics().requests, 5)
+
+    async def test_retry_after_pauses_all_callers(self):
+        limiter = RateLimiter(RateLimitConfig())
+        limiter.record_throttle(0.05)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with limiter.slot():
+            pass
+
+        self.assertGreaterEqual(loop.time() - start, 0.04)
+        self.assertEqual(limiter.metrics().throttled, 1)
+
+    def test_backoff_is_jittered_within_cap(self):
+        limiter = RateLimiter(RateLimitConfig(backoff_base=1.0, backoff_max=4.0))
+        delays = [limiter.backoff_delay(5) for _ in range(50)]
+
+        self.assertTrue(all(0 <= delay <= 4.0 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
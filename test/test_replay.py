@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from lib.response import StreamEventType
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+from llm.replay import FakeOpenAIServer, get_chunk_recorder, load_recording, make_text_response, make_tool_call_response
+
+
+class TestFakeServerReplay(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.record_path = Path(self.tmp.name) / "recording.jsonl"
+        self.responses = [
+            make_tool_call_response([("read_file", json.dumps({"path": "README.md", "limit": 20}))], chunk_size=5),
+            make_text_response("The README describes the agent.", chunk_size=4),
+        ]
+        self.server = await FakeOpenAIServer(self.responses).start()
+
+    async def asyncTearDown(self):
+        get_chunk_recorder(self.record_path).close()
+        await self.server.stop()
+        self.tmp.cleanup()
+
+    def _provider(self) -> LLMProvider:
+        with mock.patch.dict(os.environ, {"API_KEY": "fake", "BASE_URL": self.server.base_url}):
+            provider = LLMProvider(Config(record_path=self.record_path), client_pool=ClientPool())
+            provider.get_client()
+        return provider
+
+    async def test_streams_tool_call_then_text_and_records_chunks(self):
+        provider = self._provider()
+        messages = [{"role": "user", "content": "summarize the readme"}]
+
+        first = [event async for event in provider.send_message(messages)]
+        second = [event async for event in provider.send_message(messages)]
+        await provider.pool.aclose()
+
+        tool_ends = [event.tool_call for event in first if event.type == StreamEventType.TOOL_CALL_END]
+        self.assertEqual(len(tool_ends), 1)
+        self.assertEqual(tool_ends[0].name, "read_file")
+        self.assertEqual(tool_ends[0].arguments, {"path": "README.md", "limit": 20})
+        fragments = [event.tool_call_delta.arguments for event in first if event.type == StreamEventType.TOOL_CALL_DELTA]
+        self.assertTrue(all(len(fragment) <= 5 for fragment in fragments))
+        self.assertEqual(json.loads("".join(fragments)), {"path": "README.md", "limit": 20})
+
+        text = "".join(event.text_delta.content for event in second if event.type == StreamEventType.TEXT_DELTA)
+        self.assertEqual(text, "The README describes the agent.")
+        self.assertEqual(second[-1].type, StreamEventType.MESSAGE_COMPLETE)
+        self.assertEqual(self.server.requests[0]["messages"], messages)
+
+        recorded = load_recording(self.record_path)
+        self.assertEqual(len(recorded), 2)
+        self.assertEqual(
+            [chunk["choices"][0]["delta"].get("content") for chunk in recorded[1]],
+            [chunk["choices"][0]["delta"].get("content") for chunk in self.responses[1]],
+        )
+
+    async def test_providers_share_one_recorder_per_file(self):
+        first, second = self._provider(), self._provider()
+        self.assertIs(first.recorder, second.recorder)
+        self.assertIs(first.recorder, get_chunk_recorder(self.record_path))
+
+        with mock.patch.object(Path, "open", autospec=True, side_effect=Path.open) as open_file:
+            [event async for event in first.send_message([{"role": "user", "content": "hi"}])]
+            [event async for event in second.send_message([{"role": "user", "content": "hi"}])]
+        await first.close()
+        await first.pool.aclose()
+        await second.pool.aclose()
+
+        # one handle for every chunk of both responses, and distinct response ids
+        self.assertEqual(open_file.call_count, 1)
+        self.assertEqual(len(load_recording(self.record_path)), 2)
+
+    async def test_ttft_is_applied_and_reported(self):
+        self.server.ttft = 0.1
+        self.server.tokens_per_second = 2000
+        provider = self._provider()
+
+        start = time.perf_counter()
+        events = [event async for event in provider.send_message([{"role": "user", "content": "hi"}])]
+        elapsed = time.perf_counter() - start
+        await provider.pool.aclose()
+
+        metrics = events[-1].metrics
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertGreaterEqual(metrics.ttft, 0.09)
+        self.assertLessEqual(metrics.ttfb, metrics.ttft)
+        self.assertLessEqual(metrics.ttft, metrics.duration)
+        self.assertEqual(metrics.endpoint, "default")
+        self.assertIsNotNone(metrics.gap_p50)
+        self.assertGreater(metrics.output_tokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from agent.agent import Agent
+from agent.events import AgentEventType
+from config.config import Config, ResponseCacheConfig, SessionJournalConfig
+from context.context_manager import ContextManager
+from lib.response import StreamEvent, StreamEventType, TextDelta, TokenUsage, ToolCall
+from llm.cache import ResponseCache, make_cache_key
+from llm.pool import ClientPool
+from llm.replay import FakeOpenAIServer, make_text_response
+
+from helpers import offline_token_counts, start_patches
+
+
+def _events(text: str) -> list[StreamEvent]:
+    return [
+        StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta(content=text)),
+        StreamEvent(type=StreamEventType.TOOL_CALL_END, tool_call=ToolCall(id="call_1", name="read_file", arguments={"path": "a.py"})),
+        StreamEvent(type=StreamEventType.MESSAGE_COMPLETE, usage=TokenUsage(prompt_tokens=3, completion_tokens=2, total_tokens=5)),
+    ]
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_key_is_canonical(self):
+        first = make_cache_key("m", [{"role": "user", "content": "hi"}], None, 0.7)
+        reordered = make_cache_key("m", [{"content": "hi", "role": "user"}], [], 0.7)
+        other_temperature = make_cache_key("m", [{"role": "user", "content": "hi"}], None, 0.2)
+
+        self.assertEqual(first, reordered)
+        self.assertNotEqual(first, other_temperature)
+
+    def test_round_trip_replays_events(self):
+        cache = ResponseCache(self.directory, ResponseCacheConfig(enabled=True))
+        cache.put("ab" * 32, _events("hello"))
+
+        replayed = cache.get("ab" * 32)
+
+        self.assertEqual(replayed, _events("hello"))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_expired_entry_is_a_miss(self):
+        cache = ResponseCache(self.directory, ResponseCacheConfig(enabled=True, ttl_seconds=60))
+        cache.put("cd" * 32, _events("old"))
+        path = self.directory / "cd" / f"{'cd' * 32}.json"
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        entry["created_at"] = time.time() - 120
+        path.write_text(json.dumps(entry), encoding="utf-8")
+
+        self.assertIsNone(cache.get("cd" * 32))
+        self.assertFalse(path.exists())
+
+    def test_removing_an_expired_entry_frees_its_size(self):
+        cache = ResponseCache(self.directory, ResponseCacheConfig(enabled=True, ttl_seconds=60))
+        cache.put("cd" * 32, _events("old"))
+        cache.put("ef" * 32, _events("kept"))
+        kept_size = (self.directory / "ef" / f"{'ef' * 32}.json").stat().st_size
+
+        with mock.patch("llm.cache.time.time", return_value=time.time() + 120):
+            cache.get("cd" * 32)
+
+        self.assertEqual(cache._current_size(), kept_size)
+
+    def test_evicts_least_recently_used_first(self):
+        cache = ResponseCache(self.directory, ResponseCacheConfig(enabled=True, max_size_mb=1))
+        big = "x" * (300 * 1024)
+        keys = [f"{i:02d}" * 32 for i in range(3)]
+        for index, key in enumerate(keys):
+            cache.put(key, _events(big))
+            os.utime(self.directory / key[:2] / f"{key}.json", (index, index))
+
+        self.assertIsNotNone(cache.get(keys[0]))  # bump the oldest entry
+        cache.put("99" * 32, _events(big))
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+
+
+
+class TestCachedReplayInAgent(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        response = make_text_response("hello there")
+        response.append({**response[-1], "choices": [], "usage": {"prompt_tokens": 900, "completion_tokens": 3, "total_tokens": 903}})
+        self.llm = await FakeOpenAIServer([response], host="127.0.0.8").start()
+        start_patches(
+            self,
+            mock.patch.dict(os.environ, {"API_KEY": "fake", "BASE_URL": self.llm.base_url}),
+            mock.patch("llm.client.get_data_dir", return_value=Path(self.tmp.name)),
+            mock.patch("context.context_manager.get_data_dir", return_value=Path(self.tmp.name)),
+            offline_token_counts(),
+        )
+        self.config = Config(
+            cwd=Path(self.tmp.name),
+            response_cache=ResponseCacheConfig(enabled=True),
+            session_journal=SessionJournalConfig(enabled=False),
+        )
+
+    async def asyncTearDown(self):
+        await self.llm.stop()
+        self.tmp.cleanup()
+
+    async def _run(self) -> tuple[Agent, list]:
+        pool = ClientPool()
+        async with Agent(self.config, client_pool=pool) as agent:
+            events = [event async for event in agent.run("say hello")]
+        await pool.aclose()
+        return agent, events
+
+    async def test_replay_skips_prompt_usage_recording(self):
+        live, _ = await self._run()
+        self.assertEqual(live.session.context_manager.prompt_cache_stats.requests, 1)
+
+        with mock.patch.object(ContextManager, "record_prompt_usage", autospec=True) as record_prompt_usage:
+            replayed, events = await self._run()
+
+        self.assertEqual(len(self.llm.requests), 1)
+        metrics = [e for e in events if e.type == AgentEventType.LLM_METRICS]
+        self.assertTrue(metrics[0].data["cached"])
+        record_prompt_usage.assert_not_called()
+        self.assertEqual(replayed.session.context_manager.prompt_cache_stats.requests, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+
+import httpx
+from openai import APIConnectionError, RateLimitError
+
+from config.config import Config, EndpointConfig, ModelConfig, RateLimitConfig
+from lib.response import StreamEvent, StreamEventType, TextDelta
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+from llm.routing import Endpoint, EndpointHealth, EndpointRouter, get_endpoint_health
+
+
+def _config(tag: str, hedge: bool = False, **model_kwargs) -> Config:
+    # endpoint health is process-wide, so every test routes to its own hosts
+    return Config(
+        model=ModelConfig(
+            name="test-model",
+            endpoints=[
+                EndpointConfig(name="primary", base_url=f"http://{tag}-primary.invalid/v1", api_key_env="PATH"),
+                EndpointConfig(name="backup", base_url=f"http://{tag}-backup.invalid/v1", api_key_env="PATH"),
+            ],
+            hedge=hedge,
+            **model_kwargs,
+        )
+    )
+
+
+class ScriptedProvider(LLMProvider):
+    """Replaces the network call with a per-endpoint script: (first event delay, text or exception)."""
+
+    def __init__(self, config: Config, scripts: dict[str, tuple[float, object]]):
+        super().__init__(config, client_pool=ClientPool())
+        self.scripts = scripts
+        self.cancelled: list[str] = []
+        self.calls: list[str] = []
+
+    async def _stream_response(self, client, kwargs):
+        name = next(ep.name for ep in self.router.endpoints if client is self._clients.get(ep.key))
+        self.calls.append(name)
+        delay, outcome = self.scripts[name]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+        if isinstance(outcome, BaseException):
+            raise outcome
+        yield StreamEvent(type=StreamEventType.TEXT_DELTA, text_delta=TextDelta(content=f"{outcome}"))
+        yield StreamEvent(type=StreamEventType.MESSAGE_COMPLETE)
+
+
+class TestEndpointRouter(unittest.TestCase):
+    def test_failed_endpoint_moves_to_the_back(self):
+        first = Endpoint(name="a", base_url="http://router-a.invalid", api_key="k")
+        second = Endpoint(name="b", base_url="http://router-b.invalid", api_key="k")
+        router = EndpointRouter([first, second])
+
+        self.assertEqual(router.ordered(), [first, second])
+        get_endpoint_health(first).record_failure()
+        self.assertEqual(router.ordered(), [second, first])
+
+    def test_ttft_percentile(self):
+        health = EndpointHealth()
+        for value in range(1, 101):
+            health.record_ttft(value / 100)
+
+        self.assertAlmostEqual(health.ttft_percentile(0.9), 0.91)
+
+
+class TestFailoverAndHedging(unittest.IsolatedAsyncioTestCase):
+    async def _collect(self, provider: LLMProvider) -> list[StreamEvent]:
+        return [event async for event in provider.send_message([{"role": "user", "content": "hi"}])]
+
+    async def test_connection_error_fails_over_to_next_endpoint(self):
+        error = APIConnectionError(request=httpx.Request("POST", "http://primary.invalid/v1"))
+        provider = ScriptedProvider(_config("failover"), {"primary": (0, error), "backup": (0, "from backup")})
+
+        events = await self._collect(provider)
+
+        self.assertEqual(events[0].text_delta.content, "from backup")
+        self.assertEqual(events[-1].type, StreamEventType.MESSAGE_COMPLETE)
+
+    async def test_hedge_wins_when_primary_first_token_is_late(self):
+        provider = ScriptedProvider(
+            _config("hedge-late", hedge=True, hedge_min_delay=0.05),
+            {"primary": (1.0, "from primary"), "backup": (0, "from backup")},
+        )
+
+        events = await self._collect(provider)
+
+        self.assertEqual(events[0].text_delta.content, "from backup")
+        self.assertEqual(provider.cancelled, ["primary"])
+
+    async def test_no_hedge_when_primary_is_fast(self):
+        provider = ScriptedProvider(
+            _config("hedge-fast", hedge=True, hedge_min_delay=0.5),
+            {"primary": (0, "from primary"), "backup": (0, "from backup")},
+        )
+
+        events = await self._collect(provider)
+
+        self.assertEqual(events[0].text_delta.content, "from primary")
+        self.assertEqual(provider.cancelled, [])
+
+    async def test_failed_hedge_throttles_each_endpoint_and_is_not_retried(self):
+        def throttled(name: str) -> RateLimitError:
+            request = httpx.Request("POST", f"http://hedge-429-{name}.invalid/v1")
+            return RateLimitError("rate limited", response=httpx.Response(429, request=request), body=None)
+
+        config = _config("hedge-429", hedge=True, hedge_min_delay=0.05)
+        config.rate_limit = RateLimitConfig(max_retries=0)
+        provider = ScriptedProvider(config, {"primary": (0.2, throttled("primary")), "backup": (0, throttled("backup"))})
+
+        events = await self._collect(provider)
+
+        self.assertEqual(events[-1].type, StreamEventType.ERROR)
+        self.assertEqual(sorted(provider.calls), ["backup", "primary"])  # the failed hedge isn't tried again
+        for endpoint in provider.router.endpoints:
+            self.assertEqual(provider.get_rate_limiter(endpoint).metrics().throttled, 1, endpoint.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
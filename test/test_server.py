@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from config.config import Config, ServerConfig
+from llm.pool import ClientPool
+from llm.replay import FakeOpenAIServer, make_text_response
+from server import AgentServer
+
+from helpers import offline_token_counts, start_patches
+
+
+class TestAgentServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.llm = await FakeOpenAIServer([make_text_response("hello there", chunk_size=4)], host="127.0.0.6").start()
+        start_patches(
+            self,
+            mock.patch.dict(os.environ, {"API_KEY": "fake", "BASE_URL": self.llm.base_url}),
+            mock.patch("agent.session.get_data_dir", return_value=Path(self.tmp.name)),
+            offline_token_counts(),
+        )
+
+        config = Config(cwd=Path(self.tmp.name), server=ServerConfig(max_sessions=1))
+        self.server = await AgentServer(config, host="127.0.0.1", port=0, client_pool=ClientPool()).start()
+        self.http = httpx.AsyncClient(base_url=self.server.base_url, timeout=10)
+
+    async def asyncTearDown(self):
+        await self.http.aclose()
+        await self.server.stop()
+        await self.llm.stop()
+        self.tmp.cleanup()
+
+    async def _send(self, session_id: str, message: str) -> list[dict]:
+        events = []
+        async with self.http.stream("POST", f"/sessions/{session_id}/messages", json={"message": message}) as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["content-type"], "text/event-stream")
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    events.append(json.loads(line[len("data: "):]))
+        return events
+
+    async def test_streams_agent_events(self):
+        session_id = (await self.http.post("/sessions")).json()["session_id"]
+
+        events = await self._send(session_id, "hi")
+
+        types = [event["type"] for event in events]
+        self.assertEqual(types[0], "agent_started")
+        self.assertEqual(types[-1], "agent_finished")
+        self.assertIn("text_delta", types)
+        self.assertEqual(events[-1]["data"]["response"], "hello there")
+
+    async def test_evicted_session_resumes_from_journal(self):
+        first = (await self.http.post("/sessions")).json()["session_id"]
+        await self._send(first, "remember the number 42")
+        second = (await self.http.post("/sessions")).json()["session_id"]
+
+        listed = (await self.http.get("/sessions")).json()["sessions"]
+        self.assertEqual([s["session_id"] for s in listed], [second])
+        self.assertEqual(self.server.sessions.evictions, 1)
+
+        await self._send(first, "what was the number?")
+
+        contents = [m.get("content") for m in self.llm.requests[-1]["messages"]]
+        self.assertIn("remember the number 42", contents)
+        self.assertIn("hello there", contents)
+
+    async def test_session_handed_out_by_get_is_not_evicted(self):
+        sessions = self.server.sessions
+        first = await sessions.create()
+        held = await sessions.get(first.session_id)  # _run_message hasn't taken the run lock yet
+
+        second = await sessions.create()
+        self.assertEqual(sessions.evictions, 0)
+        self.assertEqual(len(sessions), 2)
+
+        held.last_used = second.last_used = float("-inf")
+        self.assertEqual(await sessions.evict_idle(), 1)
+        self.assertEqual([s["session_id"] for s in sessions.list()], [first.session_id])
+
+        sessions.release(held)
+        await sessions.create()
+        self.assertEqual(sessions.evictions, 2)
+        self.assertNotIn(first.session_id, [s["session_id"] for s in sessions.list()])
+
+    async def test_unknown_session_and_bad_body(self):
+        with mock.patch.object(self.server.sessions, "_open", wraps=self.server.sessions._open) as open_session:
+            self.assertEqual((await self.http.post("/sessions/nope/messages", json={"message": "hi"})).status_code, 404)
+        open_session.assert_not_called()  # no journal, no agent built
+        session_id = (await self.http.post("/sessions")).json()["session_id"]
+        self.assertEqual((await self.http.post(f"/sessions/{session_id}/messages", json={})).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
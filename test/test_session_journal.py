@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from context.context_manager import ContextManager
+from context.journal import SessionJournal, list_sessions
+from lib.response import TokenUsage
+from lib.text import estimate_token_count
+
+from helpers import offline_token_counts, start_patches
+
+
+class TestSessionJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        start_patches(
+            self,
+            mock.patch("context.context_manager.get_data_dir", return_value=self.dir),
+            offline_token_counts(),
+        )
+
+    def _manager(self, snapshot_every: int = 200) -> ContextManager:
+        journal = SessionJournal(self.dir / "sessions" / "s1.jsonl", "s1", snapshot_every=snapshot_every)
+        return ContextManager(Config(), tools=[], journal=journal)
+
+    def _fill(self, manager: ContextManager) -> None:
+        manager.add_user_message("fix the parser bug")
+        manager.add_assistant_message("", [{"id": "call_1", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}])
+        manager.add_tool_result("call_1", "def parse(): ...")
+        manager.add_usage(TokenUsage(prompt_tokens=100, completion_tokens=20, total_tokens=120))
+        manager.add_assistant_message("done", None)
+
+    def test_resume_restores_context_and_usage(self):
+        manager = self._manager()
+        self._fill(manager)
+        manager.journal.close()
+
+        journal, state = SessionJournal.load(self.dir / "sessions" / "s1.jsonl")
+        with mock.patch("context.context_manager.count_tokens") as count_tokens:
+            resumed = ContextManager(Config(), tools=[], journal=journal)
+            count_tokens.reset_mock()
+            resumed.restore(state)
+            count_tokens.assert_not_called()
+
+        self.assertEqual(resumed.get_context(), manager.get_context())
+        self.assertEqual(resumed.get_total_usage(), manager.get_total_usage())
+        self.assertEqual(journal.title, "fix the parser bug")
+
+    def test_missing_token_counts_are_counted_in_one_batch(self):
+        manager = self._manager()
+        self._fill(manager)
+        manager.journal.close()
+        journal, state = SessionJournal.load(self.dir / "sessions" / "s1.jsonl")
+        for item in state.messages:
+            item["token_count"] = None  # a journal from before token counts were kept
+
+        resumed = ContextManager(Config(), tools=[], journal=journal)
+        with mock.patch("context.context_manager.count_tokens_many", side_effect=lambda texts, model=None: [estimate_token_count(t) for t in texts]) as count_many:
+            resumed.restore(state)
+
+        count_many.assert_called_once()
+        self.assertTrue(all(m.token_count is not None for m in resumed._messages))
+        # content and tool_calls JSON are counted as one text, the estimate rounds once instead of twice
+        self.assertAlmostEqual(resumed.ledger.message_tokens, manager.ledger.message_tokens, delta=1)
+
+    def test_snapshots_bound_the_journal(self):
+        manager = self._manager(snapshot_every=4)
+        for index in range(25):
+            manager.add_user_message(f"message {index}")
+        manager.journal.close()
+
+        lines = (self.dir / "sessions" / "s1.jsonl").read_text().splitlines()
+        _, state = SessionJournal.load(self.dir / "sessions" / "s1.jsonl")
+
+        self.assertLessEqual(len(lines), 2 + 4)
+        self.assertLessEqual(state.records, 4)
+        self.assertEqual([m["content"] for m in state.messages], [f"message {i}" for i in range(25)])
+
+    def test_torn_last_record_is_dropped(self):
+        manager = self._manager()
+        self._fill(manager)
+        manager.journal.close()
+        path = self.dir / "sessions" / "s1.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"type": "message", "item": {"role": "us')
+
+        journal, state = SessionJournal.load(path)
+        journal.append_message({"role": "user", "content": "next"})
+        journal.close()
+        _, reloaded = SessionJournal.load(path)
+
+        self.assertEqual(len(state.messages), 4)
+        self.assertEqual(reloaded.messages[-1]["content"], "next")
+
+    def test_compaction_is_journaled(self):
+        manager = self._manager()
+        self._fill(manager)
+        manager.replace_chat_session("we fixed the parser")
+        manager.journal.close()
+
+        _, state = SessionJournal.load(self.dir / "sessions" / "s1.jsonl")
+
+        self.assertEqual(state.summary, "we fixed the parser")
+        self.assertEqual(len(state.messages), len(manager._messages))
+
+    def test_list_sessions(self):
+        manager = self._manager()
+        self._fill(manager)
+        manager.journal.close()
+
+        sessions = list_sessions(self.dir / "sessions")
+
+        self.assertEqual([(s.session_id, s.title) for s in sessions], [("s1", "fix the parser bug")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config, ModelConfig
+from context.context_manager import ContextManager
+from context.pruning import PruningConfig, SlidingWindowPruner
+from context.token_ledger import MESSAGE_OVERHEAD_TOKENS, TokenLedger
+from lib.response import TokenUsage
+from lib.tokens import DEFAULT_CHARS_PER_TOKEN, TokenCounter
+
+from helpers import offline_token_counts, start_patches
+
+
+class TestTokenLedger(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        start_patches(
+            self,
+            mock.patch("context.context_manager.get_data_dir", return_value=Path(tmp.name)),
+            offline_token_counts(),
+        )
+
+    def _manager(self, context_window: int = 128_000) -> ContextManager:
+        return ContextManager(Config(model=ModelConfig(context_window=context_window)), tools=[])
+
+    def test_tracks_every_part_of_the_request(self):
+        manager = self._manager()
+        before = manager.current_tokens
+
+        manager.add_user_message("x" * 400)
+        manager.add_assistant_message("", [{"id": "call_1", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}])
+        manager.set_tool_schemas([{"name": "read_file", "description": "y" * 400, "parameters": {}}])
+
+        grown = manager.current_tokens - before
+        self.assertGreaterEqual(grown, 100 + 100 + 2 * MESSAGE_OVERHEAD_TOKENS + 15)
+        self.assertEqual(manager.ledger.message_tokens, sum(manager.message_tokens(m) for m in manager._messages))
+
+    def test_usage_across_turns_does_not_trigger_compaction(self):
+        manager = self._manager(context_window=10_000)
+        for _ in range(20):
+            manager.add_user_message("short question")
+            # every turn re-sends the whole prompt, the old check summed these up
+            manager.add_usage(TokenUsage(prompt_tokens=2_000, completion_tokens=10, total_tokens=2_010))
+
+        self.assertFalse(manager.is_need_to_reset())
+
+    def test_reconciles_against_provider_prompt_tokens(self):
+        manager = self._manager(context_window=10_000)
+        manager.add_user_message("x" * 4_000)
+        estimated = manager.current_tokens
+
+        manager.record_prompt_usage(TokenUsage(prompt_tokens=estimated * 2))
+
+        self.assertEqual(manager.current_tokens, estimated * 2)
+        manager.add_user_message("x" * 4_000)
+        self.assertAlmostEqual(manager.current_tokens, manager.ledger.estimated_tokens * 2, delta=1)
+
+    def test_calibrates_against_the_whole_request(self):
+        manager = self._manager()
+        manager.set_tool_schemas([{"name": "read_file", "description": "y" * 4_000, "parameters": {}}])
+        manager.add_user_message("x" * 400)
+        manager.add_assistant_message("", [{"id": "call_1", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}])
+        counter = TokenCounter("MiniMax-M2", estimate_only=True)
+
+        with mock.patch("context.context_manager.get_token_counter", return_value=counter):
+            # the provider agrees with the estimate, schemas and tool_calls JSON included
+            manager.record_prompt_usage(TokenUsage(prompt_tokens=manager.ledger.estimated_tokens))
+
+        self.assertAlmostEqual(counter.chars_per_token, DEFAULT_CHARS_PER_TOKEN, delta=0.01)
+
+    def test_scale_is_bounded(self):
+        ledger = TokenLedger(system_tokens=100)
+        ledger.reconcile(10_000)
+        self.assertEqual(ledger.scale, 2.0)
+        ledger.reconcile(0)
+        self.assertEqual(ledger.scale, 2.0)
+
+    def test_compaction_and_prune_reset_the_ledger(self):
+        manager = self._manager()
+        for index in range(40):
+            manager.add_user_message(f"message {index} " + "x" * 400)
+        pruner = SlidingWindowPruner(PruningConfig(max_window_tokens=manager.ledger.overhead_tokens + 1_000, keep_recent_messages=2))
+
+        self.assertTrue(pruner.should_prune(manager))
+        pruner.prune(manager)
+
+        self.assertFalse(pruner.should_prune(manager))
+        self.assertEqual(manager.ledger.message_tokens, sum(manager.message_tokens(m) for m in manager._messages))
+
+        manager.replace_chat_session("summary of the work")
+        self.assertEqual(manager.ledger.message_tokens, sum(manager.message_tokens(m) for m in manager._messages))
+        self.assertLess(manager.ledger.message_tokens, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+from lib import tokens
+from lib.tokens import TokenCounter
+
+
+class _WordEncoding:
+    """Stands in for a tiktoken encoding, one token per whitespace separated word."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def encode_ordinary(self, text: str) -> list[int]:
+        self.calls += 1
+        return [len(word) for word in text.split()]
+
+
+class TestTokenCounter(unittest.TestCase):
+    def test_counts_are_memoized(self):
+        encoding = _WordEncoding()
+        counter = TokenCounter("gpt-4", encoding=encoding)
+
+        self.assertEqual(counter.count("one two three"), 3)
+        self.assertEqual(counter.count("one two three"), 3)
+        self.assertEqual(counter.count(""), 0)
+
+        self.assertEqual(encoding.calls, 1)
+        self.assertEqual((counter.hits, counter.misses), (1, 1))
+
+    def test_lru_evicts_the_oldest_entry(self):
+        encoding = _WordEncoding()
+        counter = TokenCounter("gpt-4", cache_size=2, encoding=encoding)
+        for text in ("a", "b", "a", "c"):  # "b" is the least recently used when "c" comes in
+            counter.count(text)
+
+        counter.count("a")
+        counter.count("b")
+
+        self.assertEqual(encoding.calls, 4)
+
+    def test_count_many_encodes_only_the_misses(self):
+        encoding = _WordEncoding()
+        counter = TokenCounter("gpt-4", encoding=encoding)
+        counter.count("cached one")
+
+        counts = counter.count_many(["cached one", "a b c", "", "a b c"])
+
+        self.assertEqual(counts, [2, 3, 0, 3])
+        self.assertEqual(encoding.calls, 2)
+
+    def test_large_batches_run_on_the_thread_pool(self):
+        counter = TokenCounter("gpt-4", encoding=_WordEncoding())
+        texts = [f"word{index} " * 20_000 for index in range(4)]
+
+        self.assertEqual(counter.count_many(texts), [20_000] * 4)
+
+    def test_unknown_model_uses_the_fallback_encoding(self):
+        fallback = _WordEncoding()
+        with mock.patch.object(tokens.tiktoken, "encoding_for_model", side_effect=KeyError("unknown")), \
+                mock.patch.object(tokens.tiktoken, "get_encoding", return_value=fallback) as get_encoding:
+            counter = TokenCounter("MiniMax-M2")
+            self.assertEqual(counter.count("a b"), 2)
+
+        get_encoding.assert_called_once_with(tokens.FALLBACK_ENCODING)
+        self.assertTrue(counter.exact)
+
+    def test_estimates_and_calibrates_without_an_encoding(self):
+        with mock.patch.object(tokens.tiktoken, "encoding_for_model", side_effect=KeyError("unknown")), \
+                mock.patch.object(tokens.tiktoken, "get_encoding", side_effect=OSError("offline")):
+            counter = TokenCounter("MiniMax-M2")
+            self.assertEqual(counter.count("x" * 400), 100)
+
+        self.assertFalse(counter.exact)
+        # the provider counted 200 tokens for 400 characters, the estimate moves towards 2 chars per token
+        for _ in range(20):
+            counter.calibrate(400, 200)
+        self.assertGreater(counter.count("x" * 400), 180)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from config.config import Config
+from lib.response import JsonCompletenessDetector, StreamEventType
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+from llm.replay import FakeChatClient, make_tool_call_response
+
+
+def _feed_in_pieces(text: str, size: int) -> list[bool]:
+    detector = JsonCompletenessDetector()
+    return [detector.feed(text[i:i + size]) for i in range(0, len(text), size)]
+
+
+class TestJsonCompletenessDetector(unittest.TestCase):
+    def test_completes_only_on_the_closing_brace(self):
+        text = json.dumps({"path": "a.py", "content": "def f():\n    return {'x': [1, 2]}\n", "quote": "say \"}\" \\"})
+        for size in (1, 2, 3, 7):
+            results = _feed_in_pieces(text, size)
+            self.assertTrue(results[-1], size)
+            self.assertFalse(any(results[:-1]), size)
+
+    def test_whitespace_before_the_object(self):
+        detector = JsonCompletenessDetector()
+        self.assertFalse(detector.feed("  "))
+        self.assertFalse(detector.feed('{"a": {"b": 1}'))
+        self.assertTrue(detector.feed("}"))
+
+
+class TestIncrementalToolCallEnd(unittest.IsolatedAsyncioTestCase):
+    @mock.patch.dict(os.environ, {"API_KEY": "test-key", "BASE_URL": "http://stream.invalid/v1"})
+    async def test_first_call_ends_before_second_call_streams(self):
+        provider = LLMProvider(Config(), client_pool=ClientPool())
+        chunks = make_tool_call_response(
+            [("read_file", json.dumps({"path": "a.py"})), ("read_file", json.dumps({"path": "b.py"}))],
+            chunk_size=4,
+        )
+
+        events = [event async for event in provider._stream_response(FakeChatClient(chunks), {})]
+        kinds = [event.type for event in events]
+        ends = [index for index, kind in enumerate(kinds) if kind == StreamEventType.TOOL_CALL_END]
+        starts = [index for index, kind in enumerate(kinds) if kind == StreamEventType.TOOL_CALL_START]
+
+        self.assertEqual(len(ends), 2)
+        self.assertLess(ends[0], starts[1])
+        self.assertEqual([events[index].tool_call.arguments["path"] for index in ends], ["a.py", "b.py"])
+        self.assertEqual(kinds[-1], StreamEventType.MESSAGE_COMPLETE)
+
+
+if __name__ == "__main__":
+    unittest.main()
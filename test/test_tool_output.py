@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from lib.text import estimate_token_count
+from lib.tokens import TokenCounter
+from tools.base import ToolResult
+from tools.builtin.read_output import ReadOutputTool
+from tools.output_store import BlobStore
+from tools.registry import ToolRegistry
+
+from helpers import FakeTool
+
+
+class TestToolOutputLimit(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patch = mock.patch("tools.output_store.get_data_dir", return_value=Path(self.tmp.name))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.config = Config(max_tool_output_tokens=500)
+        self.registry = ToolRegistry(self.config)
+        # keep the test offline, the real tokenizer downloads its encoding on first use
+        self.registry.output_limiter.token_counter = TokenCounter(estimate_only=True)
+        self.registry.register_tool(FakeTool(self.config, "echo", handler=lambda invocation: ToolResult.success_result(invocation.params["text"])))
+        self.registry.register_tool(ReadOutputTool(self.config))
+
+    async def test_small_output_is_untouched(self):
+        result = await self.registry.invoke_tool("echo", {"text": "hello"}, Path.cwd())
+
+        self.assertEqual(result.output, "hello")
+        self.assertFalse(result.truncated)
+        self.assertNotIn("output_handle", result.metadata)
+
+    async def test_large_output_is_previewed_and_pageable(self):
+        text = "\n".join(f"line {i:05d} " + "x" * 30 for i in range(1, 2001))
+
+        result = await self.registry.invoke_tool("echo", {"text": text}, Path.cwd())
+
+        self.assertTrue(result.truncated)
+        self.assertLessEqual(estimate_token_count(result.output), 500)
+        self.assertTrue(result.output.startswith("line 00001"))
+        self.assertTrue(result.output.endswith("line 02000 " + "x" * 30))
+        handle = result.metadata["output_handle"]
+        self.assertIn(handle, result.output)
+
+        page = await self.registry.invoke_tool("read_output", {"handle": handle, "offset": 1000, "limit": 2}, Path.cwd())
+
+        self.assertTrue(page.success)
+        self.assertIn("line 01000", page.output)
+        self.assertIn("line 01001", page.output)
+        self.assertNotIn("line 01002", page.output)
+        self.assertEqual(page.metadata["total_lines"], 2000)
+
+    async def test_blob_store_is_content_addressed(self):
+        store = BlobStore(Path(self.tmp.name) / "blobs")
+
+        first = store.put("same output")
+        second = store.put("same output")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(list((Path(self.tmp.name) / "blobs").glob("*.txt"))), 1)
+        self.assertEqual(store.get(first), "same output")
+        self.assertIsNone(store.get("../../etc/passwd"))
+
+    async def test_unknown_handle(self):
+        result = await self.registry.invoke_tool("read_output", {"handle": "0" * 16}, Path.cwd())
+
+        self.assertFalse(result.success)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import unittest
+from unittest import mock
+
+from config.config import Config
+from llm.client import LLMProvider
+from llm.pool import ClientPool
+from tools.builtin import get_all_builtin_tools
+from tools.registry import ToolRegistry
+
+
+class TestSchemaCache(unittest.TestCase):
+    def setUp(self):
+        self.config = Config()
+        self.registry = ToolRegistry(self.config)
+        for tool in get_all_builtin_tools():
+            self.registry.register_tool(tool(self.config))
+
+    def test_schemas_are_reused_until_registry_changes(self):
+        first = self.registry.get_schemas()
+        self.assertIs(self.registry.get_schemas(), first)
+
+        version = self.registry.version
+        removed = first[0]["name"]
+        self.assertTrue(self.registry.unregister_tool(removed))
+
+        second = self.registry.get_schemas()
+        self.assertGreater(self.registry.version, version)
+        self.assertIsNot(second, first)
+        self.assertNotIn(removed, [schema["name"] for schema in second])
+
+    @mock.patch.dict(os.environ, {"API_KEY": "test-key", "BASE_URL": "http://schema.invalid/v1"})
+    def test_provider_wraps_each_schema_list_once(self):
+        provider = LLMProvider(self.config, client_pool=ClientPool())
+        schemas = self.registry.get_schemas()
+
+        payload = provider._build_tools(schemas)
+        self.assertIs(provider._build_tools(self.registry.get_schemas()), payload)
+        self.assertEqual(payload[0]["type"], "function")
+        self.assertEqual(payload[0]["function"]["name"], schemas[0]["name"])
+
+        self.registry.unregister_tool(schemas[0]["name"])
+        self.assertIsNot(provider._build_tools(self.registry.get_schemas()), payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
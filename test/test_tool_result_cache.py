@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config.config import Config
+from tools.base import ToolInvocation, ToolKind, ToolResult
+from tools.registry import ToolRegistry
+from tools.subagents import SubAgentDefinition, SubAgentTool
+
+from helpers import FakeTool
+
+
+def _read_file(invocation: ToolInvocation) -> ToolResult:
+    return ToolResult.success_result((Path(invocation.cwd) / invocation.params["path"]).read_text())
+
+
+class TestToolResultCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cwd = Path(self.tmp.name)
+        (self.cwd / "a.txt").write_text("first")
+
+        self.config = Config(cwd=self.cwd)
+        self.registry = ToolRegistry(self.config)
+        self.reader = FakeTool(self.config, "count_read", handler=_read_file)
+        self.registry.register_tool(self.reader)
+        self.registry.register_tool(FakeTool(self.config, "touch", ToolKind.WRITE, handler=lambda invocation: ToolResult.success_result("ok")))
+
+    async def test_repeated_read_is_served_from_cache(self):
+        first = await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+        second = await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+
+        self.assertEqual(self.reader.calls, 1)
+        self.assertEqual(second.output, first.output)
+        self.assertTrue(second.metadata["cached"])
+        self.assertNotIn("cached", first.metadata)
+        self.assertEqual(self.registry.result_cache.stats.hits, 1)
+        self.assertAlmostEqual(self.registry.result_cache.stats.hit_rate, 0.5)
+
+    async def test_mtime_change_misses(self):
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+        path = self.cwd / "a.txt"
+        path.write_text("second!")
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        result = await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+
+        self.assertEqual(result.output, "second!")
+        self.assertEqual(self.reader.calls, 2)
+
+    async def test_write_tool_invalidates(self):
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+        await self.registry.invoke_tool("touch", {"path": "b.txt"}, self.cwd)
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+
+        self.assertEqual(self.reader.calls, 2)
+        self.assertEqual(self.registry.result_cache.stats.invalidations, 1)
+
+    async def test_read_only_subagent_keeps_the_cache(self):
+        async def run_subagent(tool: SubAgentTool, invocation: ToolInvocation) -> ToolResult:
+            return ToolResult.success_result("found it")
+
+        self.enterContext(mock.patch.object(SubAgentTool, "execute", run_subagent))
+        self.registry.register_tool(SubAgentTool(self.config, SubAgentDefinition("explore", "explore", "explore", ["grep", "read_file"])))
+        self.registry.register_tool(SubAgentTool(self.config, SubAgentDefinition("fixer", "fixer", "fixer")))
+
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+        await self.registry.invoke_tool("subagent_explore", {"goal": "find a"}, self.cwd)
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+
+        self.assertEqual(self.reader.calls, 1)
+        self.assertEqual(self.registry.result_cache.stats.invalidations, 0)
+
+        # one that may use any tool can write anywhere
+        await self.registry.invoke_tool("subagent_fixer", {"goal": "fix a"}, self.cwd)
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+
+        self.assertEqual(self.reader.calls, 2)
+
+    async def test_different_arguments_are_separate_entries(self):
+        (self.cwd / "b.txt").write_text("other")
+
+        await self.registry.invoke_tool("count_read", {"path": "a.txt"}, self.cwd)
+        result = await self.registry.invoke_tool("count_read", {"path": "b.txt"}, self.cwd)
+
+        self.assertEqual(result.output, "other")
+        self.assertEqual(self.reader.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from agent.scheduler import ToolScheduler
+from config.config import Config, ToolSchedulerConfig
+from lib.response import ToolCall
+from tools.base import ToolInvocation, ToolKind, ToolResult
+from tools.registry import ToolRegistry
+from tools.subagents import SubAgentDefinition, SubAgentTool
+
+from helpers import FakeTool
+
+
+class TestToolScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.config = Config(
+            cwd=Path("/workspace"),
+            tool_scheduler=ToolSchedulerConfig(max_concurrent_per_kind={"network": 2}),
+        )
+        self.log: list[str] = []
+        self.tools: dict[str, FakeTool] = {}
+        self.registry = ToolRegistry(self.config)
+        for name, kind in (("read", ToolKind.READ), ("edit", ToolKind.WRITE), ("shell", ToolKind.SHELL), ("fetch", ToolKind.NETWORK)):
+            self.tools[name] = FakeTool(self.config, name, kind, delay=0.02, log=self.log)
+            self.registry.register_tool(self.tools[name])
+        self.scheduler = ToolScheduler(self.registry, self.config)
+
+    def _call(self, index: int, name: str, path: str | None = None) -> ToolCall:
+        return ToolCall(id=f"call_{index}", name=name, arguments={"path": path} if path else {})
+
+    async def test_edits_of_one_file_run_in_call_order(self):
+        batch = self.scheduler.batch()
+        batch.submit(self._call(0, "edit", "a.py"))
+        batch.submit(self._call(1, "edit", "a.py"))
+        batch.submit(self._call(2, "edit", "b.py"))
+
+        results = await batch.results()
+
+        self.assertEqual([r.output for r in results], ["edit:a.py", "edit:a.py", "edit:b.py"])
+        self.assertLess(self.log.index("end edit:a.py"), self.log.index("start edit:a.py", 1))
+        # b.py doesn't conflict, so it started alongside the first edit
+        self.assertLess(self.log.index("start edit:b.py"), self.log.index("end edit:a.py"))
+
+    async def test_reads_run_together_but_wait_for_a_prior_write(self):
+        batch = self.scheduler.batch()
+        batch.submit(self._call(0, "edit", "src/a.py"))
+        batch.submit(self._call(1, "read", "src"))
+        batch.submit(self._call(2, "read", "docs/x.md"))
+        batch.submit(self._call(3, "read", "docs/y.md"))
+
+        await batch.results()
+
+        self.assertLess(self.log.index("end edit:src/a.py"), self.log.index("start read:src"))
+        self.assertLess(self.log.index("start read:docs/y.md"), self.log.index("end read:docs/x.md"))
+        self.assertEqual(self.scheduler.stats.waited_on_conflict, 1)
+
+    async def test_per_kind_cap(self):
+        batch = self.scheduler.batch()
+        for index in range(5):
+            batch.submit(self._call(index, "fetch"))
+
+        results = await batch.results()
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.tools["fetch"].peak, 2)
+
+    async def test_shell_is_ordered_with_edits_in_the_workspace(self):
+        batch = self.scheduler.batch()
+        batch.submit(self._call(0, "edit", "src/a.py"))
+        batch.submit(self._call(1, "shell"))  # e.g. a formatter rewriting src/a.py
+        batch.submit(self._call(2, "read", "src/a.py"))
+        batch.submit(self._call(3, "fetch"))
+
+        await batch.results()
+
+        self.assertLess(self.log.index("end edit:src/a.py"), self.log.index("start shell:"))
+        self.assertLess(self.log.index("end shell:"), self.log.index("start read:src/a.py"))
+        # network calls touch nothing in the workspace and don't wait
+        self.assertLess(self.log.index("start fetch:"), self.log.index("end edit:src/a.py"))
+
+    async def test_read_only_subagents_run_side_by_side(self):
+        async def run_subagent(tool: SubAgentTool, invocation: ToolInvocation) -> ToolResult:
+            self.log.append(f"start {tool.name}")
+            await asyncio.sleep(0.05)
+            self.log.append(f"end {tool.name}")
+            return ToolResult.success_result(tool.name)
+
+        for name, allowed_tools in (("explore", ["glob", "grep", "read_file"]), ("review", ["list_dir", "read_file"]), ("fixer", None)):
+            self.registry.register_tool(SubAgentTool(self.config, SubAgentDefinition(name, name, name, allowed_tools)))
+        self.enterContext(mock.patch.object(SubAgentTool, "execute", run_subagent))
+
+        batch = self.scheduler.batch()
+        batch.submit(ToolCall(id="call_0", name="subagent_explore", arguments={"goal": "find the parser"}))
+        batch.submit(ToolCall(id="call_1", name="subagent_review", arguments={"goal": "review the parser"}))
+        batch.submit(self._call(2, "read", "src/parser.py"))
+        batch.submit(ToolCall(id="call_3", name="subagent_fixer", arguments={"goal": "fix the parser"}))
+
+        results = await batch.results()
+
+        self.assertTrue(all(result.success for result in results), [result.error for result in results])
+        self.assertLess(self.log.index("start subagent_review"), self.log.index("end subagent_explore"))
+        self.assertLess(self.log.index("start read:src/parser.py"), self.log.index("end subagent_explore"))
+        # a sub-agent that may use any tool still writes the whole workspace
+        self.assertLess(self.log.index("end subagent_review"), self.log.index("start subagent_fixer"))
+
+    async def test_turn_budget_starts_with_the_first_call(self):
+        self.config.tool_timeouts.turn_budget_seconds = 0.1
+        batch = self.scheduler.batch()
+        await asyncio.sleep(0.15)  # the model is still generating
+
+        started = time.monotonic()
+        batch.submit(self._call(0, "read", "a.py"))
+        results = await batch.results()
+
+        self.assertTrue(results[0].success, results[0].error)
+        self.assertAlmostEqual(batch.deadline, started + 0.1, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
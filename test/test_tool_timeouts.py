@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from config.config import Config, ToolTimeoutConfig
+from tools.base import ToolKind
+from tools.builtin.shell import ShellTool
+from tools.registry import ToolRegistry
+
+from helpers import FakeTool
+
+
+class TestToolTimeouts(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.config = Config(tool_timeouts=ToolTimeoutConfig(per_tool={"slow": 0.05}, grace_seconds=0))
+        self.registry = ToolRegistry(self.config)
+        self.slow = FakeTool(self.config, "slow", ToolKind.NETWORK, delay=10)
+        self.registry.register_tool(self.slow)
+
+    async def test_per_tool_timeout_returns_structured_error(self):
+        result = await self.registry.invoke_tool("slow", {}, Path.cwd())
+
+        self.assertFalse(result.success)
+        self.assertTrue(result.metadata["timed_out"])
+        self.assertGreaterEqual(result.metadata["elapsed"], 0.04)
+        self.assertIn("timed out", result.error)
+        self.assertTrue(self.slow.cancelled)
+
+    async def test_spent_turn_budget_skips_the_call(self):
+        result = await self.registry.invoke_tool("slow", {}, Path.cwd(), deadline=time.monotonic() - 1)
+
+        self.assertFalse(result.success)
+        self.assertTrue(result.metadata["timed_out"])
+        self.assertFalse(self.slow.cancelled)
+
+    @unittest.skipIf(sys.platform == "win32", "process groups are POSIX only")
+    async def test_deadline_kills_the_shell_process_group(self):
+        registry = ToolRegistry(self.config)
+        registry.register_tool(ShellTool(self.config))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = Path(tmp) / "pid"
+            result = await registry.invoke_tool(
+                "shell",
+                {"command": f"sleep 30 & echo $! > {pid_file}; wait", "timeout": 60},
+                Path(tmp),
+                deadline=time.monotonic() + 0.5,
+            )
+            pid = int(pid_file.read_text().strip())
+
+        self.assertTrue(result.metadata["timed_out"])
+        # the orphaned sleep is reaped by init, which can take a moment on a busy machine
+        for _ in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.05)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+from lib.text import split_by_tokens, truncate_text_by_tokens
+from lib.tokens import TokenCounter
+
+
+class _ByteEncoding:
+    """Stands in for a tiktoken encoding, one token per UTF-8 byte."""
+
+    def __init__(self) -> None:
+        self.encodes = 0
+
+    def encode_ordinary(self, text: str) -> list[int]:
+        self.encodes += 1
+        return list(text.encode("utf-8"))
+
+    def decode_bytes(self, tokens: list[int]) -> bytes:
+        return bytes(tokens)
+
+
+class TestTruncation(unittest.TestCase):
+    def setUp(self):
+        self.encoding = _ByteEncoding()
+        self.counter = TokenCounter(encoding=self.encoding)
+        patch = mock.patch("lib.text.get_token_counter", return_value=self.counter)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.text = "".join(f"line {index:04d}\n" for index in range(1000))  # 10 bytes per line
+
+    def test_short_text_skips_the_tokenizer(self):
+        self.assertEqual(truncate_text_by_tokens("short", 100), "short")
+        self.assertEqual(self.encoding.encodes, 0)
+
+    def test_head_is_token_exact_and_encodes_once(self):
+        result = truncate_text_by_tokens(self.text, 105, suffix="\n[cut]")
+
+        self.assertLessEqual(len(result.encode("utf-8")), 105)
+        self.assertTrue(result.startswith("line 0000\n"))
+        self.assertTrue(result.endswith("line 0009\n[cut]"))
+        self.assertEqual(self.encoding.encodes, 2)  # the text once, the suffix once
+
+    def test_tail_and_middle(self):
+        tail = truncate_text_by_tokens(self.text, 56, suffix="\n[cut]", mode="tail")
+        middle = truncate_text_by_tokens(self.text, 106, suffix="\n[cut]", mode="middle", head_share=0.5)
+
+        self.assertEqual(tail, "[cut]\n" + "".join(f"line {index:04d}\n" for index in range(995, 1000)))
+        self.assertTrue(middle.startswith("line 0000\n"))
+        self.assertIn("line 0004\n[cut]\nline 0995\n", middle)
+        self.assertTrue(middle.endswith("line 0999\n"))
+        self.assertLessEqual(len(middle.encode("utf-8")), 106)
+
+    def test_cut_inside_a_multibyte_character(self):
+        split = split_by_tokens("é" * 10, head_tokens=5, tail_tokens=3, counter=self.counter)
+
+        self.assertTrue(split.truncated)
+        self.assertEqual((split.head, split.tail, split.total_tokens), ("éé", "é", 20))
+
+    def test_estimates_without_an_encoding(self):
+        counter = TokenCounter(estimate_only=True)
+        split = split_by_tokens(self.text, head_tokens=25, counter=counter)
+
+        self.assertEqual(split.total_tokens, 2500)
+        self.assertEqual(split.head, "".join(f"line {index:04d}\n" for index in range(10)))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            truncate_text_by_tokens(self.text, 10, mode="sideways")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import difflib
+import os
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
@@ -23,10 +24,27 @@ class ToolKind(str, Enum):
     MCP = "mcp"
 
 
+# parameters that name a file or directory a tool touches, used to order conflicting calls
+PATH_PARAM_KEYS = ("path", "src", "dest")
+
+
+@dataclass(frozen=True)
+class ResourceAccess:
+    path: Path
+    write: bool = False
+
+    def conflicts_with(self, other: ResourceAccess) -> bool:
+        if not (self.write or other.write):
+            return False
+        # a directory conflicts with everything below it (list_dir vs. a write inside it)
+        return self.path == other.path or self.path in other.path.parents or other.path in self.path.parents
+
+
 @dataclass
 class ToolInvocation:
     cwd: Path
     params: dict[str, Any]
+    timeout: float | None = None  # seconds left for this call, set by the registry
 
 @dataclass
 class FileDiff:
@@ -138,6 +156,45 @@ class Tool(ABC):
             ToolKind.MCP,
         }
 
+    def get_timeout(self, invocation: ToolInvocation) -> float | None:
+        """Deadline in seconds for this call, None means no limit."""
+        timeouts = self.config.tool_timeouts
+        return timeouts.per_tool.get(self.name, timeouts.default_seconds)
+
+    def get_resource_access(self, invocation: ToolInvocation) -> list[ResourceAccess]:
+        """Paths this call reads or writes. Tools without a known footprint return [] and are only limited per kind."""
+        if self.kind in {ToolKind.SHELL, ToolKind.MCP}:
+            # a command (sed -i, git checkout, a formatter) can write anywhere in the workspace, so it waits for
+            # every earlier read or write under cwd and everything after it waits for it
+            return [ResourceAccess(path=Path(os.path.normpath(invocation.cwd)), write=True)]
+        if self.kind not in {ToolKind.READ, ToolKind.FILE_SYSTEM, ToolKind.WRITE}:
+            return []
+
+        write = self.kind == ToolKind.WRITE
+        resources: list[ResourceAccess] = []
+        for key in PATH_PARAM_KEYS:
+            value = invocation.params.get(key)
+            if not isinstance(value, str):
+                continue
+            path = Path(value)
+            if not path.is_absolute():
+                path = Path(invocation.cwd) / path
+            resources.append(ResourceAccess(path=Path(os.path.normpath(path)), write=write))
+
+        if not resources and self.kind != ToolKind.WRITE:
+            # READ tools default to the working directory (grep, glob)
+            resources.append(ResourceAccess(path=Path(os.path.normpath(invocation.cwd))))
+        return resources
+
+    def writes_files(self, invocation: ToolInvocation) -> bool:
+        """Whether this call may change files, judged from the same footprint the scheduler orders calls by."""
+        resources = self.get_resource_access(invocation)
+        # a WRITE tool without a path parameter writes somewhere we can't name
+        return any(resource.write for resource in resources) or (self.kind == ToolKind.WRITE and not resources)
+
+    def reset(self) -> None:
+        """Drop per-conversation state, called when a session is reused for a new conversation."""
+
     def is_external(self) -> bool:
         return self.kind in {ToolKind.SHELL, ToolKind.NETWORK, ToolKind.MCP}
 
@@ -9,6 +9,7 @@ def get_all_builtin_tools() -> list[type]:
     from tools.builtin.grep import GrepTool
     from tools.builtin.list_dir import ListDirTool
     from tools.builtin.read_file import ReadFileTool
+    from tools.builtin.read_output import ReadOutputTool
     from tools.builtin.shell import ShellTool
     from tools.builtin.web_scrap import WebScrapTool
     from tools.builtin.write_file import WriteFile
@@ -28,5 +29,6 @@ def get_all_builtin_tools() -> list[type]:
         WebScrapTool,
         TodoTool,
         MemoryTool,
-        MovePathTool
+        MovePathTool,
+        ReadOutputTool,
     ]
@@ -3,7 +3,7 @@ import asyncio
 from pydantic import BaseModel, Field
 
 from config.config import Config
-from lib import MAX_FILE_SIZE,check_file_size, is_binary_file, resolve_path ,  count_tokens, truncate_text_by_tokens
+from lib import MAX_FILE_SIZE,check_file_size, is_binary_file, resolve_path
 from lib.contants.config import BLOCKED_FILES
 from tools import Tool, ToolInvocation, ToolKind, ToolResult
 
@@ -28,8 +28,6 @@ class ReadFileTool(Tool):
     )
     schema = ReadFileParams
 
-    MAX_OUTPUT_TOKENS = 15000 # maximum tokens to return in the output
-
     async def execute(self, invocation: ToolInvocation) -> ToolResult:
         params = ReadFileParams(**invocation.params)
         path = resolve_path(invocation.cwd, params.path)
@@ -87,30 +85,13 @@ class ReadFileTool(Tool):
 
             output = "\n".join(formated_lines)
 
-            token_cont = count_tokens(output)
-
-            # if the output exceeds the token limit, we need to truncate it
-            if token_cont > self.MAX_OUTPUT_TOKENS:
-                output = truncate_text_by_tokens(
-                    output,
-                    max_tokens=self.MAX_OUTPUT_TOKENS,
-                    model="gpt-4", # NOTE: we set default model to gpt-4 for token counting and truncation
-                    suffix=f"\n...[output truncated {token_cont} tokens, showing first {self.MAX_OUTPUT_TOKENS} tokens]",
-                    preserve_lines=False, # for file content, we can truncate by characters to better utilize the token limit
-                )
-
-                metadata_lines = []
-
-                if start_idx > 0 or end_idx < total_lines:
-                    metadata_lines.append(f"Showing lines {start_idx + 1} to {end_idx} of {total_lines}")
-
-                if metadata_lines:
-                    header = " | ".join(metadata_lines) + "\n" + "-" * 80
-                    output = header + "\n" + output
+            # NOTE: outputs over max_tool_output_tokens are previewed and saved by the registry's output stage
+            if start_idx > 0 or end_idx < total_lines:
+                header = f"Showing lines {start_idx + 1} to {end_idx} of {total_lines}\n" + "-" * 80
+                output = header + "\n" + output
 
             return ToolResult.success_result(
                 output,
-                truncated = token_cont > self.MAX_OUTPUT_TOKENS,
                 metadata={"total_lines": total_lines, 
                           "start_line": start_idx + 1, 
                           "end_line": end_idx ,
@@ -0,0 +1,64 @@
+from pydantic import BaseModel, Field
+
+from config.config import Config
+from tools.base import ResourceAccess, Tool, ToolInvocation, ToolKind, ToolResult
+from tools.output_store import BlobStore, get_blob_store
+
+
+class ReadOutputParams(BaseModel):
+    handle: str = Field(
+        ..., description="handle of a saved tool output, as given in the truncated result"
+    )
+    offset: int = Field(
+        1, description="line to start reading from (default: 1)", ge=1
+    )
+    limit: int = Field(
+        500, description="number of lines to read (default: 500)", ge=1
+    )
+
+
+class ReadOutputTool(Tool):
+    name = "read_output"
+    kind = ToolKind.READ
+    description = (
+        "Read a page of a tool output that was too large to return in full. "
+        "Large outputs are saved and replaced by a preview that names a handle; "
+        "pass that handle with offset and limit (in lines) to read the omitted part."
+    )
+    schema = ReadOutputParams
+
+    def __init__(self, config: Config, store: BlobStore | None = None) -> None:
+        super().__init__(config)
+        self.store = store or get_blob_store()
+
+    def get_resource_access(self, invocation: ToolInvocation) -> list[ResourceAccess]:
+        # saved outputs are immutable, nothing in the workspace can conflict with reading one
+        return []
+
+    async def execute(self, invocation: ToolInvocation) -> ToolResult:
+        params = ReadOutputParams(**invocation.params)
+
+        content = self.store.get(params.handle.strip())
+        if content is None:
+            return ToolResult.error_result(f"No saved output with handle '{params.handle}'")
+
+        lines = content.splitlines()
+        total_lines = len(lines)
+        start_idx = params.offset - 1
+        if start_idx >= total_lines:
+            return ToolResult.error_result(
+                f"Offset {params.offset} is past the end of the output ({total_lines} lines)"
+            )
+        end_idx = min(start_idx + params.limit, total_lines)
+
+        header = f"Showing lines {start_idx + 1} to {end_idx} of {total_lines}"
+        page = "\n".join(f"{idx:6}| {line}" for idx, line in enumerate(lines[start_idx:end_idx], start=start_idx + 1))
+        return ToolResult.success_result(
+            header + "\n" + page,
+            metadata={
+                "handle": params.handle,
+                "total_lines": total_lines,
+                "start_line": start_idx + 1,
+                "end_line": end_idx,
+            },
+        )
@@ -5,6 +5,7 @@ import shutil
 import sys
 import signal
 import asyncio
+import time
 
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -97,6 +98,7 @@ class ShellTool(Tool):
             shell_executable = shutil.which("bash") or shutil.which("sh") or "/bin/sh"
             shell_cmd = [shell_executable, "-c", command]
 
+        start = time.monotonic()
         process = await asyncio.create_subprocess_exec(
             *shell_cmd,
             stdout=asyncio.subprocess.PIPE,
@@ -125,10 +127,6 @@ class ShellTool(Tool):
                 output += f"Command exited with code {exit_code}"
 
 
-            # compress output if it exceeds the max token limit
-            if len(output) > 100*1024:
-                output = output[:100*1024] + "\n\n[Output truncated due to length]"
-
             return ToolResult(
                     success=exit_code == 0,
                     output=output,
@@ -142,30 +140,52 @@ class ShellTool(Tool):
             )
 
         except asyncio.TimeoutError:
-            # kill the process
-            if sys.platform == "win32":
-                process.kill()
-                await process.wait()
-            else:
-                try:
-                    os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                except ProcessLookupError:
-                    pass
-                
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=3.0)
-                except asyncio.TimeoutError:
-                    try:
-                        os.killpg(os.getpgid(process.pid), signal.SIGKILL)
-                        await process.wait()
-                    except ProcessLookupError:
-                        pass
-
-            return ToolResult.error_result(f"Command timed out after {params.timeout} seconds.")
+            await self._terminate(process)
+            return ToolResult.error_result(
+                f"Command timed out after {params.timeout} seconds.",
+                metadata={
+                    "command": command,
+                    "cwd": str(cwd),
+                    "timed_out": True,
+                    "elapsed": time.monotonic() - start,
+                    "timeout": params.timeout,
+                },
+            )
+        except asyncio.CancelledError:
+            # turn deadline, registry timeout or Ctrl+C: don't leave the process group running
+            await self._terminate(process)
+            raise
         except Exception as e:
             return ToolResult.error_result(f"Error executing command: {str(e)}")
 
 
+    def get_timeout(self, invocation: ToolInvocation) -> float | None:
+        # the command's own timeout fires first, the registry deadline is only a backstop
+        timeout = invocation.params.get("timeout", ShellParams.model_fields["timeout"].default)
+        return float(timeout) + self.config.tool_timeouts.grace_seconds
+
+    async def _terminate(self, process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        if sys.platform == "win32":
+            process.kill()
+            await process.wait()
+            return
+
+        try:
+            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        try:
+            await asyncio.wait_for(process.wait(), timeout=3.0)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+                await process.wait()
+            except ProcessLookupError:
+                pass
+
     def _build_environment(self) -> dict[str, str]:
         env = os.environ.copy()
         shell_environment =self.config.shell_environment
@@ -32,6 +32,8 @@ class TodoTool(Tool):
         super().__init__(config)
         self.todos = {}
 
+    def reset(self) -> None:
+        self.todos = {}
 
     async def execute(self, invocation: ToolInvocation) -> ToolResult:
         params = TodoParams(**invocation.params)
@@ -3,7 +3,6 @@ import httpx
 
 from config.config import Config
 from lib import  MAX_FILE,resolve_path, IGNORED_DIRECTORIES
-from lib.contants.config import MAX_CONTENT_SIZE
 from lib.paths import MAX_FILE_SIZE
 from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
 from pydantic import BaseModel, Field
@@ -46,14 +45,9 @@ class WebScrapTool(Tool):
                 response = await client.get(params.url)
                 response.raise_for_status()  # Raise an error for bad status codes
 
-                # truncate content if it's too large to prevent excessive memory usage
-                content = response.text
-                if len(content) > MAX_CONTENT_SIZE:
-                    content = content[:MAX_CONTENT_SIZE] + "\n\n[Content truncated due to size limits]"
-
+                # NOTE: large pages are cut down by the registry's output stage, the full page stays readable via read_output
                 return ToolResult.success_result(
-                    content,
-                    truncated = len(response.text) > MAX_CONTENT_SIZE,
+                    response.text,
                     metadata={
                     "url": params.url,
                     "status_code": response.status_code,
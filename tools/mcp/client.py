@@ -125,11 +125,12 @@ class MCPClient:
         except Exception:
             pass
 
-    async def call_tool(self, tool_name: str, arguments: dict[str, Any]):
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any], timeout: float | None = None):
         if not self._client or self.status != MCPServerStatus.CONNECTED:
             raise RuntimeError(f"Not connected to server {self.name}")
 
-        result = await self._client.call_tool(tool_name, arguments)
+        # NOTE: bounds the request inside the MCP session too, not only the await on our side
+        result = await self._client.call_tool(tool_name, arguments, timeout=timeout)
 
         output = []
         for item in result.content:
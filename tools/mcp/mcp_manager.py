@@ -14,7 +14,8 @@ class MCPManager:
         self._initialized = False
         self._prepared = False
         self._background_tasks : asyncio.Task | None = None
-        self._registered_tool_names: set[str] = set()
+        # registries waiting for the servers to connect, several sessions can share one manager
+        self._pending_registries: list[ToolRegistry] = []
 
 
 
@@ -76,12 +77,15 @@ class MCPManager:
             self.register_tools(tool_registry)
             return
 
+        self._pending_registries.append(tool_registry)
         if self._background_tasks is not None and not self._background_tasks.done():
             return
 
         async def runner():
             await self.initialize()
-            self.register_tools(tool_registry)
+            for registry in self._pending_registries:
+                self.register_tools(registry)
+            self._pending_registries.clear()
 
 
         self._background_tasks = asyncio.create_task(runner())
@@ -96,7 +100,7 @@ class MCPManager:
 
             for tool_info in client.tools:
                 tool_name = f"{name}_{tool_info.name}"
-                if tool_name in self._registered_tool_names:
+                if tool_registry.has_tool(tool_name):
                     continue
 
                 tool = MCPTool(
@@ -106,7 +110,6 @@ class MCPManager:
                         name = tool_name,
                 )
                 tool_registry.register_tool(tool)
-                self._registered_tool_names.add(tool_name)
                 registered_count += 1
         
         return registered_count
@@ -131,4 +134,4 @@ class MCPManager:
         self._clients.clear()
         self._initialized = False
         self._prepared = False
-        self._registered_tool_names.clear()
+        self._pending_registries.clear()
@@ -45,7 +45,7 @@ class MCPTool(Tool):
                     timeout=self.client.config.startup_timeout,
                 )
 
-            result = await self.client.call_tool(self.tool_info.name, params)
+            result = await self.client.call_tool(self.tool_info.name, params, timeout=invocation.timeout)
             output = result.get("output", {})
             is_error = result.get("is_error", False)
 
@@ -0,0 +1,118 @@
+"""Outputs over the token budget are stored in full in a content-addressed BlobStore, the model gets a head/tail
+preview plus a handle to page through with the `read_output` tool."""
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from config.loader import get_data_dir
+from lib.text import fits_in_tokens, split_by_tokens
+from lib.tokens import TokenCounter, get_token_counter
+from tools.base import ToolResult
+
+logger = logging.getLogger(__name__)
+
+HANDLE_LENGTH = 16
+BLOB_RETENTION_SECONDS = 7 * 24 * 3600
+_HANDLE_RE = re.compile(r"^[0-9a-f]{%d}$" % HANDLE_LENGTH)
+
+
+class BlobStore:
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self._pruned = False
+
+    def _path(self, handle: str) -> Path:
+        return self.directory / f"{handle}.txt"
+
+    def put(self, content: str) -> str:
+        handle = hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()[:HANDLE_LENGTH]
+        path = self._path(handle)
+        if path.exists():
+            return handle
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+        # write to a temp file first so a concurrent reader never sees a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", errors="surrogatepass") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return handle
+
+    def get(self, handle: str) -> str | None:
+        if not _HANDLE_RE.match(handle):
+            return None
+        try:
+            return self._path(handle).read_text(encoding="utf-8", errors="surrogatepass")
+        except FileNotFoundError:
+            return None
+
+    def prune(self, max_age_seconds: float = BLOB_RETENTION_SECONDS) -> int:
+        """Remove blobs older than `max_age_seconds`, returns how many were removed."""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for path in self.directory.glob("*.txt"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+def get_blob_store() -> BlobStore:
+    return BlobStore(get_data_dir() / "tool_outputs")
+
+
+class ToolOutputLimiter:
+    HEAD_SHARE = 0.7  # the start of an output (headers, first errors) usually matters more than the end
+
+    def __init__(self, max_tokens: int, store: BlobStore, token_counter: TokenCounter | None = None) -> None:
+        self.max_tokens = max_tokens
+        self.store = store
+        self.token_counter = token_counter or get_token_counter()
+
+    def apply(self, result: ToolResult) -> ToolResult:
+        text = result.output
+        # short outputs skip the tokenizer entirely
+        if not text or fits_in_tokens(text, self.max_tokens):
+            return result
+        # leave room for the notice, the output is tokenized once and the preview cut from the token array
+        budget = max(self.max_tokens - 100, 0)
+        head_tokens = int(budget * self.HEAD_SHARE)
+        split = split_by_tokens(text, head_tokens, budget - head_tokens, counter=self.token_counter)
+        total_tokens = split.total_tokens
+        if total_tokens <= self.max_tokens:
+            return result
+
+        handle = self.store.put(text)
+        result.output = self._preview(split.head.rstrip("\n"), split.tail, text, total_tokens, handle)
+        result.truncated = True
+        result.metadata = {**result.metadata, "output_handle": handle, "output_tokens": total_tokens}
+        logger.info(f"Tool output of {total_tokens} tokens spilled to blob {handle}")
+        return result
+
+    def _preview(self, head: str, tail: str, text: str, total_tokens: int, handle: str) -> str:
+        total_lines = text.count("\n") + (0 if text.endswith("\n") else 1)
+        head_lines = head.count("\n") + 1 if head else 0
+        tail_lines = tail.count("\n") + (0 if tail.endswith("\n") else 1) if tail else 0
+        first_omitted = head_lines + 1
+        last_omitted = total_lines - tail_lines
+        notice = (
+            f"[output too large: {total_tokens} tokens, {total_lines} lines. "
+            f"Lines {first_omitted}-{last_omitted} are omitted here. "
+            f"The full output is saved as handle '{handle}', use the read_output tool "
+            f"with handle='{handle}' and offset/limit (in lines) to page through it]"
+        )
+        return "\n".join(part for part in (head, notice, tail) if part)
@@ -1,12 +1,18 @@
+import asyncio
+import time
 from pathlib import Path
 from typing import Any
 from config.config import Config
+from llm.pool import ClientPool
 from tools import Tool
 import logging
 
 from tools.subagent_config import get_subagent_definitions
 from tools.subagents import SubAgentTool
 from tools.base import ToolInvocation, ToolResult
+from lib.tokens import get_token_counter
+from tools.output_store import ToolOutputLimiter, get_blob_store
+from tools.result_cache import ToolResultCache
 from tools.builtin import  get_all_builtin_tools
 
 
@@ -15,12 +21,26 @@ class ToolRegistry:
     def __init__(self,config:Config) -> None:
         self._tools:dict[str,Tool] = {}
         self.config = config
+        # NOTE: bumped on every register/unregister, the schema payload is rebuilt only when it changes
+        self._version = 0
+        self._schemas: list[dict[str, Any]] | None = None
+        self._schemas_version = -1
+        # every result is checked against max_tool_output_tokens here instead of in each tool
+        self.output_limiter = ToolOutputLimiter(
+            config.max_tool_output_tokens, get_blob_store(), token_counter=get_token_counter(config.get_model_name)
+        )
+        self.result_cache = ToolResultCache(config.tool_result_cache)
+
+    @property
+    def version(self) -> int:
+        return self._version
 
 
     def register_tool(self, tool: Tool) -> None:
         if tool.name in self._tools:
             logger.warning(f"Tool '{tool.name}' is already registered. Overwriting.")
         self._tools[tool.name] = tool
+        self._version += 1
         logger.info(f"Registered tool: {tool.name}")
 
     def unregister_tool(self, name: str) -> bool:
@@ -28,11 +48,22 @@ class ToolRegistry:
             logger.warning(f"Tool '{name}' not found in registry. Cannot unregister.")
             return False
         del self._tools[name]
+        self._version += 1
         logger.info(f"Unregistered tool: {name}")
         return True
 
+    def reset(self) -> None:
+        """Forget per-conversation state (tool state, cached results) while keeping the registered tools."""
+        for tool in self._tools.values():
+            tool.reset()
+        self.result_cache.invalidate()
+
     def get_schemas(self) -> list[dict[str, Any]]:
-        return [tool.to_openai_schema() for tool in self._tools.values()]
+        # the same list object is returned until the registry changes, callers must treat it as read-only
+        if self._schemas is None or self._schemas_version != self._version:
+            self._schemas = [tool.to_openai_schema() for tool in self._tools.values()]
+            self._schemas_version = self._version
+        return self._schemas
 
     def get_tools(self) -> list[Tool]:
         tools: list[Tool] = []
@@ -49,7 +80,8 @@ class ToolRegistry:
         return tools
 
 
-    async def invoke_tool(self, name: str, params: dict[str, Any],cwd:Path|None) -> ToolResult:
+    async def invoke_tool(self, name: str, params: dict[str, Any],cwd:Path|None, deadline: float | None = None) -> ToolResult:
+        """`deadline` is a time.monotonic() value shared by all calls of a turn, the call gets the smaller of it and its own timeout."""
         tool = self.get_tool(name)
         if not tool:
             logger.error(f"Tool '{name}' not found in registry. Cannot invoke.")
@@ -65,15 +97,52 @@ class ToolRegistry:
         if cwd is None:
             cwd = Path.cwd() # default to current working directory if not provided
 
+        invocation = ToolInvocation(cwd=cwd, params=params)
+        cache_lookup = None
+        if self.result_cache.is_cacheable(tool):
+            cached, cache_lookup = self.result_cache.lookup(tool, invocation)
+            if cached is not None:
+                return cached
+
+        timeout = tool.get_timeout(invocation)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ToolResult.error_result(
+                    f"Tool '{name}' was not started: the turn's time budget is used up.",
+                    metadata={"tool_name": name, "timed_out": True, "elapsed": 0.0},
+                )
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        invocation.timeout = timeout
+
+        start = time.monotonic()
         try:
-            invocation = ToolInvocation(cwd=cwd, params=params)
-            result = await tool.execute(invocation)
-            return result
+            # NOTE: on timeout wait_for cancels the tool and waits for its cleanup (process group kill, MCP cancel)
+            result = await asyncio.wait_for(tool.execute(invocation), timeout=timeout)
+        except asyncio.TimeoutError:
+            elapsed = time.monotonic() - start
+            logger.warning(f"Tool '{name}' timed out after {elapsed:.1f}s")
+            return ToolResult.error_result(
+                f"Tool '{name}' timed out after {elapsed:.1f}s (limit {timeout:.0f}s).",
+                metadata={"tool_name": name, "timed_out": True, "elapsed": elapsed, "timeout": timeout},
+            )
         except Exception as e:
             logger.exception(f"Error invoking tool '{name}': {str(e)}")
             return ToolResult.error_result(f"Error invoking tool '{name}': {str(e)}", metadata={"tool_name": name})
+        finally:
+            # a failed or timed out command may still have changed files, so any run of a writing call invalidates
+            if tool.writes_files(invocation):
+                self.result_cache.invalidate()
+
+        result = self.output_limiter.apply(result)
+        if cache_lookup is not None:
+            self.result_cache.store(cache_lookup, result)
+        return result
+
 
 
+    def has_tool(self, name: str) -> bool:
+        return name in self._tools
 
     def get_tool(self, name: str) -> Tool | None:
         if name not in self._tools:
@@ -82,12 +151,13 @@ class ToolRegistry:
         return self._tools.get(name)
 
 
-def create_tool_registry(config:Config) -> ToolRegistry:
+def create_tool_registry(config:Config, client_pool: ClientPool | None = None) -> ToolRegistry:
     registry = ToolRegistry(config)
     for tool in get_all_builtin_tools():
         registry.register_tool(tool(config))
 
+    # sub-agents inherit the parent's client pool so their requests reuse its warm connections
     for definition in get_subagent_definitions():
-        registry.register_tool(SubAgentTool(config, definition))
+        registry.register_tool(SubAgentTool(config, definition, client_pool=client_pool))
     
     return registry
@@ -0,0 +1,104 @@
+"""Session-scoped memo of READ/FILE_SYSTEM tool results. An entry is served while the mtime and size of the paths
+the call touches are unchanged; any call that writes files (Tool.writes_files) clears the whole cache, since a
+directory's mtime misses edits deeper in the tree. The TTL bounds staleness from edits made outside the agent."""
+from __future__ import annotations
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+from config.config import ToolResultCacheConfig
+from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_KINDS = frozenset({ToolKind.READ, ToolKind.FILE_SYSTEM})
+
+Fingerprint = tuple[tuple[str, int, int] | tuple[str, None, None], ...]
+
+
+@dataclass
+class ToolResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    fingerprint: Fingerprint
+    generation: int
+
+
+@dataclass
+class _Entry:
+    fingerprint: Fingerprint
+    result: ToolResult
+    stored_at: float
+
+
+class ToolResultCache:
+    def __init__(self, config: ToolResultCacheConfig) -> None:
+        self.config = config
+        self.stats = ToolResultCacheStats()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # bumped on every invalidation, results computed across one are not stored
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_cacheable(self, tool: Tool) -> bool:
+        return self.config.enabled and tool.kind in CACHEABLE_KINDS
+
+    def lookup(self, tool: Tool, invocation: ToolInvocation) -> tuple[ToolResult | None, CacheLookup]:
+        key = json.dumps([tool.name, str(invocation.cwd), invocation.params], sort_keys=True, default=str)
+        fingerprint = _fingerprint(tool, invocation)
+        lookup = CacheLookup(key=key, fingerprint=fingerprint, generation=self._generation)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.fingerprint == fingerprint and time.monotonic() - entry.stored_at <= self.config.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            # a copy, so callers can't alter the cached entry
+            return replace(entry.result, metadata={**entry.result.metadata, "cached": True}), lookup
+
+        if entry is not None:
+            del self._entries[key]
+        self.stats.misses += 1
+        return None, lookup
+
+    def store(self, lookup: CacheLookup, result: ToolResult) -> None:
+        if not result.success or lookup.generation != self._generation:
+            return
+        self._entries[lookup.key] = _Entry(fingerprint=lookup.fingerprint, result=result, stored_at=time.monotonic())
+        self._entries.move_to_end(lookup.key)
+        while len(self._entries) > self.config.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        if self._entries:
+            self.stats.invalidations += 1
+            self._entries.clear()
+
+
+def _fingerprint(tool: Tool, invocation: ToolInvocation) -> Fingerprint:
+    parts = []
+    for resource in tool.get_resource_access(invocation):
+        try:
+            stat = os.stat(resource.path)
+            parts.append((str(resource.path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            parts.append((str(resource.path), None, None))
+    return tuple(parts)
@@ -1,9 +1,13 @@
 import asyncio
+import os
 from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
 from pydantic import BaseModel, Field
 
 from config.config import Config
-from tools.base import Tool, ToolInvocation, ToolKind, ToolResult
+from llm.pool import ClientPool
+from tools.base import ResourceAccess, Tool, ToolInvocation, ToolKind, ToolResult
 
 class SubAgentParams(BaseModel):
     goal : str = Field(
@@ -30,9 +34,10 @@ class SubAgentDefinition:
 class SubAgentTool(Tool):
     kind = ToolKind.MCP
 
-    def __init__(self,config:Config, definition : SubAgentDefinition):
+    def __init__(self,config:Config, definition : SubAgentDefinition, client_pool: ClientPool | None = None):
         super().__init__(config)
         self.definition = definition
+        self.client_pool = client_pool
 
     schema = SubAgentParams
     @property
@@ -46,6 +51,26 @@ class SubAgentTool(Tool):
     def is_mutating(self) -> bool:
         return True
 
+    @cached_property
+    def is_read_only(self) -> bool:
+        """Whether every tool the sub-agent may use only reads (explore, code_reviewer)."""
+        if not self.definition.allowed_tools:
+            return False
+        from tools.builtin import get_all_builtin_tools
+
+        kinds = {tool.name: tool.kind for tool in get_all_builtin_tools()}
+        return all(kinds.get(name) in {ToolKind.READ, ToolKind.FILE_SYSTEM} for name in self.definition.allowed_tools)
+
+    def get_resource_access(self, invocation: ToolInvocation) -> list[ResourceAccess]:
+        # a read-only sub-agent reads anywhere under cwd but writes nothing, so several of them run side by side
+        if self.is_read_only:
+            return [ResourceAccess(path=Path(os.path.normpath(invocation.cwd)))]
+        return super().get_resource_access(invocation)
+
+    def get_timeout(self, invocation: ToolInvocation) -> float | None:
+        # the sub-agent enforces its own timeout, the registry deadline is only a backstop
+        return self.definition.timeout_seconds + self.config.tool_timeouts.grace_seconds
+
     async def execute(self, invocation: ToolInvocation)->ToolResult:
         from agent.events import AgentEventType
         from agent.agent import Agent
@@ -66,12 +91,14 @@ class SubAgentTool(Tool):
             config_dict["max_turns"] = self.definition.max_turns
             config_dict["allowed_tools"] = self.definition.allowed_tools
             config_dict["user_instructions"] = self._render_goal_prompt(goal)
+            # sub-agent runs are part of the parent's turn, they aren't resumable sessions of their own
+            config_dict["session_journal"] = {**config_dict.get("session_journal", {}), "enabled": False}
 
             sub_agent_config = Config(**config_dict)
 
             final_prompt = self._get_final_prompt(goal)
 
-            async with Agent(config=sub_agent_config) as sub_agent:
+            async with Agent(config=sub_agent_config, client_pool=self.client_pool) as sub_agent:
                 try:
                     async with asyncio.timeout(self.definition.timeout_seconds):
                         async for event in sub_agent.run(final_prompt):
@@ -657,7 +657,8 @@ class TUI:
             if exit_code is not None:
                 shell_subtitle = f"exit {exit_code}"
 
-            display_output = truncate_text_by_tokens(output, self._max_block_tokens)
+            # the end of a command's output (errors, the summary line) matters as much as the start
+            display_output = truncate_text_by_tokens(output, self._max_block_tokens, mode="middle")
             blocks.append(
                 self._code_panel(
                     Syntax(display_output, lexer="text", theme=CODE_THEME, word_wrap=False),
@@ -998,6 +999,34 @@ class TUI:
                 self._live_display.start()
             self._start_verb_rotation(style="thinking")
 
+    def llm_metrics(self, metrics: dict[str, Any]) -> None:
+        """Display the latency breakdown of one LLM request (debug mode)"""
+        def ms(key: str) -> str:
+            value = metrics.get(key)
+            return f"{value * 1000:.0f}ms" if isinstance(value, (int, float)) else "-"
+
+        parts = [
+            f"turn {metrics.get('turn', '?')}",
+            "cached" if metrics.get("cached") else f"{metrics.get('endpoint') or 'default'}",
+            f"queue {ms('queue_time')}",
+            f"ttft {ms('ttft')}",
+            f"gap p90 {ms('gap_p90')}",
+            f"total {ms('duration')}",
+        ]
+        tokens_per_second = metrics.get("tokens_per_second")
+        if isinstance(tokens_per_second, (int, float)):
+            parts.append(f"{tokens_per_second:.1f} tok/s")
+        hit_ratio = metrics.get("prompt_cache_hit_ratio")
+        if isinstance(hit_ratio, (int, float)):
+            parts.append(f"prompt cache {hit_ratio:.0%}")
+
+        self.console.print(
+            Text.assemble(
+                ("  ⏱ ", "muted"),
+                (f" {SEPARATOR} ".join(parts), "muted"),
+            )
+        )
+
     def subagent_started(self, subagent_name: str) -> None:
         """Display when a subagent is invoked"""
         style = f"subagent.{subagent_name}" if f"subagent.{subagent_name}" in AGENT_THEME.styles else "subagent"
@@ -1053,6 +1082,33 @@ class TUI:
 
         self.console.print(table)
 
+    def show_sessions(self, sessions: list, current: str | None = None) -> None:
+        """Display saved sessions, most recent first"""
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Session", style="dim", no_wrap=True)
+        table.add_column("Updated", style="dim", no_wrap=True)
+        table.add_column("Title", style="dim")
+
+        for info in sessions:
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.updated_at))
+            session_style = "success" if info.session_id == current else "white"
+            table.add_row(Text(info.session_id[:8], style=session_style), Text(updated, style="muted"), Text(info.title or "-", style="muted"))
+
+        self.console.print(table)
+
+    def show_stats(self, stats: dict[str, Any]) -> None:
+        """Display session statistics"""
+        table = Table(show_header=False, box=None)
+        table.add_column("Stat", style="muted", no_wrap=True)
+        table.add_column("Value", style="white")
+
+        for key, value in stats.items():
+            if key.endswith(("_rate", "_ratio")) and isinstance(value, float):
+                value = f"{value:.0%}"
+            table.add_row(key.replace("_", " "), str(value))
+
+        self.console.print(table)
+
     def show_help(self) -> None:
         help_text = """\
 ## Commands